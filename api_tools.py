@@ -9,7 +9,7 @@ that are used by the Gemini AI for function calling.
 SCENARIO_TOOLS = [
     {
         "name": "list_scenarios",
-        "description": "Retrieves a list of pricing scenarios. Use this when user asks about existing scenarios, wants to see all scenarios, or filter scenarios by criteria. The response contains 'items' (array of scenarios), 'page_size' (items per page), and 'total' (total count across all pages). Always check if total > items.length to inform users about more results.",
+        "description": "Retrieves a list of pricing scenarios. Use this when user asks about existing scenarios, wants to see all scenarios, or filter scenarios by criteria. The response contains 'items' (array of scenarios), 'page_size' (items per page), and 'total' (total count across all pages). Always check if total > items.length to inform users about more results, or set all_pages to get every item at once.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -25,6 +25,10 @@ SCENARIO_TOOLS = [
                     "type": "string",
                     "description": "Filter by scenario type (e.g., 'promotional', 'baseline')."
                 },
+                "all_pages": {
+                    "type": "boolean",
+                    "description": "Fetch every page in one call and return all items together (up to a server-side row cap); 'page' is ignored. Use this when the user wants the complete list."
+                },
                 "page": {
                     "type": "integer",
                     "description": "Page number for pagination (default: 1)."
@@ -182,6 +186,10 @@ PANEL_TOOLS = [
                     "type": "string",
                     "description": "Rule sub-type name filter."
                 },
+                "all_pages": {
+                    "type": "boolean",
+                    "description": "Fetch every page in one call and return all items together (up to a server-side row cap); 'page' is ignored. Use this when the user wants the complete list."
+                },
                 "page": {
                     "type": "integer",
                     "description": "Page number for pagination (default: 1)."
@@ -344,6 +352,10 @@ PANEL_TOOLS = [
                     "type": "integer",
                     "description": "The unique identifier of the panel (required)."
                 },
+                "all_pages": {
+                    "type": "boolean",
+                    "description": "Fetch every page in one call and return all items together (up to a server-side row cap); 'page' is ignored. Use this when the user wants the complete list."
+                },
                 "page": {
                     "type": "integer",
                     "description": "Page number for pagination (default: 1)."
@@ -664,5 +676,94 @@ RULE_TOOLS = [
     }
 ]
 
+# Rule type accepted by create_rules_bulk -> single-type tool used to submit it
+BULK_RULE_TYPES = {
+    "cpi": "create_cpi_rule",
+    "margin": "create_margin_rule",
+    "step": "create_step_rule",
+    "price": "create_price_rule",
+    "cost-change": "create_cost_change_rule",
+}
+
+# Max rules in one create_rules_bulk call
+BULK_RULE_LIMIT = 50
+
+
+def _bulk_rule_item_schema() -> dict:
+    """
+    Schema of one create_rules_bulk item: rule_type and panel_id plus the
+    fields of every rule type (only the fields of the item's type are sent)
+    """
+    tools = {tool["name"]: tool for tool in RULE_TOOLS}
+    properties = {
+        "rule_type": {
+            "type": "string",
+            "description": "Rule type: 'cpi', 'margin', 'step', 'price', or 'cost-change' (required)."
+        },
+        "panel_id": {
+            "type": "integer",
+            "description": "Panel ID to attach this rule to (required). Must validate the panel exists; non-CPI rules need a hard rule panel."
+        },
+    }
+    for tool_name in BULK_RULE_TYPES.values():
+        properties.update(tools[tool_name]["parameters"]["properties"]["rules"]["items"]["properties"])
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": ["rule_type", "panel_id", "rule_desc"]
+    }
+
+
+RULE_TOOLS.append({
+    "name": "create_rules_bulk",
+    "description": f"Creates several pricing rules of any types (CPI, margin, step, price, cost change) across one or more panels in a single call. Use this instead of repeated single-rule calls when the user wants more than one rule. IMPORTANT: Must validate every panel exists, and that panels receiving non-CPI rules are hard rule panels. Each rule must carry the fields its type requires. Up to {BULK_RULE_LIMIT} rules. Returns a result per rule, so some rules can succeed while others fail. Requires user confirmation.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "rules": {
+                "type": "array",
+                "description": "Rules to create. Each has rule_type, panel_id and the fields of that rule type.",
+                "items": _bulk_rule_item_schema()
+            }
+        },
+        "required": ["rules"]
+    }
+})
+
 # Combined tools list - all available tools
 ALL_TOOLS = SCENARIO_TOOLS + PANEL_TOOLS + RULE_TOOLS
+
+# Tools that only read from the Scenario API and can safely run concurrently
+READ_ONLY_TOOLS = {
+    "list_scenarios",
+    "get_scenario",
+    "list_panels",
+    "get_panel",
+    "list_panel_rules",
+}
+
+# Scenario API endpoint per tool: (HTTP method, path template). Path template
+# fields come from the tool arguments; see tool_dispatch.py for how the rest
+# of the arguments become query parameters or the JSON body.
+TOOL_ROUTES = {
+    # Scenario
+    "list_scenarios": ("GET", "/api/v1/pricing-rules/scenario"),
+    "get_scenario": ("GET", "/api/v1/pricing-rules/scenario/{scenario_id}"),
+    "create_scenario": ("POST", "/api/v1/pricing-rules/scenario"),
+    # Panel
+    "list_panels": ("GET", "/api/v1/pricing-rules/panel"),
+    "get_panel": ("GET", "/api/v1/pricing-rules/panel/{panel_id}"),
+    "create_panel": ("POST", "/api/v1/pricing-rules/panel"),
+    "update_panel": ("PATCH", "/api/v1/pricing-rules/panel/{panel_id}"),
+    # IMPORTANT: Always soft delete (never use hard_delete=true)
+    "delete_panel": ("DELETE", "/api/v1/pricing-rules/panel/{panel_id}"),
+    "list_panel_rules": ("GET", "/api/v1/pricing-rules/panel/{panel_id}/rules"),
+    # Rule
+    "create_cpi_rule": ("POST", "/api/v1/pricing-rules/rule/cpi"),
+    "create_margin_rule": ("POST", "/api/v1/pricing-rules/rule/margin"),
+    "create_step_rule": ("POST", "/api/v1/pricing-rules/rule/step"),
+    "create_price_rule": ("POST", "/api/v1/pricing-rules/rule/price"),
+    "create_cost_change_rule": ("POST", "/api/v1/pricing-rules/rule/cost-change"),
+    # IMPORTANT: Always soft delete; rule_type is sent as a query parameter for validation
+    "delete_rule": ("DELETE", "/api/v1/pricing-rules/rule/{rule_id}"),
+}
@@ -0,0 +1,141 @@
+"""
+Bulk Rule Creation
+
+The margin, step, price and cost change endpoints take ONE rule per request,
+so setting up a panel's rules used to take one tool call (and one Gemini
+iteration) per rule. create_rules_bulk takes a mixed list of rules across
+types and panels and:
+
+- validates every rule on its own, so one bad rule doesn't fail the others,
+- groups the valid ones into Scenario API submissions: all CPI rules of a
+  panel in one request, every other rule in a request of its own,
+- submits them concurrently (bounded), through the single-type tools,
+- returns a result per rule, in input order.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from api_tools import ALL_TOOLS, BULK_RULE_TYPES, BULK_RULE_LIMIT
+
+# Tools whose endpoint accepts several rules per request
+MULTI_RULE_TOOLS = {"create_cpi_rule"}
+
+# Fields each single-type tool accepts in a rule object
+RULE_FIELDS = {
+    tool["name"]: set(tool["parameters"]["properties"]["rules"]["items"]["properties"])
+    for tool in ALL_TOOLS
+    if tool["name"] in BULK_RULE_TYPES.values()
+}
+
+
+def _prefix_errors(validation_errors: List[dict], index: int) -> List[dict]:
+    """
+    Point single-rule validation errors ("rules[0].x") at the bulk input ("rules[<index>].x")
+    """
+    return [
+        {**error, "field": error["field"].replace("rules[0]", f"rules[{index}]", 1)}
+        for error in validation_errors
+    ]
+
+
+def plan_submissions(rules: List[dict], validate: Optional[Callable[[str, dict], List[dict]]] = None):
+    """
+    Split bulk rules into submissions and per-rule failures.
+
+    Returns (submissions, failures): submissions are (tool_name, tool_args,
+    input indexes); failures map an input index to its error result.
+    """
+    submissions = []
+    cpi_batches = {}
+    failures = {}
+
+    for index, item in enumerate(rules):
+        rule_type = str(item.get("rule_type", "")).lower()
+        tool_name = BULK_RULE_TYPES.get(rule_type)
+        if tool_name is None:
+            failures[index] = {"error": f"Unknown rule_type {item.get('rule_type')!r}; use one of {', '.join(BULK_RULE_TYPES)}"}
+            continue
+
+        panel_id = item.get("panel_id")
+        rule = {k: v for k, v in item.items() if k in RULE_FIELDS[tool_name]}
+        tool_args = {"panel_id": panel_id, "rules": [rule]}
+
+        if validate is not None:
+            validation_errors = validate(tool_name, tool_args)
+            if validation_errors:
+                failures[index] = {
+                    "error": "Invalid rule; fix the listed fields",
+                    "validation_errors": _prefix_errors(validation_errors, index),
+                }
+                continue
+
+        if tool_name in MULTI_RULE_TOOLS:
+            batch = cpi_batches.get((tool_name, panel_id))
+            if batch is None:
+                batch = cpi_batches[(tool_name, panel_id)] = (tool_name, {"panel_id": panel_id, "rules": []}, [])
+                submissions.append(batch)
+            batch[1]["rules"].append(rule)
+            batch[2].append(index)
+        else:
+            submissions.append((tool_name, tool_args, [index]))
+
+    return submissions, failures
+
+
+async def create_rules_bulk(
+    tool_args: dict,
+    execute: Callable[[str, dict], Awaitable[dict]],
+    concurrency: int = 4,
+    validate: Optional[Callable[[str, dict], List[dict]]] = None,
+) -> dict:
+    """
+    Execute a create_rules_bulk call. execute runs one single-type tool call
+    (e.g. execute_tool_call); validate checks its arguments beforehand.
+    """
+    rules = tool_args.get("rules") or []
+    if not isinstance(rules, list) or not rules:
+        return {"success": False, "error": "rules must be a non-empty array"}
+    # Tool validation rejects these first; this covers TOOL_VALIDATION=false
+    if len(rules) > BULK_RULE_LIMIT:
+        return {"success": False, "error": f"At most {BULK_RULE_LIMIT} rules per call (got {len(rules)}); split the request"}
+    rules = [rule if isinstance(rule, dict) else {} for rule in rules]
+
+    submissions, failures = plan_submissions(rules, validate)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(tool_name: str, submission_args: dict) -> dict:
+        async with semaphore:
+            return await execute(tool_name, submission_args)
+
+    responses = await asyncio.gather(*(submit(tool_name, args) for tool_name, args, _ in submissions))
+
+    results: List[Optional[dict]] = [None] * len(rules)
+    submission_results = []
+    for (tool_name, args, indexes), response in zip(submissions, responses):
+        submission_results.append({"tool": tool_name, "panel_id": args["panel_id"], "rules": indexes, **response})
+        for index in indexes:
+            results[index] = {"success": response.get("success", False)}
+            if not response.get("success"):
+                results[index]["error"] = response.get("error")
+    for index, failure in failures.items():
+        results[index] = {"success": False, **failure}
+
+    for index, (rule, result) in enumerate(zip(rules, results)):
+        results[index] = {
+            "index": index,
+            "rule_type": rule.get("rule_type"),
+            "panel_id": rule.get("panel_id"),
+            "rule_desc": rule.get("rule_desc"),
+            **result,
+        }
+
+    created = sum(1 for result in results if result["success"])
+    return {
+        "success": created == len(rules),
+        "created": created,
+        "failed": len(rules) - created,
+        "results": results,
+        "responses": submission_results,
+    }
@@ -0,0 +1,408 @@
+"""
+Pluggable Cache Backends
+
+With several uvicorn workers behind a load balancer, an in-process cache is
+split per worker and a write seen by one worker doesn't invalidate the others.
+The caches in this app store values through a small async backend interface:
+
+- MemoryCacheBackend: per-process LRU with TTLs (the default)
+- RedisCacheBackend:  shared Redis (or any Redis-protocol server), so entries
+                      and invalidations are visible to every worker
+- FakeRedis:          in-process stand-in for the Redis client, for local runs
+                      and tests without a server
+
+Every entry carries tags; invalidating a tag drops all entries carrying it
+(e.g. "meijer|panel:3760" after a panel update). Redis values are encoded
+with orjson (or the stdlib json when orjson is not installed) or msgpack.
+"""
+
+import fnmatch
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCodec:
+    """
+    JSON value encoding, using orjson when it is installed
+    """
+
+    name = "json"
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+        self._orjson = orjson
+
+    def encode(self, value: Any) -> bytes:
+        if self._orjson is not None:
+            return self._orjson.dumps(value)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        if self._orjson is not None:
+            return self._orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    """
+    msgpack value encoding (requires the 'msgpack' package)
+    """
+
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def encode(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def create_codec(name: str):
+    if name == "msgpack":
+        try:
+            return MsgpackCodec()
+        except ImportError:
+            logger.warning("msgpack cache encoding requested but the 'msgpack' package is not installed; using JSON")
+    return JsonCodec()
+
+
+class CacheBackend:
+    """
+    Async key-value store with per-entry TTLs and tag invalidation
+    """
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        raise NotImplementedError
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Drop every entry carrying any of the tags. Returns the number removed.
+        """
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per-process LRU + TTL store. Values are kept as-is, without encoding.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+
+        # key -> (expires_at, value, tags)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        if key in self._entries:
+            self._remove(key)
+
+        tags = list(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        return removed
+
+    async def clear(self):
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared store on Redis. Values live at "<namespace>:v:<key>" with a native
+    TTL; each tag is a set of value keys at "<namespace>:t:<tag>" whose TTL is
+    kept at least as long as its longest-lived member.
+
+    Redis errors are logged and treated as misses, so an unavailable Redis
+    degrades to uncached upstream calls rather than failed tool calls.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, namespace: str = "chatbot", codec=None):
+        self.client = client
+        self.namespace = namespace
+        self.codec = codec or JsonCodec()
+
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCacheBackend":
+        import redis.asyncio as redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _value_key(self, key: str) -> str:
+        return f"{self.namespace}:v:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:t:{tag}"
+
+    def _failed(self, operation: str, e: Exception):
+        self.errors += 1
+        logger.warning(f"Redis cache {operation} failed: {str(e)}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            data = await self.client.get(self._value_key(key))
+        except Exception as e:
+            self._failed("get", e)
+            return None
+        return None if data is None else self.codec.decode(data)
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        value_key = self._value_key(key)
+        seconds = max(1, int(ttl))
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(value_key, self.codec.encode(value), ex=seconds)
+            for tag_key in tag_keys:
+                pipe.sadd(tag_key, value_key)
+                pipe.ttl(tag_key)
+            results = await pipe.execute()
+
+            # Tag sets are only ever extended (a new set has no TTL, i.e. -1).
+            # EXPIRE NX/GT would do this in one step but needs Redis 7; here a
+            # concurrent set of the same tag can leave it at the shorter TTL.
+            ttls = results[2::2]
+            extend = [tag_key for tag_key, ttl in zip(tag_keys, ttls) if ttl < seconds]
+            if extend:
+                pipe = self.client.pipeline(transaction=False)
+                for tag_key in extend:
+                    pipe.expire(tag_key, seconds)
+                await pipe.execute()
+        except Exception as e:
+            self._failed("set", e)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        try:
+            for tag in tags:
+                tag_key = self._tag_key(tag)
+                members = await self.client.smembers(tag_key)
+                if members:
+                    removed += await self.client.delete(*members)
+                await self.client.delete(tag_key)
+        except Exception as e:
+            self._failed("invalidate", e)
+        return removed
+
+    async def clear(self):
+        try:
+            keys = [key async for key in self.client.scan_iter(match=f"{self.namespace}:*")]
+            if keys:
+                await self.client.delete(*keys)
+        except Exception as e:
+            self._failed("clear", e)
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "namespace": self.namespace,
+            "encoding": self.codec.name,
+            "errors": self.errors,
+        }
+
+
+class FakeRedis:
+    """
+    In-process implementation of the redis.asyncio commands RedisCacheBackend
+    uses, with the same semantics (bytes keys and values, TTLs, sets)
+    """
+
+    def __init__(self):
+        # key -> (value, expires_at or None)
+        self._data: Dict[bytes, list] = {}
+
+    @staticmethod
+    def _key(key) -> bytes:
+        return key if isinstance(key, bytes) else str(key).encode("utf-8")
+
+    def _live(self, key: bytes) -> Optional[list]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(self._key(key))
+        return None if entry is None else entry[0]
+
+    async def set(self, key, value, ex: Optional[int] = None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self._data[self._key(key)] = [value, time.monotonic() + ex if ex else None]
+        return True
+
+    async def sadd(self, key, *members) -> int:
+        key = self._key(key)
+        entry = self._live(key)
+        if entry is None:
+            entry = self._data[key] = [set(), None]
+        before = len(entry[0])
+        entry[0].update(self._key(member) for member in members)
+        return len(entry[0]) - before
+
+    async def smembers(self, key) -> Set[bytes]:
+        entry = self._live(self._key(key))
+        return set() if entry is None else set(entry[0])
+
+    async def expire(self, key, seconds: int) -> bool:
+        entry = self._live(self._key(key))
+        if entry is None:
+            return False
+        entry[1] = time.monotonic() + seconds
+        return True
+
+    async def ttl(self, key) -> int:
+        """
+        Seconds left, -1 for a key without a TTL, -2 for a missing key
+        """
+        entry = self._live(self._key(key))
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, round(entry[1] - time.monotonic()))
+
+    async def delete(self, *keys) -> int:
+        removed = 0
+        for key in keys:
+            key = self._key(key)
+            if self._live(key) is not None:
+                del self._data[key]
+                removed += 1
+        return removed
+
+    async def scan_iter(self, match: str = "*"):
+        for key in list(self._data):
+            if self._live(key) is not None and fnmatch.fnmatchcase(key.decode("utf-8"), match):
+                yield key
+
+    def pipeline(self, transaction: bool = True) -> "_FakePipeline":
+        return _FakePipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class _FakePipeline:
+    """
+    Queues commands and runs them in order on execute()
+    """
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, command: str):
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [await getattr(self._redis, command)(*args, **kwargs) for command, args, kwargs in commands]
+
+
+def create_cache_backend(
+    kind: str = "memory",
+    max_entries: int = 1000,
+    redis_url: Optional[str] = None,
+    namespace: str = "chatbot",
+    encoding: str = "json",
+) -> CacheBackend:
+    """
+    Build the backend named by kind: "memory", "redis" or "fake-redis".
+    Falls back to memory if the Redis client library is not installed.
+    """
+    if kind in ("redis", "fake-redis"):
+        codec = create_codec(encoding)
+        if kind == "fake-redis":
+            return RedisCacheBackend(FakeRedis(), namespace=namespace, codec=codec)
+        try:
+            return RedisCacheBackend.from_url(redis_url or "redis://localhost:6379/0", namespace=namespace, codec=codec)
+        except ImportError:
+            logger.warning("Redis cache backend requested but the 'redis' package is not installed; using memory")
+    elif kind != "memory":
+        logger.warning(f"Unknown cache backend {kind!r}; using memory")
+    return MemoryCacheBackend(max_entries=max_entries)
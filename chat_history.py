@@ -0,0 +1,106 @@
+"""
+Conversation History for LLM Calls
+
+This module builds the conversation history sent to Gemini. Only the tail of
+a chat is fetched from MongoDB, and the most recent turns are kept within a
+token budget, so request size stays flat no matter how long a chat grows.
+"""
+
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+
+
+def load_encoding() -> bool:
+    """
+    Load tiktoken's cl100k_base encoding, a stand-in for Gemini's tokenizer.
+
+    On a cold cache this downloads the encoding file, a blocking call with no
+    timeout: the server runs it in a thread at startup (see startup_tokenizer),
+    never on the request path. Returns False if it cannot be loaded.
+    """
+    global _encoding
+    if _encoding is not None:
+        return True
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+        return False
+    return True
+
+
+def encoding_loaded() -> bool:
+    """
+    Whether count_tokens uses the tiktoken encoding rather than the length estimate
+    """
+    return _encoding is not None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate the number of tokens in text.
+
+    Uses the tiktoken encoding once load_encoding has loaded it; until then, or
+    if it cannot be loaded (e.g. no network to fetch the encoding file), falls
+    back to the common ~4 characters per token estimate.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def trim_to_token_budget(messages: List[dict], token_budget: int) -> List[dict]:
+    """
+    Keep the most recent messages whose combined size fits in token_budget.
+    The newest message is always kept, even if it alone exceeds the budget.
+    """
+    kept = []
+    used = 0
+    for msg in reversed(messages):
+        tokens = count_tokens(msg["content"])
+        if kept and used + tokens > token_budget:
+            break
+        kept.append(msg)
+        used += tokens
+    kept.reverse()
+    return kept
+
+
+async def load_recent_history(
+    db,
+    chat_id: str,
+    token_budget: int,
+    max_messages: int,
+    after: Optional[str] = None,
+) -> List[dict]:
+    """
+    Fetch the last max_messages messages of a chat (newest first, via the
+    (chat_id, timestamp) index), restore chronological order and trim them to
+    token_budget. Returns messages as {"role", "content"} dicts.
+
+    When after is given, only messages with a later timestamp are considered
+    (used to skip messages already folded into the chat summary).
+    """
+    query = {"chat_id": chat_id}
+    if after:
+        query["timestamp"] = {"$gt": after}
+
+    cursor = db.messages.find(
+        query,
+        {"_id": 0, "role": 1, "content": 1},
+    ).sort("timestamp", -1).limit(max_messages)
+    recent = await cursor.to_list(max_messages)
+    recent.reverse()
+
+    history = trim_to_token_budget(
+        [{"role": msg["role"], "content": msg["content"]} for msg in recent],
+        token_budget,
+    )
+    if len(history) < len(recent):
+        logger.info(f"Trimmed history for chat {chat_id} to {len(history)}/{len(recent)} messages ({token_budget} token budget)")
+    return history
@@ -0,0 +1,255 @@
+"""
+Background Chat Turn Jobs
+
+A chat turn can take minutes (several Gemini iterations plus tool calls),
+which ties up a worker and a load-balancer connection for the whole time when
+served synchronously. In job mode the POST returns a job id right away and a
+bounded pool of asyncio workers runs the turn:
+
+- job state lives in the chat_jobs collection, so clients can poll it from
+  any worker,
+- the number of queued jobs is capped; submissions beyond it are rejected
+  (the route answers 429),
+- turns of the same chat run one at a time, in submission order, while
+  different chats run in parallel.
+
+Queued jobs are held by the process that accepted them; jobs still queued or
+running at shutdown are marked failed.
+
+Job document shape:
+    {
+        "id": str,
+        "chat_id": str,
+        "content": str,             # The user message
+        "status": str,              # "queued", "running", "succeeded" or "failed"
+        "created_at": str,
+        "started_at": str | None,
+        "finished_at": str | None,
+        "result": dict | None,      # {"user_message": ..., "assistant_message": ...}
+        "error": str | None,
+        "expires_at": datetime,     # TTL index; finished jobs are kept for the retention period
+    }
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, content) -> {"user_message": ..., "assistant_message": ...}
+RunTurnFn = Callable[[str, str], Awaitable[dict]]
+
+TERMINAL_STATUSES = {"succeeded", "failed"}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ChatJobQueue:
+    """
+    Bounded worker pool running chat turns, serialized per chat
+    """
+
+    def __init__(self, db, run_turn: RunTurnFn, workers: int = 4, max_queued: int = 100, retention_seconds: int = 86400):
+        self.db = db
+        self.run_turn = run_turn
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = timedelta(seconds=retention_seconds)
+
+        # chat_id -> job ids waiting to run, in submission order
+        self._pending: Dict[str, Deque[str]] = {}
+        # Chats with queued jobs and no job running, in the order they became ready
+        self._ready: "asyncio.Queue[str]" = asyncio.Queue()
+        # Chats with a job running or waiting in _ready
+        self._scheduled: Set[str] = set()
+        self._queued = 0
+        self._running: Set[str] = set()
+        # job id -> event set whenever the job's status changes in this process
+        self._events: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, chat_id: str, content: str) -> dict:
+        """
+        Persist and queue a turn. Raises QueueFull when max_queued jobs are waiting.
+        """
+        if self._queued >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull(f"{self._queued} chat jobs are already queued")
+
+        now = _now()
+        job = {
+            "id": str(uuid.uuid4()),
+            "chat_id": chat_id,
+            "content": content,
+            "status": "queued",
+            "created_at": now.isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "expires_at": now + self.retention,
+        }
+        # Reserve the slot before awaiting, so concurrent submissions can't overshoot
+        self._queued += 1
+        try:
+            await self.db.chat_jobs.insert_one(dict(job))
+        except Exception:
+            self._queued -= 1
+            raise
+
+        self.submitted += 1
+        self._pending.setdefault(chat_id, deque()).append(job["id"])
+        if chat_id not in self._scheduled:
+            self._scheduled.add(chat_id)
+            self._ready.put_nowait(chat_id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db.chat_jobs.find_one({"id": job_id}, {"_id": 0, "expires_at": 0})
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            job_id = self._pending[chat_id].popleft()
+            self._queued -= 1
+            self._running.add(job_id)
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. MongoDB unreachable while updating the job: keep the worker alive
+                logger.error(f"Chat job {job_id} could not be run: {str(e)}")
+                await self._mark_failed(job_id, str(e))
+            finally:
+                self._running.discard(job_id)
+                # Re-queue the chat behind other ready chats, so one busy chat can't starve the rest
+                if self._pending[chat_id]:
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._pending[chat_id]
+                    self._scheduled.discard(chat_id)
+
+    async def _run_job(self, job_id: str):
+        job = await self.db.chat_jobs.find_one_and_update(
+            {"id": job_id},
+            {"$set": {"status": "running", "started_at": _now().isoformat()}},
+            projection={"_id": 0},
+        )
+        self._notify(job_id)
+        if job is None:
+            return
+
+        update = {}
+        try:
+            update["result"] = await self.run_turn(job["chat_id"], job["content"])
+            update["status"] = "succeeded"
+        except Exception as e:
+            logger.error(f"Chat job {job_id} failed: {str(e)}")
+            update["status"] = "failed"
+            update["error"] = str(e)
+        update["finished_at"] = _now().isoformat()
+
+        await self.db.chat_jobs.update_one({"id": job_id}, {"$set": update})
+        if update["status"] == "succeeded":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self._notify(job_id)
+
+    async def _mark_failed(self, job_id: str, error: str):
+        """
+        Best-effort: fail a job whose run broke down outside the turn itself
+        """
+        self.failed += 1
+        try:
+            await self.db.chat_jobs.update_one(
+                {"id": job_id, "status": {"$in": ["queued", "running"]}},
+                {"$set": {"status": "failed", "error": error, "finished_at": _now().isoformat()}},
+            )
+        except Exception as e:
+            logger.error(f"Failed to mark chat job {job_id} failed: {str(e)}")
+        self._notify(job_id)
+
+    def _notify(self, job_id: str):
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def subscribe(self, job_id: str, poll_interval: float = 1.0) -> AsyncIterator[dict]:
+        """
+        Yield the job document every time its status changes, ending with the
+        terminal state. Changes made in this process are delivered immediately;
+        jobs run by another process are picked up by polling.
+        """
+        last_status = None
+        try:
+            while True:
+                event = self._events.setdefault(job_id, asyncio.Event())
+                job = await self.get(job_id)
+                if job is None:
+                    return
+                if job["status"] != last_status:
+                    last_status = job["status"]
+                    yield job
+                if last_status in TERMINAL_STATUSES:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if last_status in TERMINAL_STATUSES:
+                self._events.pop(job_id, None)
+
+    async def close(self):
+        """
+        Stop the workers and fail the jobs that were queued or running
+        """
+        unfinished = list(self._running) + [job_id for job_ids in self._pending.values() for job_id in job_ids]
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if not unfinished:
+            return
+        try:
+            await self.db.chat_jobs.update_many(
+                {"id": {"$in": unfinished}, "status": {"$in": ["queued", "running"]}},
+                {"$set": {"status": "failed", "error": "Server shut down before the job finished", "finished_at": _now().isoformat()}},
+            )
+        except Exception as e:
+            logger.error(f"Failed to mark unfinished chat jobs: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queued,
+            "running": len(self._running),
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
@@ -0,0 +1,206 @@
+"""
+Per-Chat Turn Locks
+
+Two quick messages to the same chat used to race: both turns read the same
+history, both called Gemini and both wrote their messages, interleaved. Turns
+now hold a per-chat lock, so turns of one chat run one at a time while other
+chats run in parallel:
+
+- "local": an asyncio.Lock per chat, serializing turns within one process
+- "mongo": the local lock plus a lease document in chat_leases, serializing
+  turns across every worker process. The lease expires if its holder dies
+  and is renewed while the turn is running.
+
+A turn that cannot get the lock within the wait timeout fails with ChatBusy.
+With supersede enabled, turns that were still waiting for the lock when a
+newer turn of the same chat arrived are skipped (they fail with
+TurnSuperseded), so only the latest pending message is answered.
+"""
+
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Set
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class ChatTurnConflict(Exception):
+    """
+    A turn could not run because of another turn in the same chat
+    """
+
+
+class ChatBusy(ChatTurnConflict):
+    pass
+
+
+class TurnSuperseded(ChatTurnConflict):
+    pass
+
+
+class _ChatState:
+    __slots__ = ("lock", "tickets", "waiting", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Turns are numbered in arrival order; waiting holds the numbers of turns waiting for the lock
+        self.tickets = 0
+        self.waiting: Set[int] = set()
+        self.users = 0
+
+
+class ChatTurnLocks:
+    """
+    Serializes chat turns per chat, in-process or across processes
+    """
+
+    def __init__(
+        self,
+        db=None,
+        mode: str = "local",
+        lease_seconds: float = 60,
+        wait_timeout: float = 120,
+        supersede: bool = False,
+    ):
+        self.db = db
+        self.mode = mode
+        self.lease_seconds = lease_seconds
+        self.wait_timeout = wait_timeout
+        self.supersede = supersede
+
+        self._chats: Dict[str, _ChatState] = {}
+
+        self.acquired = 0
+        self.waited = 0
+        self.busy = 0
+        self.superseded = 0
+
+    @asynccontextmanager
+    async def hold(self, chat_id: str) -> AsyncIterator[None]:
+        """
+        Hold the chat's turn lock for the duration of the block
+        """
+        if self.mode == "off":
+            yield
+            return
+
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+        state.users += 1
+        try:
+            await self._acquire_local(chat_id, state)
+            try:
+                if self.mode == "mongo":
+                    async with self._lease(chat_id):
+                        yield
+                else:
+                    yield
+            finally:
+                state.lock.release()
+        finally:
+            state.users -= 1
+            if state.users == 0:
+                del self._chats[chat_id]
+
+    async def _acquire_local(self, chat_id: str, state: _ChatState):
+        state.tickets += 1
+        ticket = state.tickets
+        if not state.lock.locked() and not state.waiting:
+            # Free: acquire() returns without yielding, so no newer turn can slip in
+            await state.lock.acquire()
+            self.acquired += 1
+            return
+
+        self.waited += 1
+        state.waiting.add(ticket)
+        try:
+            await asyncio.wait_for(state.lock.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.busy += 1
+            raise ChatBusy(f"Another turn in chat {chat_id} is still running")
+        finally:
+            state.waiting.discard(ticket)
+
+        # The lock is handed out in arrival order; with supersede, a turn that
+        # gets it while a newer turn is waiting passes it on without running
+        if self.supersede and state.waiting and max(state.waiting) > ticket:
+            state.lock.release()
+            self.superseded += 1
+            raise TurnSuperseded(f"A newer message in chat {chat_id} replaced this one")
+        self.acquired += 1
+
+    @asynccontextmanager
+    async def _lease(self, chat_id: str) -> AsyncIterator[None]:
+        """
+        Hold the chat's lease document, renewing it until the block exits
+        """
+        owner = str(uuid.uuid4())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.1
+        waited = False
+        while not await self._try_lease(chat_id, owner):
+            if loop.time() + delay > deadline:
+                self.busy += 1
+                raise ChatBusy(f"Another turn in chat {chat_id} is still running")
+            if not waited:
+                waited = True
+                self.waited += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+        renew = asyncio.create_task(self._renew_lease(chat_id, owner))
+        try:
+            yield
+        finally:
+            renew.cancel()
+            await asyncio.gather(renew, return_exceptions=True)
+            try:
+                await self.db.chat_leases.delete_one({"chat_id": chat_id, "owner": owner})
+            except Exception as e:
+                logger.warning(f"Failed to release lease on chat {chat_id}; it expires on its own: {str(e)}")
+
+    async def _try_lease(self, chat_id: str, owner: str) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches an expired lease; otherwise the upsert collides with the live one
+            await self.db.chat_leases.update_one(
+                {"chat_id": chat_id, "expires_at": {"$lte": now}},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _renew_lease(self, chat_id: str, owner: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+            try:
+                result = await self.db.chat_leases.update_one(
+                    {"chat_id": chat_id, "owner": owner},
+                    {"$set": {"expires_at": expires_at}},
+                )
+                if result.matched_count == 0:
+                    logger.warning(f"Lost the lease on chat {chat_id}; another turn may run concurrently")
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to renew lease on chat {chat_id}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "active_chats": len(self._chats),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "busy": self.busy,
+            "superseded": self.superseded,
+        }
+
@@ -0,0 +1,140 @@
+"""
+Rolling Summaries of Long Chats
+
+Once a chat has more than SUMMARY_TRIGGER_MESSAGES unsummarized messages, the
+older ones are folded into a running summary stored per chat in the
+chat_summaries collection. The summary is then sent to Gemini in place of
+those raw turns.
+
+Summarization runs in background asyncio tasks, off the request path, and is
+incremental: each run only feeds the previous summary plus the messages that
+arrived since the last run, at most SUMMARY_TRIGGER_MESSAGES per Gemini call.
+
+Summary document shape:
+    {
+        "chat_id": str,
+        "summary": str,
+        "summarized_until": str,   # ISO timestamp of the last summarized message
+        "summarized_count": int,   # Total messages folded into the summary
+        "updated_at": str,
+    }
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# (previous_summary, new_messages) -> updated summary
+SummarizeFn = Callable[[str, List[dict]], Awaitable[str]]
+
+
+async def get_summary(db, chat_id: str) -> Optional[dict]:
+    return await db.chat_summaries.find_one({"chat_id": chat_id}, {"_id": 0})
+
+
+class ChatSummarizer:
+    """
+    Schedules and runs incremental summarization of chats in the background
+    """
+
+    def __init__(self, db, summarize: SummarizeFn, trigger_messages: int, keep_recent: int):
+        self.db = db
+        self.summarize = summarize
+        self.trigger_messages = trigger_messages
+        self.keep_recent = keep_recent
+
+        # Chats with a summarization task in flight, so a chat is never summarized twice at once
+        self._in_progress: Set[str] = set()
+        # Strong references to running tasks (asyncio only keeps weak ones)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, chat_id: str):
+        """
+        Start a background summarization for chat_id unless one is already running
+        """
+        if chat_id in self._in_progress:
+            return
+        self._in_progress.add(chat_id)
+        task = asyncio.create_task(self._run(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, chat_id: str):
+        try:
+            await self.summarize_chat(chat_id)
+        except Exception as e:
+            logger.error(f"Error summarizing chat {chat_id}: {str(e)}")
+        finally:
+            self._in_progress.discard(chat_id)
+
+    async def summarize_chat(self, chat_id: str) -> bool:
+        """
+        Fold messages older than the newest keep_recent ones into the running
+        summary, if more than trigger_messages are unsummarized. Returns True
+        when the summary was updated.
+
+        Each Gemini call folds at most trigger_messages messages, so a long
+        backlog (an old chat, or earlier runs that failed) is worked off in
+        several bounded calls rather than one oversized prompt.
+        """
+        summary_doc = await get_summary(self.db, chat_id) or {}
+        query = {"chat_id": chat_id}
+        if summary_doc.get("summarized_until"):
+            query["timestamp"] = {"$gt": summary_doc["summarized_until"]}
+
+        pending = await self.db.messages.count_documents(query)
+        if pending <= self.trigger_messages:
+            return False
+
+        summary = summary_doc.get("summary", "")
+        summarized_until = summary_doc.get("summarized_until")
+        updated = False
+        while pending > self.keep_recent:
+            batch = min(pending - self.keep_recent, self.trigger_messages)
+            if summarized_until:
+                query["timestamp"] = {"$gt": summarized_until}
+            new_messages = await self.db.messages.find(
+                query,
+                {"_id": 0, "role": 1, "content": 1, "timestamp": 1},
+            ).sort("timestamp", 1).limit(batch).to_list(batch)
+            if not new_messages:
+                break
+
+            summary = await self.summarize(summary, new_messages)
+
+            # Only advance if nobody else moved the cursor meanwhile (e.g. another worker)
+            try:
+                await self.db.chat_summaries.update_one(
+                    {"chat_id": chat_id, "summarized_until": summarized_until},
+                    {
+                        "$set": {
+                            "summary": summary,
+                            "summarized_until": new_messages[-1]["timestamp"],
+                            "updated_at": datetime.now(timezone.utc).isoformat(),
+                        },
+                        "$inc": {"summarized_count": len(new_messages)},
+                    },
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                logger.info(f"Summary of chat {chat_id} was advanced concurrently, discarding this run")
+                return updated
+            logger.info(f"Summarized {len(new_messages)} messages of chat {chat_id}")
+            updated = True
+            summarized_until = new_messages[-1]["timestamp"]
+            pending -= len(new_messages)
+        return updated
+
+    async def close(self):
+        """
+        Cancel summarization tasks still running at shutdown
+        """
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,145 @@
+"""
+MongoDB Index Definitions
+
+This module contains the indexes backing the chat and message queries in
+server.py. Indexes are created idempotently at application startup.
+
+Run it directly to print the explain() plan of every route query:
+
+    python db_indexes.py
+"""
+
+import os
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Indexes per collection
+INDEXES = {
+    "chats": [
+        # find_one / update_one / delete_one on {"id": chat_id}
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # get_chats: keyset pages on (updated_at, id), newest first
+        IndexModel([("updated_at", DESCENDING), ("id", DESCENDING)], name="updated_at_id_desc"),
+    ],
+    "messages": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # get_messages keyset pages on (timestamp, id) and recent history by timestamp, per chat
+        IndexModel([("chat_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="chat_id_timestamp_id"),
+    ],
+    "chat_summaries": [
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+    ],
+    "chat_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Jobs are removed once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "chat_leases": [
+        # One live turn lease per chat; taking a held lease fails on this index
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+        # Leases of crashed workers are removed after they expire
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+# Indexes superseded by the ones above, dropped at startup if present
+SUPERSEDED_INDEXES = {
+    # Prefixes of updated_at_id_desc / chat_id_timestamp_id
+    "chats": ["updated_at_desc"],
+    "messages": ["chat_id_timestamp"],
+}
+
+
+async def ensure_indexes(db):
+    """
+    Create all indexes in INDEXES and drop SUPERSEDED_INDEXES. Safe to call on
+    every startup: MongoDB treats re-creating an existing index with the same
+    spec as a no-op.
+    """
+    for collection_name, indexes in INDEXES.items():
+        names = await db[collection_name].create_indexes(indexes)
+        logger.info(f"Ensured indexes on {collection_name}: {', '.join(names)}")
+
+    for collection_name, names in SUPERSEDED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name not in existing:
+                continue
+            try:
+                await db[collection_name].drop_index(name)
+                logger.info(f"Dropped superseded index {collection_name}.{name}")
+            except OperationFailure as e:
+                logger.warning(f"Could not drop index {collection_name}.{name}: {str(e)}")
+
+
+def _route_queries(db, chat_id: str):
+    """
+    The cursors issued by the chat and message routes, keyed by a readable label
+    """
+    return {
+        "get_chats": db.chats.find({}, {"_id": 0}).sort([("updated_at", -1), ("id", -1)]).limit(100),
+        "get_chat_by_id": db.chats.find({"id": chat_id}).limit(1),
+        "get_messages": db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort([("timestamp", 1), ("id", 1)]).limit(1000),
+    }
+
+
+def _summarize_plan(plan: dict) -> dict:
+    """
+    Reduce an explain() document to the winning plan stages and execution counters
+    """
+    stages = []
+    stage = plan.get("queryPlanner", {}).get("winningPlan", {})
+    while stage:
+        stages.append(stage.get("stage") + (f" ({stage['indexName']})" if "indexName" in stage else ""))
+        stage = stage.get("inputStage")
+
+    stats = plan.get("executionStats", {})
+    return {
+        "stages": stages,
+        "nReturned": stats.get("nReturned"),
+        "totalKeysExamined": stats.get("totalKeysExamined"),
+        "totalDocsExamined": stats.get("totalDocsExamined"),
+        "executionTimeMillis": stats.get("executionTimeMillis"),
+    }
+
+
+async def explain_route_queries(db, chat_id: str = None) -> dict:
+    """
+    Return a summarized explain() plan for every route query. Uses the most
+    recently updated chat when no chat_id is given.
+    """
+    if chat_id is None:
+        latest = await db.chats.find_one({}, {"_id": 0, "id": 1}, sort=[("updated_at", -1)])
+        chat_id = latest["id"] if latest else ""
+
+    plans = {}
+    for label, cursor in _route_queries(db, chat_id).items():
+        plans[label] = _summarize_plan(await cursor.explain())
+    return plans
+
+
+async def _main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        print(json.dumps(await explain_route_queries(db), indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,165 @@
+"""
+Gemini Context Caching
+
+The system prompt and tool declarations are identical on every request and
+make up most of the input tokens. With context caching enabled they are
+uploaded once as a Gemini cachedContents resource, and each request only
+references the cache by name.
+
+Caches are keyed by a hash of (model, system prompt, tools), so any prompt or
+tool change creates a new cache. A cache's TTL is extended shortly before it
+expires; if creating or refreshing fails, callers fall back to sending the
+prompt and tools inline.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+from http_clients import PooledClient
+from tool_payload import ToolSet
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=32)
+def context_hash(model: str, system_prompt: str, tools_fingerprint: str) -> str:
+    """
+    Stable content hash identifying a (model, system prompt, tools) combination
+    """
+    content = json.dumps(
+        {"model": model, "system_prompt": system_prompt, "tools": tools_fingerprint},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class GeminiContextCache:
+    """
+    Creates, refreshes and hands out Gemini cachedContents resources
+    """
+
+    def __init__(
+        self,
+        client: PooledClient,
+        base_url: str,
+        model: str,
+        ttl_seconds: int,
+        refresh_margin_seconds: int,
+        retry_after_failure_seconds: int = 300,
+    ):
+        self.client = client
+        self.base_url = base_url
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_failure_seconds = retry_after_failure_seconds
+
+        # content hash -> {"name": str, "expires_at": monotonic seconds}
+        self._entries: Dict[str, dict] = {}
+        # content hash -> monotonic time before which creation is not retried
+        self._failed_until: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        self.hits = 0
+        self.creates = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    async def get_cache_name(self, api_key: str, system_prompt: str, tool_set: ToolSet) -> Optional[str]:
+        """
+        Return the cachedContents name for this prompt and tool set, creating or
+        refreshing it as needed. Returns None if no cache is available.
+        """
+        key = context_hash(self.model, system_prompt, tool_set.fingerprint)
+        entry = self._entries.get(key)
+        if entry and entry["expires_at"] - time.monotonic() > self.refresh_margin_seconds:
+            self.hits += 1
+            return entry["name"]
+
+        if self._failed_until.get(key, 0) > time.monotonic():
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have created/refreshed it while we waited
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] - time.monotonic() > self.refresh_margin_seconds:
+                self.hits += 1
+                return entry["name"]
+
+            try:
+                if entry and entry["expires_at"] > time.monotonic():
+                    await self._refresh(api_key, entry)
+                else:
+                    entry = await self._create(api_key, key, system_prompt, tool_set)
+                    self._entries[key] = entry
+            except Exception as e:
+                self.failures += 1
+                self._entries.pop(key, None)
+                self._failed_until[key] = time.monotonic() + self.retry_after_failure_seconds
+                logger.warning(f"Gemini context cache unavailable, sending prompt inline: {str(e)}")
+                return None
+
+            return entry["name"]
+
+    async def _create(self, api_key: str, key: str, system_prompt: str, tool_set: ToolSet) -> dict:
+        url = f"{self.base_url}/v1beta/cachedContents"
+        body = {
+            "model": f"models/{self.model}",
+            "displayName": f"pricing-analyst-{key[:12]}",
+            "systemInstruction": {"parts": [{"text": system_prompt}]},
+            "ttl": f"{self.ttl_seconds}s",
+        }
+        if tool_set.names:
+            body["tools"] = tool_set.config
+        response = await self.client.post(url, json=body, headers=self._headers(api_key))
+        response.raise_for_status()
+
+        self.creates += 1
+        name = response.json()["name"]
+        logger.info(f"Created Gemini context cache {name} (ttl={self.ttl_seconds}s)")
+        return {"name": name, "expires_at": time.monotonic() + self.ttl_seconds}
+
+    async def _refresh(self, api_key: str, entry: dict):
+        url = f"{self.base_url}/v1beta/{entry['name']}"
+        response = await self.client.patch(
+            url,
+            params={"updateMask": "ttl"},
+            json={"ttl": f"{self.ttl_seconds}s"},
+            headers=self._headers(api_key),
+        )
+        response.raise_for_status()
+
+        self.refreshes += 1
+        entry["expires_at"] = time.monotonic() + self.ttl_seconds
+        logger.info(f"Refreshed Gemini context cache {entry['name']}")
+
+    def invalidate(self, name: str):
+        """
+        Forget a cache that Gemini no longer recognizes (e.g. deleted externally)
+        """
+        for key, entry in list(self._entries.items()):
+            if entry["name"] == name:
+                del self._entries[key]
+
+    @staticmethod
+    def _headers(api_key: str) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "X-goog-api-key": api_key
+        }
+
+    def stats(self) -> dict:
+        return {
+            "caches": len(self._entries),
+            "hits": self.hits,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,155 @@
+"""
+Shared HTTP Clients for Upstream APIs
+
+This module contains the long-lived, pooled httpx client wrapper used to talk
+to the Scenario API and the Gemini API. One client per upstream is started
+with the application and reused by every request, so connections are kept
+alive across requests instead of paying a fresh TCP/TLS handshake per call.
+"""
+
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    return os.environ.get(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PooledClient:
+    """
+    Wrapper around a long-lived httpx.AsyncClient that tracks pool usage.
+
+    httpx does not expose connection pool occupancy publicly, so requests are
+    counted as they go through the client. A request is considered to have hit
+    a saturated pool when the number of in-flight requests already equals the
+    configured max_connections when it starts.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: httpx.Timeout,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not _http2_available():
+            logger.warning(f"HTTP/2 requested for {name} client but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Pool usage metrics
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests_total = 0
+        self.saturated_total = 0
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport,
+            )
+            logger.info(
+                f"Started {self.name} HTTP client (max_connections={self.limits.max_connections}, "
+                f"keepalive_expiry={self.limits.keepalive_expiry}s, http2={self.http2})"
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info(f"Closed {self.name} HTTP client")
+
+    async def set_transport(self, transport: Optional[httpx.AsyncBaseTransport]):
+        """
+        Swap the underlying transport, e.g. for an httpx.MockTransport or ASGI
+        stand-in in benchmarks. The pool is recreated on the next request.
+        """
+        await self.close()
+        self.transport = transport
+
+    @asynccontextmanager
+    async def _track(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._client is None:
+            # Lazily start so the client still works outside the app lifespan (scripts, REPL)
+            await self.start()
+
+        if self.in_flight >= self.limits.max_connections:
+            self.saturated_total += 1
+        self.in_flight += 1
+        self.requests_total += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield self._client
+        finally:
+            self.in_flight -= 1
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self._track() as client:
+            return await client.request(method, url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Streaming counterpart of request(); the request counts as in flight
+        until the response body has been consumed.
+        """
+        async with self._track() as client:
+            async with client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests_total": self.requests_total,
+            "saturated_total": self.saturated_total,
+            "utilization": self.in_flight / self.limits.max_connections,
+        }
+
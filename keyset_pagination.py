@@ -0,0 +1,106 @@
+"""
+Keyset (Cursor) Pagination
+
+The chat list and message history are paged by position instead of offset:
+a cursor encodes the (sort value, id) of the last row a client has seen, and
+the next page is the rows strictly before or after it in (sort field, id)
+order. With an index on (sort field, id) every page is a bounded index range
+scan, however deep into the collection it is.
+
+Cursors are opaque URL-safe strings; clients pass them back unchanged.
+"""
+
+import base64
+import json
+from typing import Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: dict, field: str) -> str:
+    """
+    Cursor pointing at a document, by its sort field and id
+    """
+    value = doc[field]
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps([value, doc["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, doc_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(value, str) or not isinstance(doc_id, str):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return value, doc_id
+
+
+def keyset_filter(field: str, cursor: str, direction: int) -> dict:
+    """
+    Filter for the rows after the cursor when walking (field, id) in the given
+    direction (1 = ascending, -1 = descending)
+    """
+    value, doc_id = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "id": {op: doc_id}},
+    ]}
+
+
+def page_query(
+    base_filter: dict,
+    field: str,
+    order: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[dict, int]:
+    """
+    Build the filter and scan direction for one page of a list ordered by
+    (field, id) in `order` (1 = oldest first, -1 = newest first). `before`
+    selects rows older than the cursor and `after` rows newer than it; pages
+    scanned against the list order are reversed back by the caller.
+
+    Returns (filter, scan direction).
+    """
+    if before and after:
+        raise InvalidCursor("Pass either before or after, not both")
+
+    if before:
+        return {**base_filter, **keyset_filter(field, before, -1)}, -1
+    if after:
+        return {**base_filter, **keyset_filter(field, after, 1)}, 1
+    return base_filter, order
+
+
+async def fetch_page(
+    collection,
+    base_filter: dict,
+    projection: dict,
+    field: str,
+    order: int,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page in list order. Returns (docs, next cursor); the next cursor
+    continues in the scan direction (pass it as `before` when paging to older
+    rows, as `after` when paging to newer ones) and is None once a page comes
+    back short.
+    """
+    query, direction = page_query(base_filter, field, order, before, after)
+    docs = await collection.find(query, projection).sort(
+        [(field, direction), ("id", direction)]
+    ).limit(limit).to_list(limit)
+
+    next_cursor = encode_cursor(docs[-1], field) if len(docs) == limit and docs else None
+    if direction != order:
+        docs.reverse()
+    return docs, next_cursor
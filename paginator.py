@@ -0,0 +1,152 @@
+"""
+Server-Side Pagination for List Tools
+
+list_scenarios, list_panels and list_panel_rules return one page at a time
+({"items": [...], "page_size": n, "total": n}), so reading a whole scenario's
+panels used to take one tool call and one Gemini iteration per page. With
+all_pages=true the server pages through the results itself:
+
+- the first page tells us the total,
+- the remaining pages are fetched concurrently, at most `window` in flight,
+  and yielded in page order by an async generator,
+- fetching stops at a hard row cap,
+
+and the model gets one aggregated result.
+"""
+
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+# List tools that accept all_pages
+PAGINATED_TOOLS = {"list_scenarios", "list_panels", "list_panel_rules"}
+
+# First page number of the Scenario API
+FIRST_PAGE = 1
+
+FetchPage = Callable[[str, dict], Awaitable[dict]]
+
+
+class PageError(Exception):
+    """
+    A page after the first could not be fetched
+    """
+
+    def __init__(self, page: int, error: str):
+        super().__init__(f"page {page}: {error}")
+        self.page = page
+        self.error = error
+
+
+class Paginator:
+    """
+    Pages through one list tool call
+    """
+
+    def __init__(self, fetch: FetchPage, tool_name: str, tool_args: dict, page_size: int, window: int, max_rows: int):
+        self.fetch = fetch
+        self.tool_name = tool_name
+        self.page_args = {k: v for k, v in tool_args.items() if k not in ("all_pages", "page")}
+        self.page_args["size"] = tool_args.get("size") or page_size
+        self.window = window
+        self.max_rows = max_rows
+
+        self.first_page: Optional[dict] = None
+        self.total: Optional[int] = None
+        self.pages_fetched = 0
+
+    async def _fetch_page(self, page: int) -> dict:
+        return await self.fetch(self.tool_name, {**self.page_args, "page": page})
+
+    async def items(self) -> AsyncIterator[dict]:
+        """
+        Yield the items of every page, in order, up to max_rows. The first
+        page's failure is returned by fetch_all; later failures raise PageError.
+        """
+        result = await self._fetch_page(FIRST_PAGE)
+        self.first_page = result
+        data = result.get("data") if result.get("success") else None
+        if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+            return
+        self.pages_fetched = 1
+
+        items = data["items"]
+        self.total = data.get("total", len(items))
+        page_size = data.get("page_size") or len(items)
+        wanted = min(self.total, self.max_rows)
+
+        yielded = 0
+        for item in items[:wanted]:
+            yield item
+            yielded += 1
+        if not page_size or yielded >= wanted:
+            return
+
+        last_page = FIRST_PAGE + (wanted - 1) // page_size
+        next_page = FIRST_PAGE + 1
+        in_flight = deque()
+        try:
+            while yielded < wanted and (in_flight or next_page <= last_page):
+                # Keep up to `window` pages in flight, consumed in page order
+                while next_page <= last_page and len(in_flight) < self.window:
+                    in_flight.append((next_page, asyncio.ensure_future(self._fetch_page(next_page))))
+                    next_page += 1
+
+                page, task = in_flight.popleft()
+                result = await task
+                if not result.get("success"):
+                    raise PageError(page, str(result.get("error")))
+                self.pages_fetched += 1
+
+                page_items = (result.get("data") or {}).get("items") or []
+                if not page_items:
+                    return
+                for item in page_items[:wanted - yielded]:
+                    yield item
+                    yielded += 1
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+
+    async def fetch_all(self) -> dict:
+        """
+        Aggregate every page into one tool result
+        """
+        items = []
+        error = None
+        try:
+            async for item in self.items():
+                items.append(item)
+        except PageError as e:
+            error = str(e)
+
+        if self.pages_fetched == 0:
+            # The first page failed or isn't a paged response: return it unchanged
+            return self.first_page
+
+        data = {
+            "items": items,
+            "total": self.total,
+            "returned": len(items),
+            "pages_fetched": self.pages_fetched,
+            "truncated": len(items) < (self.total or 0),
+        }
+        if len(items) >= self.max_rows and (self.total or 0) > self.max_rows:
+            data["row_cap"] = self.max_rows
+        if error:
+            data["error"] = f"Stopped early, could not fetch {error}"
+        return {"success": True, "data": data}
+
+
+async def fetch_all_pages(
+    fetch: FetchPage,
+    tool_name: str,
+    tool_args: dict,
+    page_size: int = 100,
+    window: int = 4,
+    max_rows: int = 1000,
+) -> dict:
+    """
+    Run a list tool with all_pages=true; fetch runs a single-page tool call
+    """
+    return await Paginator(fetch, tool_name, tool_args, page_size, window, max_rows).fetch_all()
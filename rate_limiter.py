@@ -0,0 +1,213 @@
+"""
+Client-Side Gemini Rate Limiter
+
+Gemini enforces requests-per-minute and tokens-per-minute quotas; under load
+every request beyond them failed with a 429. GeminiRateLimiter admits requests
+at the quota instead:
+
+- two token buckets refilled continuously, one for requests and one for
+  estimated tokens (a request waits until both have room),
+- callers queue per lane ("interactive" before "background"), and within a
+  lane round-robin across chats, so one busy chat can't hold up the others,
+- the token estimate made before the call is corrected with the usage Gemini
+  reports afterwards, so the token bucket tracks real consumption,
+- waiting counts against the turn deadline.
+
+Retries of an admitted request (see resilience.py) are not admitted again.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, NamedTuple, Optional
+
+from resilience import DeadlineExceeded, deadline_remaining
+
+# Lanes in priority order
+LANES = ("interactive", "background")
+
+
+class TokenBucket:
+    """
+    Bucket holding up to `per_minute` units, refilled at per_minute / 60 per second
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` units are available (amounts above the capacity
+        only need a full bucket)
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.level
+
+    def adjust(self, amount: float):
+        """
+        Debit (positive) or refund (negative) units after the fact; the level
+        may go negative, delaying later requests
+        """
+        self.level = min(self.capacity, self.level - amount)
+
+
+class Reservation(NamedTuple):
+    tokens: int
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "lane", "key")
+
+    def __init__(self, future: asyncio.Future, tokens: int, lane: str, key: str):
+        self.future = future
+        self.tokens = tokens
+        self.lane = lane
+        self.key = key
+
+
+class GeminiRateLimiter:
+    """
+    Admits Gemini requests within RPM and TPM quotas (0 = no limit), fairly across chats
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+        # lane -> chat key -> waiters, chats in round-robin order
+        self._lanes: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {lane: OrderedDict() for lane in LANES}
+        self._queued = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.admitted = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.peak_queued = 0
+        self.deadline_exceeded = 0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def _take(self, tokens: int, now: float):
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
+        self.admitted += 1
+
+    async def acquire(self, tokens: int, key: Optional[str] = None, lane: str = "interactive") -> Reservation:
+        """
+        Wait until a request estimated at `tokens` tokens fits in the quota.
+        Raises DeadlineExceeded if the turn's deadline passes while waiting.
+        """
+        now = time.monotonic()
+        if self._queued == 0 and self._wait_time(tokens, now) == 0:
+            self._take(tokens, now)
+            return Reservation(tokens)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, lane, key or "")
+        self._lanes[lane].setdefault(waiter.key, deque()).append(waiter)
+        self._queued += 1
+        self.waited += 1
+        self.peak_queued = max(self.peak_queued, self._queued)
+        self._pump()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=deadline_remaining())
+        except asyncio.TimeoutError:
+            # Unless it was admitted at the same moment, give up the place in the queue
+            if not waiter.future.done():
+                self._withdraw(waiter)
+                self.deadline_exceeded += 1
+                raise DeadlineExceeded("The turn ran out of time waiting for Gemini quota")
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                self._withdraw(waiter)
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - now
+        return Reservation(tokens)
+
+    def settle(self, reservation: Reservation, tokens_used: int):
+        """
+        Correct the token bucket with the usage Gemini reported for the request
+        """
+        if self.tokens and tokens_used:
+            self.tokens.adjust(tokens_used - reservation.tokens)
+
+    def _withdraw(self, waiter: _Waiter):
+        chats = self._lanes[waiter.lane]
+        waiters = chats[waiter.key]
+        waiters.remove(waiter)
+        self._queued -= 1
+        if not waiters:
+            del chats[waiter.key]
+        # The withdrawn waiter may have been the one holding up the queue
+        self._pump()
+
+    def _pump(self):
+        """
+        Admit queued requests in lane and round-robin order while the quota
+        allows, then sleep until the next one fits
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queued:
+            chats = next(chats for chats in self._lanes.values() if chats)
+            key, waiters = next(iter(chats.items()))
+            waiter = waiters[0]
+
+            now = time.monotonic()
+            wait = self._wait_time(waiter.tokens, now)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+
+            waiters.popleft()
+            self._queued -= 1
+            # This chat goes behind the other waiting chats of its lane
+            if waiters:
+                chats.move_to_end(key)
+            else:
+                del chats[key]
+            self._take(waiter.tokens, now)
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "requests_per_minute": self.requests.capacity if self.requests else None,
+            "tokens_per_minute": self.tokens.capacity if self.tokens else None,
+            "requests_available": self.requests.available(now) if self.requests else None,
+            "tokens_available": self.tokens.available(now) if self.tokens else None,
+            "queued": self._queued,
+            "queued_by_lane": {lane: sum(len(waiters) for waiters in chats.values()) for lane, chats in self._lanes.items()},
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "avg_wait_seconds": self.wait_seconds / self.waited if self.waited else 0.0,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
@@ -0,0 +1,296 @@
+"""
+Retries, Deadlines and Circuit Breakers for Upstream Calls
+
+A single 429, 5xx or timeout from the Scenario API or Gemini used to fail the
+call outright; in the function-calling loop that threw away every tool call
+already made in the turn. ResilientClient wraps a PooledClient with:
+
+- retries with full-jitter exponential backoff, for idempotent methods only
+  (GETs to the Scenario API; generateContent POSTs to Gemini, which have no
+  side effects), on transport errors and 408/429/5xx responses,
+- Retry-After, honored when the upstream sends it,
+- a per-turn deadline shared by every call made within the turn (including
+  tool calls and later iterations), set with turn_deadline(): request
+  timeouts are capped at the time left and retries that can't finish in
+  time are not attempted,
+- a circuit breaker per upstream: after repeated failures calls fail fast
+  with CircuitOpen instead of each waiting for a timeout, and one probe
+  request per reset period checks whether the upstream is back.
+"""
+
+import asyncio
+import contextvars
+import email.utils
+import logging
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, FrozenSet, Iterator, Optional
+
+import httpx
+
+from http_clients import PooledClient
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# time.monotonic() by which the current turn must finish (None outside a turn)
+_turn_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give every upstream call within the block a shared time budget. A block
+    nested in one that already has a deadline keeps the outer one.
+    """
+    if not seconds or _turn_deadline.get() is not None:
+        yield
+        return
+    token = _turn_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        try:
+            _turn_deadline.reset(token)
+        except ValueError:
+            # An async generator holding the block was closed from another context
+            pass
+
+
+def deadline_remaining() -> Optional[float]:
+    """
+    Seconds left in the current turn's budget, or None without a deadline
+    """
+    deadline = _turn_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    The Retry-After header in seconds (it may be a delay or an HTTP date)
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through; failure_threshold consecutive failures open it.
+    open: calls fail fast. Once reset_timeout has passed, one call goes through
+    as a probe (half open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def check(self):
+        """
+        Raise CircuitOpen unless a call may go through now
+        """
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        # Half open: let one probe through per reset period (another one if it never reports back)
+        if now - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._opened_at = now
+            return
+        self.rejected += 1
+        retry_in = self.reset_timeout - (now - self._opened_at)
+        raise CircuitOpen(f"{self.name} is unavailable after repeated failures; retrying in {retry_in:.0f}s")
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+            if self.state == "closed":
+                logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class ResilientClient:
+    """
+    PooledClient wrapper adding retries, the turn deadline and a circuit breaker
+    """
+
+    def __init__(
+        self,
+        client: PooledClient,
+        breaker: CircuitBreaker,
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 30.0,
+        retry_methods: FrozenSet[str] = frozenset({"GET"}),
+    ):
+        self.client = client
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_methods = retry_methods
+
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    def _before_attempt(self, kwargs: dict) -> dict:
+        """
+        Check the breaker and the deadline; cap the request timeout at the time left
+        """
+        self.breaker.check()
+        remaining = deadline_remaining()
+        if remaining is None:
+            return kwargs
+        if remaining <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded(f"The turn ran out of time before calling {self.client.name}")
+        read_timeout = self.client.timeout.read
+        if read_timeout is None or remaining < read_timeout:
+            kwargs = {**kwargs, "timeout": httpx.Timeout(remaining)}
+        return kwargs
+
+    def _record(self, response: httpx.Response):
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> Optional[float]:
+        """
+        Delay before the next attempt, or None when it shouldn't be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = retry_after_seconds(response) if response is not None else None
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        elif delay > self.max_retry_after:
+            return None
+        remaining = deadline_remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    async def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request; retry defaults to whether the method is in retry_methods.
+        The last response is returned even if it is an error.
+        """
+        retry = method.upper() in self.retry_methods if retry is None else retry
+        attempt = 0
+        while True:
+            attempt_kwargs = self._before_attempt(kwargs)
+            try:
+                response = await self.client.request(method, url, **attempt_kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                delay = self._retry_delay(attempt) if retry else None
+                if delay is None:
+                    raise
+                logger.warning(f"{self.client.name} request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            else:
+                self._record(response)
+                delay = self._retry_delay(attempt, response) if retry and response.status_code in RETRYABLE_STATUS else None
+                if delay is None:
+                    return response
+                logger.warning(f"{self.client.name} returned {response.status_code}, retrying in {delay:.2f}s")
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Streaming counterpart of request(). Retries happen only before the
+        response is handed to the caller, i.e. never after body has been read.
+        """
+        retry = method.upper() in self.retry_methods if retry is None else retry
+        attempt = 0
+        yielded = False
+        while True:
+            attempt_kwargs = self._before_attempt(kwargs)
+            try:
+                async with self.client.stream(method, url, **attempt_kwargs) as response:
+                    self._record(response)
+                    delay = self._retry_delay(attempt, response) if retry and response.status_code in RETRYABLE_STATUS else None
+                    if delay is None:
+                        yielded = True
+                        yield response
+                        return
+                    logger.warning(f"{self.client.name} returned {response.status_code}, retrying in {delay:.2f}s")
+            except httpx.TransportError as e:
+                # Errors while the caller reads the body are its own to handle
+                if yielded:
+                    raise
+                self.breaker.record_failure()
+                delay = self._retry_delay(attempt) if retry else None
+                if delay is None:
+                    raise
+                logger.warning(f"{self.client.name} request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.stats(),
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
@@ -0,0 +1,95 @@
+"""
+Exact-Match Cache of Assistant Replies
+
+Many analyst questions are asked word for word in many chats ("What rule
+types are available?", "Explain CPI rules") and are answered without calling
+any tool, yet each one cost a full Gemini round trip. Such replies are cached,
+keyed by a hash of everything that shapes them:
+
+- the model and a hash of the system prompt,
+- the fingerprint of the declared tool set,
+- the tenant,
+- the most recent messages before the question, normalized,
+- the question, normalized (whitespace collapsed, case folded).
+
+Only replies produced without any function call are stored: a reply based on
+tool results depends on Scenario API data that may have changed since. Entries
+live in a cache_backends backend (LRU and TTL in memory, or Redis).
+"""
+
+import hashlib
+import json
+import re
+from typing import List, Optional
+
+from cache_backends import CacheBackend, MemoryCacheBackend
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+class ResponseCache:
+    """
+    TTL cache of assistant replies to identical questions in identical context
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        context_messages: int = 4,
+        max_entries: int = 500,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.ttl = ttl
+        self.context_messages = context_messages
+        self.backend = backend or MemoryCacheBackend(max_entries=max_entries)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def key(self, model: str, system_prompt: str, tool_fingerprint: str, tenant: str, messages: List[dict]) -> str:
+        """
+        Cache key of the reply to messages[-1], given the messages before it
+        """
+        context = messages[-(self.context_messages + 1):-1] if self.context_messages else []
+        material = json.dumps(
+            [
+                model,
+                hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+                tool_fingerprint,
+                tenant,
+                [[msg["role"], normalize_text(msg["content"])] for msg in context],
+                normalize_text(messages[-1]["content"]),
+            ],
+            separators=(",", ":"),
+        )
+        return f"response:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[str]:
+        reply = await self.backend.get(key)
+        if reply is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return reply
+
+    async def set(self, key: str, reply: str):
+        self.stores += 1
+        await self.backend.set(key, reply, self.ttl)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.backend.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+        }
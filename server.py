@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Query, Response, Header
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -6,18 +7,84 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 import uuid
 from datetime import datetime, timezone
 import httpx
 import asyncio
 import json
+from functools import lru_cache
 
 # Import API tool definitions
-from api_tools import SCENARIO_TOOLS, PANEL_TOOLS, RULE_TOOLS, ALL_TOOLS
+from api_tools import SCENARIO_TOOLS, PANEL_TOOLS, RULE_TOOLS, ALL_TOOLS, READ_ONLY_TOOLS
+
+# Import table-driven Scenario API dispatch
+from tool_dispatch import TOOL_DISPATCH
+
+# Import bulk rule creation
+from bulk_rules import create_rules_bulk
+
+# Import compact tool result projection
+from tool_projection import ToolResultProjector, LIST_TOOLS
+
+# Import server-side pagination for list tools
+from paginator import PAGINATED_TOOLS, fetch_all_pages
+
+# Import local tool argument validation
+from tool_validation import ToolArgumentValidator
+
+# Import precompiled tool declaration payload
+from tool_payload import ALL_TOOL_SET, ToolSet, encode_json, encode_request, encode_system_instruction
 
 # Import system prompts
-from system_prompts import PRICING_ANALYST_PROMPT, DEMO_RESPONSE_TEMPLATE
+from system_prompts import (
+    PRICING_ANALYST_PROMPT,
+    DEMO_RESPONSE_TEMPLATE,
+    CHAT_SUMMARY_PROMPT,
+    CHAT_SUMMARY_CONTEXT_TEMPLATE,
+)
+
+# Import keyset pagination for the chat and message lists
+from keyset_pagination import InvalidCursor, fetch_page
+
+# Import MongoDB index definitions
+from db_indexes import ensure_indexes
+
+# Import intent-based tool subsetting
+from tool_router import ToolRouter
+
+# Import Scenario API tool result cache
+from tool_cache import ToolResultCache, SingleFlight, DEFAULT_TOOL_TTLS, tool_call_key
+
+# Import Gemini context cache
+from gemini_context_cache import GeminiContextCache
+
+# Import conversation history builder
+from chat_history import load_recent_history, count_tokens, encoding_loaded, load_encoding
+
+# Import background chat turn jobs
+from chat_jobs import ChatJobQueue, QueueFull
+
+# Import per-chat turn locks
+from chat_locks import ChatTurnLocks, ChatTurnConflict
+
+# Import rolling chat summarizer
+from chat_summaries import ChatSummarizer, get_summary
+
+# Import pluggable cache backends (memory / Redis)
+from cache_backends import create_cache_backend
+
+# Import shared HTTP client wrapper
+from http_clients import PooledClient, env_bool
+
+# Import retries, deadlines and circuit breakers for upstream calls
+from resilience import CircuitBreaker, ResilientClient, turn_deadline
+
+# Import the client-side Gemini quota governor
+from rate_limiter import GeminiRateLimiter, Reservation
+
+# Import the exact-match assistant reply cache
+from response_cache import ResponseCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,12 +92,180 @@ load_dotenv(ROOT_DIR / '.env')
 # Scenario API configuration
 SCENARIO_API_BASE_URL = os.environ.get('SCENARIO_API_BASE_URL', 'http://localhost:5050')
 SCENARIO_API_TENANT = os.environ.get('SCENARIO_API_TENANT', 'meijer')
+SCENARIO_API_HEADERS = {
+    "X-Bungee-Tenant": SCENARIO_API_TENANT,
+    "Content-Type": "application/json"
+}
+
+# Shared, pooled client for Scenario API tool calls (started/stopped with the app)
+scenario_api_client = PooledClient(
+    name="scenario_api",
+    timeout=httpx.Timeout(float(os.environ.get('SCENARIO_API_TIMEOUT', '30.0'))),
+    max_connections=int(os.environ.get('SCENARIO_API_MAX_CONNECTIONS', '50')),
+    max_keepalive_connections=int(os.environ.get('SCENARIO_API_MAX_KEEPALIVE_CONNECTIONS', '20')),
+    keepalive_expiry=float(os.environ.get('SCENARIO_API_KEEPALIVE_EXPIRY', '30.0')),
+    http2=env_bool('SCENARIO_API_HTTP2'),
+)
+
+# Retry policy shared by both upstreams; each has its own circuit breaker
+UPSTREAM_RETRY_BASE_DELAY = float(os.environ.get('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+UPSTREAM_RETRY_MAX_DELAY = float(os.environ.get('UPSTREAM_RETRY_MAX_DELAY', '8.0'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+
+# Time budget for all upstream calls of one chat turn (0 disables it)
+TURN_DEADLINE_SECONDS = float(os.environ.get('TURN_DEADLINE_SECONDS', '120'))
+
+# Scenario API calls: only GETs are retried, writes are sent once
+scenario_api = ResilientClient(
+    scenario_api_client,
+    CircuitBreaker("Scenario API", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+    max_retries=int(os.environ.get('SCENARIO_API_RETRIES', '2')),
+    base_delay=UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=UPSTREAM_RETRY_MAX_DELAY,
+)
+
+# Gemini API configuration
+GEMINI_API_BASE_URL = os.environ.get('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com')
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# Shared, pooled client for Gemini calls, reused across requests and function-calling iterations
+gemini_client = PooledClient(
+    name="gemini",
+    timeout=httpx.Timeout(
+        float(os.environ.get('GEMINI_READ_TIMEOUT', '60.0')),
+        connect=float(os.environ.get('GEMINI_CONNECT_TIMEOUT', '10.0')),
+    ),
+    max_connections=int(os.environ.get('GEMINI_MAX_CONNECTIONS', '20')),
+    max_keepalive_connections=int(os.environ.get('GEMINI_MAX_KEEPALIVE_CONNECTIONS', '10')),
+    keepalive_expiry=float(os.environ.get('GEMINI_KEEPALIVE_EXPIRY', '60.0')),
+    http2=env_bool('GEMINI_HTTP2'),
+)
+
+# Gemini calls: generateContent has no side effects, so POSTs are retried too
+gemini_api = ResilientClient(
+    gemini_client,
+    CircuitBreaker("Gemini API", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+    max_retries=int(os.environ.get('GEMINI_RETRIES', '2')),
+    base_delay=UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=UPSTREAM_RETRY_MAX_DELAY,
+    retry_methods=frozenset({"GET", "POST"}),
+)
+
+# Admit Gemini requests within the project's requests/tokens per minute quota (0 = no limit)
+GEMINI_RPM = int(os.environ.get('GEMINI_RPM', '0'))
+GEMINI_TPM = int(os.environ.get('GEMINI_TPM', '0'))
+# Output tokens reserved per request on top of the prompt estimate, until Gemini reports actual usage
+GEMINI_OUTPUT_TOKENS_ESTIMATE = int(os.environ.get('GEMINI_OUTPUT_TOKENS_ESTIMATE', '1000'))
+gemini_rate_limiter = GeminiRateLimiter(GEMINI_RPM, GEMINI_TPM) if GEMINI_RPM or GEMINI_TPM else None
+
+# Optional Gemini context caching of the system prompt and tool declarations
+gemini_context_cache = GeminiContextCache(
+    gemini_client,
+    GEMINI_API_BASE_URL,
+    GEMINI_MODEL,
+    ttl_seconds=int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL', '3600')),
+    refresh_margin_seconds=int(os.environ.get('GEMINI_CONTEXT_CACHE_REFRESH_MARGIN', '300')),
+) if env_bool('GEMINI_CONTEXT_CACHE') else None
+
+# Optional intent routing: declare only the tool groups relevant to each turn
+tool_router = ToolRouter() if env_bool('TOOL_ROUTING') else None
+
+# Read-through cache for read-only Scenario API tools (TTL per tool, 0 disables a tool)
+tool_cache = ToolResultCache(
+    ttls={
+        tool: float(os.environ.get(f'TOOL_CACHE_TTL_{tool.upper()}', ttl))
+        for tool, ttl in DEFAULT_TOOL_TTLS.items()
+    },
+    backend=create_cache_backend(
+        os.environ.get('CACHE_BACKEND', 'memory'),
+        max_entries=int(os.environ.get('TOOL_CACHE_MAX_ENTRIES', '1000')),
+        redis_url=os.environ.get('REDIS_URL'),
+        namespace=os.environ.get('CACHE_NAMESPACE', 'chatbot'),
+        encoding=os.environ.get('CACHE_VALUE_ENCODING', 'json'),
+    ),
+) if env_bool('TOOL_CACHE_ENABLED', True) else None
+
+# Optional cache of assistant replies to repeated questions (only replies made without tool calls)
+response_cache = ResponseCache(
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '3600')),
+    context_messages=int(os.environ.get('RESPONSE_CACHE_CONTEXT_MESSAGES', '4')),
+    backend=create_cache_backend(
+        os.environ.get('CACHE_BACKEND', 'memory'),
+        max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '500')),
+        redis_url=os.environ.get('REDIS_URL'),
+        namespace=os.environ.get('CACHE_NAMESPACE', 'chatbot'),
+        encoding=os.environ.get('CACHE_VALUE_ENCODING', 'json'),
+    ),
+) if env_bool('RESPONSE_CACHE_ENABLED') else None
+
+# Reject invalid tool arguments locally instead of round-tripping to the Scenario API
+tool_validator = ToolArgumentValidator(ALL_TOOLS) if env_bool('TOOL_VALIDATION', True) else None
+
+# Max concurrent Scenario API submissions of one create_rules_bulk call
+BULK_RULE_CONCURRENCY = int(os.environ.get('BULK_RULE_CONCURRENCY', '4'))
+
+# all_pages on list tools: page size, pages fetched concurrently, and the max rows returned
+ALL_PAGES_PAGE_SIZE = int(os.environ.get('ALL_PAGES_PAGE_SIZE', '100'))
+ALL_PAGES_WINDOW = int(os.environ.get('ALL_PAGES_WINDOW', '4'))
+ALL_PAGES_MAX_ROWS = int(os.environ.get('ALL_PAGES_MAX_ROWS', '1000'))
+
+# Shrink tool results fed back to Gemini (TOOL_RESULT_FIELDS_<TOOL> = comma-separated fields kept on list items)
+tool_projector = ToolResultProjector(
+    max_bytes=int(os.environ.get('TOOL_RESULT_MAX_BYTES', '32000')),
+    max_list_items=int(os.environ.get('TOOL_RESULT_MAX_LIST_ITEMS', '100')),
+    columnar=env_bool('TOOL_RESULT_COLUMNAR'),
+    item_fields={
+        tool: [field.strip() for field in os.environ[f'TOOL_RESULT_FIELDS_{tool.upper()}'].split(',') if field.strip()]
+        for tool in LIST_TOOLS
+        if os.environ.get(f'TOOL_RESULT_FIELDS_{tool.upper()}')
+    },
+) if env_bool('TOOL_RESULT_PROJECTION', True) else None
+
+# Coalesces concurrent identical read-only tool calls into one upstream request
+tool_singleflight = SingleFlight()
+
+# Max read-only tool calls executed concurrently within one Gemini turn
+TOOL_CALL_CONCURRENCY = int(os.environ.get('TOOL_CALL_CONCURRENCY', '8'))
+
+# Conversation history sent to Gemini: most recent messages within a token budget
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', '8000'))
+HISTORY_MAX_MESSAGES = int(os.environ.get('HISTORY_MAX_MESSAGES', '50'))
+# Max seconds startup waits for the tiktoken encoding (loading continues in the background)
+TOKENIZER_LOAD_TIMEOUT = float(os.environ.get('TOKENIZER_LOAD_TIMEOUT', '10'))
+
+# Rolling summaries: once a chat has more than SUMMARY_TRIGGER_MESSAGES unsummarized
+# messages, all but the newest SUMMARY_KEEP_RECENT are folded into a stored summary
+SUMMARY_ENABLED = env_bool('SUMMARY_ENABLED', True)
+SUMMARY_TRIGGER_MESSAGES = int(os.environ.get('SUMMARY_TRIGGER_MESSAGES', '40'))
+SUMMARY_KEEP_RECENT = int(os.environ.get('SUMMARY_KEEP_RECENT', '20'))
+
+# Background chat turn jobs: worker pool size, max queued jobs (429 beyond it) and job retention
+CHAT_JOB_WORKERS = int(os.environ.get('CHAT_JOB_WORKERS', '4'))
+CHAT_JOB_MAX_QUEUED = int(os.environ.get('CHAT_JOB_MAX_QUEUED', '100'))
+CHAT_JOB_RETENTION_SECONDS = int(os.environ.get('CHAT_JOB_RETENTION_SECONDS', '86400'))
+CHAT_JOB_RETRY_AFTER_SECONDS = 5
+
+# Per-chat turn lock: "local" (per process), "mongo" (lease shared by all workers) or "off"
+CHAT_LOCK_MODE = os.environ.get('CHAT_LOCK_MODE', 'local')
+CHAT_LOCK_LEASE_SECONDS = float(os.environ.get('CHAT_LOCK_LEASE_SECONDS', '60'))
+CHAT_LOCK_WAIT_SECONDS = float(os.environ.get('CHAT_LOCK_WAIT_SECONDS', '120'))
+CHAT_LOCK_SUPERSEDE = env_bool('CHAT_LOCK_SUPERSEDE')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Serializes turns within a chat
+chat_turn_locks = ChatTurnLocks(
+    db,
+    mode=CHAT_LOCK_MODE,
+    lease_seconds=CHAT_LOCK_LEASE_SECONDS,
+    wait_timeout=CHAT_LOCK_WAIT_SECONDS,
+    supersede=CHAT_LOCK_SUPERSEDE,
+)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -61,217 +296,105 @@ class Message(BaseModel):
 class MessageCreate(BaseModel):
     content: str
 
+class ChatJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    chat_id: str
+    content: str
+    status: str  # "queued", "running", "succeeded" or "failed"
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[dict] = None  # {"user_message": Message, "assistant_message": Message}
+    error: Optional[str] = None
+
 class StreamResponse(BaseModel):
+    event: str = "delta"  # "delta", "tool_call", "done" or "error"
     content: str
     done: bool
+    tool_name: Optional[str] = None
+    message: Optional[Message] = None  # Persisted assistant message, sent with the final event
 
 # Tool Execution Functions
 async def execute_tool_call(tool_name: str, tool_args: dict) -> dict:
+    """
+    Execute a tool call. Read-only tools are served from the tool result cache
+    when possible, and concurrent identical reads share one upstream request.
+    Writes invalidate the cache entries they affect.
+    """
+    if tool_validator:
+        validation_errors = tool_validator.validate(tool_name, tool_args)
+        if validation_errors:
+            logger.info(f"Rejected {tool_name} arguments locally: {validation_errors}")
+            return {
+                "success": False,
+                "error": f"Invalid arguments for {tool_name}; fix the listed fields and call the tool again.",
+                "validation_errors": validation_errors,
+            }
+
+    if tool_name == "create_rules_bulk":
+        return await create_rules_bulk(
+            tool_args,
+            execute_tool_call,
+            concurrency=BULK_RULE_CONCURRENCY,
+            validate=tool_validator.validate if tool_validator else None,
+        )
+
+    if tool_name in PAGINATED_TOOLS and tool_args.get("all_pages"):
+        return await fetch_all_pages(
+            execute_tool_call,
+            tool_name,
+            tool_args,
+            page_size=ALL_PAGES_PAGE_SIZE,
+            window=ALL_PAGES_WINDOW,
+            max_rows=ALL_PAGES_MAX_ROWS,
+        )
+
+    if tool_name in READ_ONLY_TOOLS:
+        if tool_cache and tool_cache.is_cacheable(tool_name):
+            cached = await tool_cache.get(SCENARIO_API_TENANT, tool_name, tool_args)
+            if cached is not None:
+                logger.info(f"Tool cache hit: {tool_name}")
+                return cached
+
+        key = tool_call_key(SCENARIO_API_TENANT, tool_name, tool_args)
+        return await tool_singleflight.do(key, lambda: fetch_read_only_tool(tool_name, tool_args))
+
+    result = await call_scenario_api(tool_name, tool_args)
+    if tool_cache:
+        await tool_cache.invalidate_for_write(SCENARIO_API_TENANT, tool_name, tool_args)
+    return result
+
+async def fetch_read_only_tool(tool_name: str, tool_args: dict) -> dict:
+    """
+    Call the Scenario API for a read-only tool and cache a successful result
+    """
+    generation = tool_cache.generation if tool_cache else None
+    result = await call_scenario_api(tool_name, tool_args)
+    if tool_cache and result.get("success"):
+        await tool_cache.set(SCENARIO_API_TENANT, tool_name, tool_args, result, generation)
+    return result
+
+async def call_scenario_api(tool_name: str, tool_args: dict) -> dict:
     """
     Execute the actual API call to the Scenario API based on tool name and arguments.
     """
-    headers = {
-        "X-Bungee-Tenant": SCENARIO_API_TENANT,
-        "Content-Type": "application/json"
-    }
+    route = TOOL_DISPATCH.get(tool_name)
+    if route is None:
+        return {"success": False, "error": f"Unknown tool: {tool_name}"}
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if tool_name == "list_scenarios":
-                # Build query parameters
-                params = {}
-                if "active" in tool_args:
-                    params["active"] = str(tool_args["active"]).lower()
-                if "approved" in tool_args:
-                    params["approved"] = str(tool_args["approved"]).lower()
-                if "scenario_type" in tool_args:
-                    params["scenario_type"] = tool_args["scenario_type"]
-                if "page" in tool_args:
-                    params["page"] = tool_args["page"]
-                if "size" in tool_args:
-                    params["size"] = tool_args["size"]
-
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/scenario"
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "get_scenario":
-                scenario_id = tool_args.get("scenario_id")
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/scenario/{scenario_id}"
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_scenario":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/scenario"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            # Panel API Tools
-            elif tool_name == "list_panels":
-                # Build query parameters for panels
-                params = {}
-
-                # Required parameter
-                if "scenario" in tool_args:
-                    params["scenario"] = tool_args["scenario"]
-
-                # Optional filters
-                if "panel_name" in tool_args:
-                    params["panel_name"] = tool_args["panel_name"]
-                if "valid" in tool_args:
-                    params["valid"] = str(tool_args["valid"]).lower()
-
-                # Product hierarchy filters
-                if "department" in tool_args:
-                    params["department"] = tool_args["department"]
-                if "category" in tool_args:
-                    params["category"] = tool_args["category"]
-                if "sub_category" in tool_args:
-                    params["sub_category"] = tool_args["sub_category"]
-                if "sub_sub_category" in tool_args:
-                    params["sub_sub_category"] = tool_args["sub_sub_category"]
-                if "major_department" in tool_args:
-                    params["major_department"] = tool_args["major_department"]
-
-                # Product group filters
-                if "product_group" in tool_args:
-                    params["product_group"] = tool_args["product_group"]
-                if "product_source" in tool_args:
-                    params["product_source"] = tool_args["product_source"]
-
-                # Location hierarchy filters
-                if "zone" in tool_args:
-                    params["zone"] = tool_args["zone"]
-                if "zone_group" in tool_args:
-                    params["zone_group"] = tool_args["zone_group"]
-                if "location_hierarchy_id" in tool_args:
-                    params["location_hierarchy_id"] = tool_args["location_hierarchy_id"]
-
-                # Market group filters
-                if "market_group" in tool_args:
-                    params["market_group"] = tool_args["market_group"]
-                if "market_source" in tool_args:
-                    params["market_source"] = tool_args["market_source"]
-
-                # Rule filters
-                if "price_type" in tool_args:
-                    params["price_type"] = tool_args["price_type"]
-                if "rule_type" in tool_args:
-                    params["rule_type"] = tool_args["rule_type"]
-                if "rule_sub_type" in tool_args:
-                    params["rule_sub_type"] = tool_args["rule_sub_type"]
-
-                # Pagination and sorting
-                if "page" in tool_args:
-                    params["page"] = tool_args["page"]
-                if "size" in tool_args:
-                    params["size"] = tool_args["size"]
-                if "sort" in tool_args:
-                    params["sort"] = tool_args["sort"]
-
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel"
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "get_panel":
-                panel_id = tool_args.get("panel_id")
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel/{panel_id}"
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_panel":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "update_panel":
-                panel_id = tool_args.get("panel_id")
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel/{panel_id}"
-
-                # Remove panel_id from the request body as it's in the URL
-                update_data = {k: v for k, v in tool_args.items() if k != "panel_id"}
-
-                response = await client.patch(url, headers=headers, json=update_data)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "delete_panel":
-                panel_id = tool_args.get("panel_id")
-                # IMPORTANT: Always soft delete (never use hard_delete=true)
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel/{panel_id}"
-                response = await client.delete(url, headers=headers)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "list_panel_rules":
-                panel_id = tool_args.get("panel_id")
-
-                # Build query parameters
-                params = {}
-                if "page" in tool_args:
-                    params["page"] = tool_args["page"]
-                if "size" in tool_args:
-                    params["size"] = tool_args["size"]
-                if "order_by" in tool_args:
-                    params["order_by"] = tool_args["order_by"]
-                if "sort_order" in tool_args:
-                    params["sort_order"] = tool_args["sort_order"]
-
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/panel/{panel_id}/rules"
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            # Rule API Tools
-            elif tool_name == "create_cpi_rule":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/cpi"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_margin_rule":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/margin"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_step_rule":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/step"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_price_rule":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/price"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "create_cost_change_rule":
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/cost-change"
-                response = await client.post(url, headers=headers, json=tool_args)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            elif tool_name == "delete_rule":
-                rule_id = tool_args.get("rule_id")
-                rule_type = tool_args.get("rule_type")
-
-                # IMPORTANT: Always soft delete (never use hard_delete=true)
-                # Add rule_type as query parameter for validation
-                url = f"{SCENARIO_API_BASE_URL}/api/v1/pricing-rules/rule/{rule_id}?rule_type={rule_type}"
-                response = await client.delete(url, headers=headers)
-                response.raise_for_status()
-                return {"success": True, "data": response.json()}
-
-            else:
-                return {"success": False, "error": f"Unknown tool: {tool_name}"}
+        request = route.build(tool_args)
+        response = await scenario_api.request(
+            request.method,
+            f"{SCENARIO_API_BASE_URL}{request.path}",
+            headers=SCENARIO_API_HEADERS,
+            params=request.params,
+            json=request.body,
+        )
+        response.raise_for_status()
+        return {"success": True, "data": response.json()}
 
     except httpx.HTTPStatusError as e:
         logger.error(f"Scenario API HTTP error: {e.response.status_code} - {e.response.text}")
@@ -283,11 +406,52 @@ async def execute_tool_call(tool_name: str, tool_args: dict) -> dict:
         logger.error(f"Error executing tool {tool_name}: {str(e)}")
         return {"success": False, "error": str(e)}
 
+async def execute_tool_calls(function_calls: List[dict]) -> List[dict]:
+    """
+    Execute the function calls from one Gemini candidate and return their results
+    in the original call order.
+
+    Consecutive read-only calls run concurrently (bounded by TOOL_CALL_CONCURRENCY).
+    Mutating calls act as barriers: they run one at a time, in order, after every
+    call before them has finished.
+    """
+    semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+    results: List[Optional[dict]] = [None] * len(function_calls)
+
+    async def run(index: int, func_name: str, func_args: dict):
+        async with semaphore:
+            logger.info(f"Executing tool: {func_name} with args: {func_args}")
+            results[index] = await execute_tool_call(func_name, func_args)
+
+    pending_reads = []
+    for index, fc_part in enumerate(function_calls):
+        func_call = fc_part["functionCall"]
+        func_name = func_call["name"]
+        func_args = func_call.get("args", {})
+
+        if func_name in READ_ONLY_TOOLS:
+            pending_reads.append(run(index, func_name, func_args))
+            continue
+
+        if pending_reads:
+            await asyncio.gather(*pending_reads)
+            pending_reads = []
+        await run(index, func_name, func_args)
+
+    if pending_reads:
+        await asyncio.gather(*pending_reads)
+
+    return results
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "ClearDemand AI Pricing Analyst API"}
 
+# Fields returned by the list endpoints
+CHAT_LIST_PROJECTION = {"_id": 0, "id": 1, "title": 1, "created_at": 1, "updated_at": 1}
+MESSAGE_LIST_PROJECTION = {"_id": 0, "id": 1, "chat_id": 1, "role": 1, "content": 1, "timestamp": 1}
+
 # Chat management
 @api_router.post("/chats", response_model=Chat)
 async def create_chat(input: ChatCreate):
@@ -299,8 +463,26 @@ async def create_chat(input: ChatCreate):
     return chat
 
 @api_router.get("/chats", response_model=List[Chat])
-async def get_chats():
-    chats = await db.chats.find({}, {"_id": 0}).sort("updated_at", -1).to_list(100)
+async def get_chats(
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """
+    Chats, most recently updated first. Pass the X-Next-Cursor response header
+    as `before` to get the next (older) page, or a chat's cursor as `after` to
+    get chats updated since.
+    """
+    try:
+        chats, next_cursor = await fetch_page(
+            db.chats, {}, CHAT_LIST_PROJECTION, "updated_at", -1, limit, before, after
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
     for chat in chats:
         if isinstance(chat['created_at'], str):
             chat['created_at'] = datetime.fromisoformat(chat['created_at'])
@@ -312,73 +494,274 @@ async def get_chats():
 async def delete_chat(chat_id: str):
     result = await db.chats.delete_one({"id": chat_id})
     await db.messages.delete_many({"chat_id": chat_id})
+    await db.chat_summaries.delete_one({"chat_id": chat_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Chat not found")
     return {"message": "Chat deleted"}
 
 # Messages
 @api_router.get("/chats/{chat_id}/messages", response_model=List[Message])
-async def get_messages(chat_id: str):
-    messages = await db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort("timestamp", 1).to_list(1000)
+async def get_messages(
+    chat_id: str,
+    response: Response,
+    limit: int = Query(1000, ge=1, le=1000),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
+    """
+    Messages of a chat, oldest first. Pass the X-Next-Cursor response header
+    back as `after` for the next (newer) page, or as `before` after a `before`
+    request to keep paging back through older messages.
+    """
+    try:
+        messages, next_cursor = await fetch_page(
+            db.messages, {"chat_id": chat_id}, MESSAGE_LIST_PROJECTION, "timestamp", 1, limit, before, after
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
     for msg in messages:
         if isinstance(msg['timestamp'], str):
             msg['timestamp'] = datetime.fromisoformat(msg['timestamp'])
     return messages
 
-@api_router.post("/chats/{chat_id}/messages")
-async def send_message(chat_id: str, input: MessageCreate):
-    # Save user message
-    user_msg = Message(chat_id=chat_id, role="user", content=input.content)
-    user_doc = user_msg.model_dump()
-    user_doc['timestamp'] = user_doc['timestamp'].isoformat()
-    await db.messages.insert_one(user_doc)
-    
-    # Get chat history for context
-    messages_history = await db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort("timestamp", 1).to_list(1000)
-    
-    # Convert MongoDB messages to format needed for Gemini API
+async def start_turn(chat_id: str, content: str):
+    """
+    Build the user message and the conversation sent to Gemini.
+
+    History is read before anything is written, so the new user message is only
+    added once, in memory. Both messages are persisted together by finish_turn.
+    """
+    user_msg = Message(chat_id=chat_id, role="user", content=content)
+
+    # Older turns may already be folded into a running summary
+    summary_doc = await get_summary(db, chat_id)
+    token_budget = HISTORY_TOKEN_BUDGET
     conversation_messages = []
-    for msg in messages_history:
-        conversation_messages.append({
-            "role": msg["role"],
-            "content": msg["content"]
-        })
+    if summary_doc and summary_doc.get("summary"):
+        summary_text = CHAT_SUMMARY_CONTEXT_TEMPLATE.format(summary=summary_doc["summary"])
+        token_budget -= count_tokens(summary_text)
+        conversation_messages.append({"role": "user", "content": summary_text})
+
+    # Get the most recent (unsummarized) chat history that fits the token budget
+    conversation_messages += await load_recent_history(
+        db,
+        chat_id,
+        token_budget,
+        HISTORY_MAX_MESSAGES,
+        after=summary_doc.get("summarized_until") if summary_doc else None,
+    )
     
     # Add the current user message
     conversation_messages.append({
         "role": "user",
-        "content": input.content
+        "content": content
     })
-    
+
+    return user_msg, conversation_messages
+
+async def finish_turn(chat_id: str, user_msg: Message, response: str) -> Message:
+    """
+    Save the user and assistant messages and update the chat timestamp/title.
+    The message insert and the chat update are independent and run concurrently.
+    """
+    assistant_msg = Message(chat_id=chat_id, role="assistant", content=response)
+    message_docs = []
+    for msg in (user_msg, assistant_msg):
+        doc = msg.model_dump()
+        doc['timestamp'] = doc['timestamp'].isoformat()
+        message_docs.append(doc)
+
+    # Update chat timestamp, and title if this is the first message, in one round trip
+    user_content = user_msg.content
+    title = user_content[:50] + "..." if len(user_content) > 50 else user_content
+    chat_update = [{
+        "$set": {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "title": {"$cond": [{"$eq": ["$title", "New chat"]}, {"$literal": title}, "$title"]},
+        }
+    }]
+
+    await asyncio.gather(
+        db.messages.insert_many(message_docs),
+        db.chats.update_one({"id": chat_id}, chat_update),
+    )
+
+    # Compact older turns in the background once the chat grows long enough
+    if chat_summarizer:
+        chat_summarizer.schedule(chat_id)
+
+    return assistant_msg
+
+async def run_chat_turn(chat_id: str, content: str, read_response_cache: bool = True):
+    """
+    Run one chat turn: build the conversation, get the reply and persist both messages.
+    Holds the chat's turn lock, so the turn sees every earlier turn's messages.
+    """
+    async with chat_turn_locks.hold(chat_id):
+        user_msg, conversation_messages = await start_turn(chat_id, content)
+        
+        # Use system prompt from system_prompts.py
+        system_prompt = PRICING_ANALYST_PROMPT
+
+        # Get Gemini API key
+        gemini_api_key = os.environ.get('GEMINI_API_KEY', '')
+
+        if not gemini_api_key:
+            response = DEMO_RESPONSE_TEMPLATE.format(user_message=content)
+        else:
+            # Call Gemini API; every upstream call of the turn shares one time budget
+            with turn_deadline(TURN_DEADLINE_SECONDS):
+                response = await call_gemini_api(gemini_api_key, conversation_messages, system_prompt, chat_id, read_response_cache)
+        
+        assistant_msg = await finish_turn(chat_id, user_msg, response)
+
+    return user_msg, assistant_msg
+
+def bypasses_response_cache(cache_control: Optional[str]) -> bool:
+    """
+    "Cache-Control: no-cache" asks for a fresh reply; it still replaces the cached one
+    """
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+@api_router.post("/chats/{chat_id}/messages")
+async def send_message(chat_id: str, input: MessageCreate, cache_control: Optional[str] = Header(None)):
+    try:
+        user_msg, assistant_msg = await run_chat_turn(chat_id, input.content, not bypasses_response_cache(cache_control))
+    except ChatTurnConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"user_message": user_msg, "assistant_message": assistant_msg}
+
+async def run_chat_job(chat_id: str, content: str) -> dict:
+    user_msg, assistant_msg = await run_chat_turn(chat_id, content)
+    return {
+        "user_message": user_msg.model_dump(mode="json"),
+        "assistant_message": assistant_msg.model_dump(mode="json"),
+    }
+
+chat_jobs = ChatJobQueue(
+    db,
+    run_chat_job,
+    workers=CHAT_JOB_WORKERS,
+    max_queued=CHAT_JOB_MAX_QUEUED,
+    retention_seconds=CHAT_JOB_RETENTION_SECONDS,
+)
+
+@api_router.post("/chats/{chat_id}/jobs", response_model=ChatJob, status_code=202)
+async def submit_chat_job(chat_id: str, input: MessageCreate):
+    """
+    Queue a chat turn and return its job right away. Poll GET /jobs/{job_id}
+    or subscribe to GET /jobs/{job_id}/events for the result.
+    """
+    try:
+        return await chat_jobs.submit(chat_id, input.content)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(CHAT_JOB_RETRY_AFTER_SECONDS)})
+
+@api_router.get("/jobs/{job_id}", response_model=ChatJob)
+async def get_chat_job(job_id: str):
+    job = await chat_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}/events")
+async def subscribe_chat_job(job_id: str):
+    """
+    Server-sent events with the job document each time its status changes;
+    the stream ends once the job has succeeded or failed
+    """
+    if await chat_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for job in chat_jobs.subscribe(job_id):
+            yield f"data: {ChatJob(**job).model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_router.post("/chats/{chat_id}/messages/stream")
+async def send_message_stream(chat_id: str, input: MessageCreate, cache_control: Optional[str] = Header(None)):
+    """
+    Same as send_message, but streams the assistant reply as server-sent events.
+    Each event is a StreamResponse; the final one has done=true and carries the
+    persisted assistant message.
+
+    The chat's turn lock is taken inside the stream, so it is released however
+    the stream ends; a turn that can't get it ends with an error event.
+    """
     # Use system prompt from system_prompts.py
     system_prompt = PRICING_ANALYST_PROMPT
 
     # Get Gemini API key
     gemini_api_key = os.environ.get('GEMINI_API_KEY', '')
 
-    if not gemini_api_key:
-        response = DEMO_RESPONSE_TEMPLATE.format(user_message=input.content)
-    else:
-        # Call Gemini API
-        response = await call_gemini_api(gemini_api_key, conversation_messages, system_prompt)
-    
-    # Save assistant message
-    assistant_msg = Message(chat_id=chat_id, role="assistant", content=response)
-    assistant_doc = assistant_msg.model_dump()
-    assistant_doc['timestamp'] = assistant_doc['timestamp'].isoformat()
-    await db.messages.insert_one(assistant_doc)
-    
-    # Update chat timestamp and title if first message
-    chat_doc = await db.chats.find_one({"id": chat_id})
-    if chat_doc:
-        update_data = {"updated_at": datetime.now(timezone.utc).isoformat()}
-        if chat_doc.get('title') == "New chat":
-            # Generate a title from the first user message
-            title = input.content[:50] + "..." if len(input.content) > 50 else input.content
-            update_data['title'] = title
-        await db.chats.update_one({"id": chat_id}, {"$set": update_data})
-    
-    return {"user_message": user_msg, "assistant_message": assistant_msg}
+    async def event_stream():
+        try:
+            async with chat_turn_locks.hold(chat_id):
+                user_msg, conversation_messages = await start_turn(chat_id, input.content)
+
+                if not gemini_api_key:
+                    final = StreamResponse(event="done", content=DEMO_RESPONSE_TEMPLATE.format(user_message=input.content), done=True)
+                else:
+                    final = None
+                    with turn_deadline(TURN_DEADLINE_SECONDS):
+                        async for event in stream_gemini_api(
+                            gemini_api_key,
+                            conversation_messages,
+                            system_prompt,
+                            chat_id,
+                            read_response_cache=not bypasses_response_cache(cache_control),
+                        ):
+                            if event.done:
+                                final = event
+                                break
+                            yield f"data: {event.model_dump_json()}\n\n"
+
+                final.message = await finish_turn(chat_id, user_msg, final.content)
+                yield f"data: {final.model_dump_json()}\n\n"
+        except ChatTurnConflict as e:
+            yield f"data: {StreamResponse(event='error', content=str(e), done=True).model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Metrics
+@api_router.get("/metrics")
+async def get_metrics():
+    return {
+        "http": await get_http_metrics(),
+        "gemini_context_cache": gemini_context_cache.stats() if gemini_context_cache else None,
+        "tool_router": tool_router.stats() if tool_router else None,
+        "tool_cache": tool_cache.stats() if tool_cache else None,
+        "tool_singleflight": tool_singleflight.stats(),
+        "tool_validation": tool_validator.stats() if tool_validator else None,
+        "tool_projection": tool_projector.stats() if tool_projector else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "chat_jobs": chat_jobs.stats(),
+        "chat_turn_locks": chat_turn_locks.stats(),
+    }
+
+@api_router.get("/metrics/http")
+async def get_http_metrics():
+    return {
+        "scenario_api": scenario_api_client.stats(),
+        "gemini": gemini_client.stats(),
+        "gemini_rate_limit": gemini_rate_limiter.stats() if gemini_rate_limiter else None,
+        "resilience": {
+            "scenario_api": scenario_api.stats(),
+            "gemini": gemini_api.stats(),
+        },
+    }
 
 # Root route
 @app.get("/")
@@ -398,6 +781,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 logging.basicConfig(
@@ -406,140 +790,476 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Gemini API helper function with Function Calling support
-async def call_gemini_api(api_key: str, messages: List[dict], system_prompt: str) -> str:
+# Gemini API helper functions with Function Calling support
+def build_gemini_payload(messages: List[dict], cached_content: Optional[str] = None) -> dict:
     """
-    Call Google Gemini API with function calling support
-    """
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+    Build the dynamic part of a Gemini request payload.
 
+    The static system_instruction and tools blocks are spliced in pre-encoded by
+    encode_gemini_payload, unless cached_content names a context cache that
+    already holds both.
+    """
     # Build contents array - Gemini expects array of content objects
-    contents = []
-
-    # For conversation history, we need to include previous messages
     # Format: each message is an object with "role" and "parts"
+    contents = []
     for msg in messages:
         role = "user" if msg["role"] == "user" else "model"
-        text = msg["content"]
-
-        # Prepend system prompt to the very first user message
-        if len(contents) == 0 and role == "user" and system_prompt:
-            text = f"{system_prompt}\n\n{text}"
-
         contents.append({
             "role": role,
-            "parts": [{"text": text}]
+            "parts": [{"text": msg["content"]}]
         })
 
-    # Convert tool definitions to Gemini's format
-    tools_config = [{
-        "function_declarations": [
-            {
-                "name": tool["name"],
-                "description": tool["description"],
-                "parameters": tool["parameters"]
-            }
-            for tool in ALL_TOOLS
-        ]
-    }]
+    payload = {"contents": contents}
+    if cached_content:
+        payload["cachedContent"] = cached_content
+    return payload
 
-    payload = {
-        "contents": contents,
-        "tools": tools_config
-    }
+def encode_gemini_payload(payload: dict, system_prompt: str, tool_set: ToolSet) -> bytes:
+    """
+    Serialize a payload from build_gemini_payload, splicing in the pre-encoded
+    system prompt and tool declarations when no context cache is referenced
+    """
+    static_fields = {}
+    if "cachedContent" not in payload:
+        if tool_set.names:
+            static_fields["tools"] = tool_set.json
+        if system_prompt:
+            static_fields["system_instruction"] = encode_system_instruction(system_prompt)
+    return encode_request(payload, static_fields)
+
+def select_tool_set(messages: List[dict], chat_id: Optional[str]) -> ToolSet:
+    """
+    Tool declarations for this turn: a routed subset when intent routing is
+    enabled, otherwise all tools
+    """
+    if tool_router and messages and messages[-1]["role"] == "user":
+        return tool_router.route(messages[-1]["content"], chat_id)
+    return ALL_TOOL_SET
 
-    headers = {
+async def prepare_gemini_payload(api_key: str, messages: List[dict], system_prompt: str, tool_set: ToolSet) -> dict:
+    """
+    Build the Gemini request payload, referencing the context cache when enabled
+    """
+    cached_content = None
+    if gemini_context_cache and system_prompt:
+        cached_content = await gemini_context_cache.get_cache_name(api_key, system_prompt, tool_set)
+    return build_gemini_payload(messages, cached_content)
+
+def rejects_context_cache(response: httpx.Response, cached_content: str) -> bool:
+    """
+    Whether a Gemini error response is about the context cache (expired,
+    deleted or not accessible), rather than some other problem with the request
+    """
+    if response.status_code not in (400, 403, 404):
+        return False
+    try:
+        message = str(response.json()["error"]["message"])
+    except (ValueError, KeyError, TypeError):
+        message = response.text
+    normalized = message.lower().replace(" ", "").replace("_", "")
+    return "cachedcontent" in normalized or cached_content in message
+
+def drop_context_cache(payload: dict, response: httpx.Response) -> bool:
+    """
+    Switch a payload back to an inline system prompt and tools if Gemini
+    rejected the context cache it references. Returns False if there was no
+    cache or the error is about something else.
+    """
+    cached_content = payload.get("cachedContent")
+    if not cached_content or not rejects_context_cache(response, cached_content):
+        return False
+    del payload["cachedContent"]
+    logger.warning(f"Gemini rejected context cache {cached_content}, retrying with inline prompt")
+    gemini_context_cache.invalidate(cached_content)
+    return True
+
+def gemini_headers(api_key: str) -> dict:
+    return {
         "Content-Type": "application/json",
         "X-goog-api-key": api_key
     }
 
+@lru_cache(maxsize=8)
+def system_prompt_tokens(system_prompt: str, exact: bool) -> int:
+    """
+    Token count of a system prompt, computed once per prompt (and once more
+    when the tokenizer finishes loading, since exact is part of the key)
+    """
+    return count_tokens(system_prompt)
+
+def estimate_gemini_tokens(payload: dict, system_prompt: str = "", tool_set: Optional[ToolSet] = None) -> int:
+    """
+    Input plus expected output tokens of a request. Only the conversation is
+    tokenized per call; the system prompt and tool declarations are counted
+    once, and not at all when a context cache holds them.
+    """
+    tokens = count_tokens(encode_json(payload).decode("utf-8")) + GEMINI_OUTPUT_TOKENS_ESTIMATE
+    if "cachedContent" not in payload:
+        if tool_set is not None and tool_set.names:
+            tokens += tool_set.tokens
+        if system_prompt:
+            tokens += system_prompt_tokens(system_prompt, encoding_loaded())
+    return tokens
+
+async def reserve_gemini_quota(
+    payload: dict,
+    system_prompt: str = "",
+    tool_set: Optional[ToolSet] = None,
+    chat_id: Optional[str] = None,
+    lane: str = "interactive",
+) -> Optional[Reservation]:
+    """
+    Wait until this request fits in the Gemini quota. Background work goes in
+    the "background" lane, behind chat turns.
+    """
+    if not gemini_rate_limiter:
+        return None
+    tokens = estimate_gemini_tokens(payload, system_prompt, tool_set)
+    return await gemini_rate_limiter.acquire(tokens, chat_id, lane)
+
+def settle_gemini_quota(reservation: Optional[Reservation], usage: Optional[dict]):
+    """
+    Replace the reserved token estimate with the usage Gemini reported
+    """
+    if reservation and usage:
+        gemini_rate_limiter.settle(reservation, usage.get("totalTokenCount", 0))
+
+def response_cache_key(messages: List[dict], system_prompt: str, tool_set: ToolSet) -> Optional[str]:
+    """
+    Response cache key of this turn's reply, or None when the cache is disabled
+    """
+    if not response_cache or not messages:
+        return None
+    return response_cache.key(GEMINI_MODEL, system_prompt, tool_set.fingerprint, SCENARIO_API_TENANT, messages)
+
+def build_function_responses(function_calls: List[dict], tool_results: List[dict]) -> List[dict]:
+    """
+    Build Gemini functionResponse parts in the original call order, with
+    results projected to their compact form
+    """
+    function_responses = []
+    for fc_part, tool_result in zip(function_calls, tool_results):
+        func_name = fc_part["functionCall"]["name"]
+        if tool_projector:
+            tool_result = tool_projector.project(func_name, tool_result)
+        function_responses.append({
+            "functionResponse": {
+                "name": func_name,
+                "response": {
+                    "name": func_name,
+                    "content": tool_result
+                }
+            }
+        })
+    return function_responses
+
+def gemini_error_message(e: Exception) -> str:
+    """
+    Log a Gemini failure and turn it into the assistant message shown to the user
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        logger.error(f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}")
+        error_text = e.response.text
+        if "API_KEY_INVALID" in error_text or "401" in str(e.response.status_code):
+            return "Invalid API key. Please check your GEMINI_API_KEY in the .env file."
+        return f"I encountered an error communicating with the AI service. Status: {e.response.status_code}"
+    logger.error(f"Error calling Gemini API: {str(e)}")
+    return f"I encountered an error: {str(e)}. Please try again later."
+
+async def call_gemini_api(
+    api_key: str,
+    messages: List[dict],
+    system_prompt: str,
+    chat_id: Optional[str] = None,
+    read_response_cache: bool = True,
+) -> str:
+    """
+    Call Google Gemini API with function calling support.
+
+    With the response cache enabled, a cached reply to the same question in the
+    same context is returned without calling Gemini (unless read_response_cache
+    is False), and replies made without function calls are stored.
+    """
+    url = f"{GEMINI_API_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent"
+    headers = gemini_headers(api_key)
+    tool_set = select_tool_set(messages, chat_id)
+    cache_key = response_cache_key(messages, system_prompt, tool_set)
+
     try:
+        if cache_key and read_response_cache:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        payload = await prepare_gemini_payload(api_key, messages, system_prompt, tool_set)
+        contents = payload["contents"]
+
         max_iterations = 5  # Prevent infinite loops
         iteration = 0
 
         while iteration < max_iterations:
             iteration += 1
 
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                result = response.json()
+            body = encode_gemini_payload(payload, system_prompt, tool_set)
+            reservation = await reserve_gemini_quota(payload, system_prompt, tool_set, chat_id)
+            response = await gemini_api.post(url, content=body, headers=headers)
+            if response.is_error and drop_context_cache(payload, response):
+                iteration -= 1
+                continue
+            response.raise_for_status()
+            result = response.json()
+            settle_gemini_quota(reservation, result.get("usageMetadata"))
+
+            if "candidates" not in result or len(result["candidates"]) == 0:
+                logger.error(f"Unexpected Gemini API response format: {result}")
+                return "I received an unexpected response format from the API."
+
+            candidate = result["candidates"][0]
+            content = candidate.get("content", {})
+            parts = content.get("parts", [])
+
+            if not parts:
+                return "I received an empty response from the AI."
+
+            # Check if response contains function calls
+            function_calls = [part for part in parts if "functionCall" in part]
+
+            if function_calls:
+                # Execute all function calls (independent reads run concurrently)
+                tool_results = await execute_tool_calls(function_calls)
+                if tool_router:
+                    tool_router.record_tool_use(chat_id, (fc["functionCall"]["name"] for fc in function_calls))
+
+                # Add function call to conversation
+                contents.append({
+                    "role": "model",
+                    "parts": function_calls
+                })
+
+                # Add function responses to conversation
+                contents.append({
+                    "role": "user",
+                    "parts": build_function_responses(function_calls, tool_results)
+                })
+
+                # Update payload with new conversation including function responses
+                payload["contents"] = contents
+
+                # Continue the loop to get Gemini's response with the function results
+                continue
+
+            # No function calls - extract text response
+            text_parts = [part.get("text", "") for part in parts if "text" in part]
+            if text_parts:
+                reply = " ".join(text_parts)
+                # Only the first iteration's reply was made without function calls
+                if cache_key and iteration == 1:
+                    await response_cache.set(cache_key, reply)
+                return reply
+
+            return "I couldn't generate a proper response."
 
-                if "candidates" not in result or len(result["candidates"]) == 0:
-                    logger.error(f"Unexpected Gemini API response format: {result}")
-                    return "I received an unexpected response format from the API."
+        return "I reached the maximum number of function calls. Please try rephrasing your request."
 
-                candidate = result["candidates"][0]
-                content = candidate.get("content", {})
-                parts = content.get("parts", [])
+    except Exception as e:
+        return gemini_error_message(e)
 
-                if not parts:
-                    return "I received an empty response from the AI."
+async def generate_gemini_text(api_key: str, prompt: str) -> str:
+    """
+    Single-shot Gemini call without tools, used for background tasks such as summarization.
+    Raises on failure so callers can decide how to handle it.
+    """
+    url = f"{GEMINI_API_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent"
+    payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    reservation = await reserve_gemini_quota(payload, lane="background")
+    response = await gemini_api.post(url, json=payload, headers=gemini_headers(api_key))
+    response.raise_for_status()
+    result = response.json()
+    settle_gemini_quota(reservation, result.get("usageMetadata"))
+
+    parts = result["candidates"][0].get("content", {}).get("parts", [])
+    text = " ".join(part["text"] for part in parts if "text" in part).strip()
+    if not text:
+        raise ValueError("Gemini returned an empty summary")
+    return text
+
+async def summarize_chat_messages(previous_summary: str, new_messages: List[dict]) -> str:
+    """
+    Fold new_messages into previous_summary with Gemini
+    """
+    transcript = "\n\n".join(
+        f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+        for msg in new_messages
+    )
+    prompt = CHAT_SUMMARY_PROMPT.format(
+        previous_summary=previous_summary or "(none yet)",
+        new_messages=transcript,
+    )
+    return await generate_gemini_text(os.environ.get('GEMINI_API_KEY', ''), prompt)
+
+# Background summarizer (only when Gemini is configured)
+chat_summarizer = ChatSummarizer(
+    db,
+    summarize_chat_messages,
+    trigger_messages=SUMMARY_TRIGGER_MESSAGES,
+    keep_recent=SUMMARY_KEEP_RECENT,
+) if SUMMARY_ENABLED and os.environ.get('GEMINI_API_KEY') else None
+
+async def stream_gemini_api(
+    api_key: str,
+    messages: List[dict],
+    system_prompt: str,
+    chat_id: Optional[str] = None,
+    read_response_cache: bool = True,
+) -> AsyncIterator[StreamResponse]:
+    """
+    Streaming variant of call_gemini_api using streamGenerateContent (SSE).
 
-                # Check if response contains function calls
-                function_calls = [part for part in parts if "functionCall" in part]
+    Yields "delta" events as text arrives, a "tool_call" event for every function
+    the model invokes, and finally a single "done" event carrying the full text.
+    A cached reply is sent as one delta.
+    """
+    url = f"{GEMINI_API_BASE_URL}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse"
+    headers = gemini_headers(api_key)
+    tool_set = select_tool_set(messages, chat_id)
+    cache_key = response_cache_key(messages, system_prompt, tool_set)
 
-                if function_calls:
-                    # Execute all function calls
-                    function_responses = []
+    try:
+        if cache_key and read_response_cache:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                yield StreamResponse(event="delta", content=cached, done=False)
+                yield StreamResponse(event="done", content=cached, done=True)
+                return
 
-                    for fc_part in function_calls:
-                        func_call = fc_part["functionCall"]
-                        func_name = func_call["name"]
-                        func_args = func_call.get("args", {})
+        payload = await prepare_gemini_payload(api_key, messages, system_prompt, tool_set)
+        contents = payload["contents"]
 
-                        logger.info(f"Executing tool: {func_name} with args: {func_args}")
+        max_iterations = 5  # Prevent infinite loops
+        iteration = 0
 
-                        # Execute the tool
-                        tool_result = await execute_tool_call(func_name, func_args)
+        while iteration < max_iterations:
+            iteration += 1
+            function_calls = []
+            # Like call_gemini_api, the reply is the final iteration's text only;
+            # narration streamed before a tool call is not part of it
+            text_chunks = []
+            received_parts = False
+            usage = None
+
+            body = encode_gemini_payload(payload, system_prompt, tool_set)
+            reservation = await reserve_gemini_quota(payload, system_prompt, tool_set, chat_id)
+            async with gemini_api.stream("POST", url, content=body, headers=headers) as response:
+                if response.is_error:
+                    await response.aread()
+                    if drop_context_cache(payload, response):
+                        iteration -= 1
+                        continue
+                    response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    # Every chunk carries the usage so far; the last one has the totals
+                    usage = chunk.get("usageMetadata") or usage
+                    candidates = chunk.get("candidates") or []
+                    if not candidates:
+                        continue
+
+                    for part in candidates[0].get("content", {}).get("parts", []):
+                        received_parts = True
+                        if "functionCall" in part:
+                            function_calls.append(part)
+                        elif part.get("text"):
+                            text_chunks.append(part["text"])
+                            yield StreamResponse(event="delta", content=part["text"], done=False)
+
+            settle_gemini_quota(reservation, usage)
+
+            if function_calls:
+                for fc_part in function_calls:
+                    func_name = fc_part["functionCall"]["name"]
+                    yield StreamResponse(event="tool_call", content=f"Calling {func_name}", tool_name=func_name, done=False)
+
+                # Execute all function calls (independent reads run concurrently)
+                tool_results = await execute_tool_calls(function_calls)
+                if tool_router:
+                    tool_router.record_tool_use(chat_id, (fc["functionCall"]["name"] for fc in function_calls))
+
+                contents.append({
+                    "role": "model",
+                    "parts": function_calls
+                })
+                contents.append({
+                    "role": "user",
+                    "parts": build_function_responses(function_calls, tool_results)
+                })
+                payload["contents"] = contents
+                continue
+
+            if not received_parts:
+                text_chunks = ["I received an empty response from the AI."]
+            elif not text_chunks:
+                text_chunks = ["I couldn't generate a proper response."]
+            elif cache_key and iteration == 1:
+                await response_cache.set(cache_key, "".join(text_chunks))
+            yield StreamResponse(event="done", content="".join(text_chunks), done=True)
+            return
+
+        yield StreamResponse(event="done", content="I reached the maximum number of function calls. Please try rephrasing your request.", done=True)
 
-                        # Build function response
-                        function_responses.append({
-                            "functionResponse": {
-                                "name": func_name,
-                                "response": {
-                                    "name": func_name,
-                                    "content": tool_result
-                                }
-                            }
-                        })
+    except Exception as e:
+        yield StreamResponse(event="error", content=gemini_error_message(e), done=True)
 
-                    # Add function call to conversation
-                    contents.append({
-                        "role": "model",
-                        "parts": function_calls
-                    })
+@app.on_event("startup")
+async def startup_db_indexes():
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Failed to ensure MongoDB indexes: {str(e)}")
 
-                    # Add function responses to conversation
-                    contents.append({
-                        "role": "user",
-                        "parts": function_responses
-                    })
+@app.on_event("startup")
+async def startup_tokenizer():
+    # Loading may download the encoding; don't let a slow or missing network hold up startup
+    try:
+        await asyncio.wait_for(asyncio.to_thread(load_encoding), timeout=TOKENIZER_LOAD_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"tiktoken encoding not loaded within {TOKENIZER_LOAD_TIMEOUT}s; estimating tokens from length until it is")
 
-                    # Update payload with new conversation including function responses
-                    payload["contents"] = contents
+@app.on_event("startup")
+async def startup_http_clients():
+    await scenario_api_client.start()
+    await gemini_client.start()
 
-                    # Continue the loop to get Gemini's response with the function results
-                    continue
+@app.on_event("startup")
+async def startup_chat_jobs():
+    chat_jobs.start()
 
-                # No function calls - extract text response
-                text_parts = [part.get("text", "") for part in parts if "text" in part]
-                if text_parts:
-                    return " ".join(text_parts)
+@app.on_event("shutdown")
+async def shutdown_chat_jobs():
+    await chat_jobs.close()
 
-                return "I couldn't generate a proper response."
+@app.on_event("shutdown")
+async def shutdown_chat_summarizer():
+    if chat_summarizer:
+        await chat_summarizer.close()
 
-        return "I reached the maximum number of function calls. Please try rephrasing your request."
+@app.on_event("shutdown")
+async def shutdown_tool_cache():
+    if tool_cache:
+        await tool_cache.close()
 
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}")
-        error_text = e.response.text
-        if "API_KEY_INVALID" in error_text or "401" in str(e.response.status_code):
-            return "Invalid API key. Please check your GEMINI_API_KEY in the .env file."
-        return f"I encountered an error communicating with the AI service. Status: {e.response.status_code}"
-    except Exception as e:
-        logger.error(f"Error calling Gemini API: {str(e)}")
-        return f"I encountered an error: {str(e)}. Please try again later."
+@app.on_event("shutdown")
+async def shutdown_response_cache():
+    if response_cache:
+        await response_cache.close()
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    await scenario_api_client.close()
+    await gemini_client.close()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -57,6 +57,7 @@ PRICING_ANALYST_PROMPT = """You are a pricing AI analyst for ClearDemand. Your p
 4. `create_price_rule`: Create an absolute/variable price rule (single rule, hard panels only)
 5. `create_cost_change_rule`: Create a cost change rule (single rule, hard panels only)
 6. `delete_rule`: Soft delete a pricing rule (requires user confirmation)
+7. `create_rules_bulk`: Create several rules of any types across one or more panels in one call (requires user confirmation)
 
 ---
 
@@ -401,6 +402,7 @@ When users ask "What should I do?" or "What rule should I use?", provide guidanc
 - "Create step rule..." → Validate panel exists AND is hard panel, gather details (factors/additive amounts), confirm, then `create_step_rule`
 - "Create price rule..." → Validate panel exists AND is hard panel, gather details (target price/variables), confirm, then `create_price_rule`
 - "Create cost change rule..." → Validate panel exists AND is hard panel, gather details (window, thresholds), confirm, then `create_cost_change_rule`
+- "Create these rules..." (more than one rule) → Validate every panel (hard panels for non-CPI rules), gather details for each rule, confirm the full list, then ONE `create_rules_bulk` call; report which rules were created and which failed (see `results`)
 - "Delete rule [id]" → Confirm deletion, determine rule_type, then `delete_rule` (soft delete only)
 - Note: For non-CPI rules, ALWAYS check panel is hard rule panel first
 
@@ -450,6 +452,28 @@ Always:
 
 **Remember:** You're not just executing API calls - you're a pricing strategy advisor helping users make informed decisions about their pricing rules."""
 
+# Prompt used to fold older chat turns into the running conversation summary
+CHAT_SUMMARY_PROMPT = """You maintain a running summary of a conversation between a pricing analyst and the ClearDemand AI Pricing Analyst.
+
+Update the existing summary with the new messages below. The summary replaces these messages in future requests, so keep every detail needed to continue the conversation:
+- Scenario, panel and rule names and IDs that were looked up, created, updated or deleted
+- Filters the user chose (major departments, zone groups, etc.)
+- Decisions, confirmations and open questions still awaiting an answer
+- The user's goals and preferences
+
+Write concise bullet points. Do not invent information. Reply with the updated summary only.
+
+**Existing summary:**
+{previous_summary}
+
+**New messages:**
+{new_messages}"""
+
+# Context message that carries the running summary in place of older turns
+CHAT_SUMMARY_CONTEXT_TEMPLATE = """Summary of the earlier part of this conversation (older messages are not shown):
+
+{summary}"""
+
 # Demo response when Gemini API key is not configured
 DEMO_RESPONSE_TEMPLATE = """I'm currently running without a Gemini API key configured.
 
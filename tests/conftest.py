@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# server.py reads these at import; the Motor client connects lazily, and tests swap it for mongomock
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "chatbot_test")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    The server module on an in-memory MongoDB, without Gemini or optional caches
+    """
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server as server_module
+
+    monkeypatch.setattr(server_module, "db", AsyncMongoMockClient()["test"])
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    for component in ("tool_cache", "tool_router", "response_cache", "gemini_context_cache", "gemini_rate_limiter", "chat_summarizer"):
+        monkeypatch.setattr(server_module, component, None)
+    return server_module
+
+
+class FakeGemini:
+    """
+    Mock transport answering generateContent and streamGenerateContent with
+    scripted replies, one list of parts per request, and recording the requests
+    """
+
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+
+    def reply(self, *parts):
+        self.replies.append(list(parts))
+
+    def __call__(self, request):
+        self.requests.append(json.loads(request.content))
+        parts = self.replies.pop(0)
+        if "streamGenerateContent" in request.url.path:
+            # One SSE chunk per part
+            body = "".join(
+                f"data: {json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [part]}}]})}\n\n"
+                for part in parts
+            )
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200, json={"candidates": [{"content": {"role": "model", "parts": parts}}]})
+
+
+@pytest.fixture
+def gemini(server, monkeypatch):
+    """
+    Point the server's Gemini client at a FakeGemini
+    """
+    from http_clients import PooledClient
+    from resilience import CircuitBreaker, ResilientClient
+
+    fake = FakeGemini()
+    client = PooledClient("gemini", httpx.Timeout(5.0), 10, 10, 5.0, transport=httpx.MockTransport(fake))
+    monkeypatch.setattr(server, "gemini_api", ResilientClient(client, CircuitBreaker("Gemini API"), max_retries=0))
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    return fake
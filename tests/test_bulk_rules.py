@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from api_tools import ALL_TOOLS, BULK_RULE_LIMIT
+from bulk_rules import create_rules_bulk, plan_submissions
+from tool_validation import ToolArgumentValidator
+
+pytestmark = pytest.mark.anyio
+
+validate = ToolArgumentValidator(ALL_TOOLS).validate
+
+
+def test_cpi_rules_are_batched_per_panel_and_others_sent_alone():
+    rules = [
+        {"rule_type": "cpi", "panel_id": 1, "rule_desc": "CPI A", "competitor": "Acme", "days_until_alert": 7},
+        {"rule_type": "margin", "panel_id": 1, "rule_desc": "Margin", "target_margin": 0.3},
+        {"rule_type": "CPI", "panel_id": 2, "rule_desc": "CPI B", "competitor": "Acme", "days_until_alert": 7},
+        {"rule_type": "cpi", "panel_id": 1, "rule_desc": "CPI C", "competitor": "Acme", "days_until_alert": 7},
+        {"rule_type": "step", "panel_id": 1, "rule_desc": "Step"},
+    ]
+    submissions, failures = plan_submissions(rules, validate)
+
+    assert failures == {}
+    assert [(tool, args["panel_id"], [rule["rule_desc"] for rule in args["rules"]], indexes) for tool, args, indexes in submissions] == [
+        ("create_cpi_rule", 1, ["CPI A", "CPI C"], [0, 3]),
+        ("create_margin_rule", 1, ["Margin"], [1]),
+        ("create_cpi_rule", 2, ["CPI B"], [2]),
+        ("create_step_rule", 1, ["Step"], [4]),
+    ]
+
+
+def test_rules_keep_only_the_fields_their_tool_accepts():
+    submissions, _ = plan_submissions([{"rule_type": "margin", "panel_id": 1, "rule_desc": "M", "min_cpi": 0.9}])
+    assert submissions[0][1] == {"panel_id": 1, "rules": [{"rule_desc": "M"}]}
+
+
+def test_invalid_rules_fail_alone_with_errors_pointing_at_their_index():
+    rules = [
+        {"rule_type": "margin", "panel_id": 1, "rule_desc": "ok"},
+        {"rule_type": "bogus", "panel_id": 1},
+        {"rule_type": "margin", "panel_id": 1, "rule_desc": "x", "target_margin": 2},
+    ]
+    submissions, failures = plan_submissions(rules, validate)
+
+    assert [indexes for _, _, indexes in submissions] == [[0]]
+    assert "Unknown rule_type 'bogus'" in failures[1]["error"]
+    assert failures[2]["validation_errors"] == [{"field": "rules[2].target_margin", "error": "must be <= 1 (got 2)"}]
+
+
+async def test_results_are_reported_per_rule_in_input_order():
+    in_flight = []
+    peak = []
+
+    async def execute(tool_name, tool_args):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        if tool_args["panel_id"] == 2:
+            return {"success": False, "error": "Panel 2 is not a hard rule panel"}
+        return {"success": True, "data": {}}
+
+    rules = [
+        {"rule_type": "cpi", "panel_id": 1, "rule_desc": "A", "competitor": "Acme", "days_until_alert": 7},
+        {"rule_type": "margin", "panel_id": 2, "rule_desc": "B"},
+        {"rule_type": "step", "panel_id": 1, "rule_desc": "C"},
+        {"rule_type": "nope"},
+    ]
+    result = await create_rules_bulk({"rules": rules}, execute, concurrency=2, validate=validate)
+
+    assert (result["success"], result["created"], result["failed"]) == (False, 2, 2)
+    assert [(r["index"], r["success"]) for r in result["results"]] == [(0, True), (1, False), (2, True), (3, False)]
+    assert result["results"][1]["error"] == "Panel 2 is not a hard rule panel"
+    assert max(peak) == 2
+
+
+async def test_rule_limit_holds_without_tool_validation():
+    async def execute(tool_name, tool_args):
+        raise AssertionError("not expected")
+
+    result = await create_rules_bulk({"rules": [{"rule_type": "cpi"}] * (BULK_RULE_LIMIT + 1)}, execute)
+    assert not result["success"]
+    assert "split" in result["error"]
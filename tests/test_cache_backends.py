@@ -0,0 +1,104 @@
+import pytest
+
+from cache_backends import FakeRedis, MemoryCacheBackend, RedisCacheBackend, create_cache_backend
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "fake-redis"])
+def backend(request):
+    return create_cache_backend(request.param, max_entries=10, namespace="test")
+
+
+async def test_round_trip(backend):
+    value = {"success": True, "data": {"items": [{"id": 1, "name": "Produce"}], "total": 1}}
+    await backend.set("k", value, ttl=60)
+    assert await backend.get("k") == value
+    assert await backend.get("missing") is None
+
+
+async def test_invalidate_tags_drops_only_tagged_entries(backend):
+    await backend.set("panel", 1, ttl=60, tags=["meijer|panel:3760", "meijer|scenario:1"])
+    await backend.set("rules", 2, ttl=60, tags=["meijer|panel:3760"])
+    await backend.set("other", 3, ttl=60, tags=["meijer|panel:12"])
+
+    assert await backend.invalidate_tags(["meijer|panel:3760"]) == 2
+
+    assert await backend.get("panel") is None
+    assert await backend.get("rules") is None
+    assert await backend.get("other") == 3
+    # Invalidating again finds nothing left
+    assert await backend.invalidate_tags(["meijer|panel:3760"]) == 0
+
+
+async def test_clear(backend):
+    await backend.set("a", 1, ttl=60)
+    await backend.clear()
+    assert await backend.get("a") is None
+
+
+async def test_memory_backend_expires_and_evicts():
+    backend = MemoryCacheBackend(max_entries=2)
+    await backend.set("a", 1, ttl=60)
+    await backend.set("b", 2, ttl=60)
+    await backend.get("a")
+    await backend.set("c", 3, ttl=60)
+
+    # "b" was the least recently used
+    assert await backend.get("b") is None
+    assert backend.evictions == 1
+
+    await backend.set("short", 4, ttl=-1)
+    assert await backend.get("short") is None
+
+
+async def test_redis_backend_namespaces_keys_and_tag_sets():
+    redis = FakeRedis()
+    backend = RedisCacheBackend(redis, namespace="ns")
+    await backend.set("k", [1, 2], ttl=30, tags=["t"])
+
+    assert await redis.get("ns:v:k") is not None
+    assert await redis.smembers("ns:t:t") == {b"ns:v:k"}
+
+    await backend.invalidate_tags(["t"])
+    assert await redis.get("ns:v:k") is None
+    assert await redis.smembers("ns:t:t") == set()
+
+
+async def test_redis_errors_are_misses():
+    class BrokenRedis(FakeRedis):
+        async def get(self, key):
+            raise ConnectionError("down")
+
+    backend = RedisCacheBackend(BrokenRedis())
+    assert await backend.get("k") is None
+    assert backend.stats()["errors"] == 1
+
+
+async def test_redis_tag_sets_outlive_their_longest_lived_member():
+    redis = FakeRedis()
+    backend = RedisCacheBackend(redis, namespace="ns")
+
+    await backend.set("long", 1, ttl=600, tags=["t"])
+    await backend.set("short", 2, ttl=60, tags=["t"])
+    assert await redis.ttl("ns:t:t") == 600
+
+    await backend.set("longer", 3, ttl=3600, tags=["t"])
+    assert await redis.ttl("ns:t:t") == 3600
+    assert backend.stats()["errors"] == 0
+
+
+async def test_redis_backend_works_without_redis_7_expire_options():
+    class Redis6(FakeRedis):
+        async def expire(self, key, seconds, **options):
+            if options:
+                raise RuntimeError("ERR wrong number of arguments for 'expire' command")
+            return await super().expire(key, seconds)
+
+    redis = Redis6()
+    backend = RedisCacheBackend(redis, namespace="ns")
+    await backend.set("k", 1, ttl=60, tags=["t"])
+
+    assert backend.stats()["errors"] == 0
+    assert await redis.ttl("ns:t:t") == 60
+    assert await backend.invalidate_tags(["t"]) == 1
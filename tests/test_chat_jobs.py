@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from chat_jobs import ChatJobQueue, QueueFull
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test"]
+
+
+async def wait_for_job(queue, job_id):
+    async for job in queue.subscribe(job_id, poll_interval=0.01):
+        last = job
+    return last
+
+
+async def test_runs_job_and_stores_result(db):
+    async def run_turn(chat_id, content):
+        return {"assistant_message": {"content": f"echo {content}"}}
+
+    queue = ChatJobQueue(db, run_turn, workers=2)
+    queue.start()
+    try:
+        job = await queue.submit("chat-1", "hi")
+        statuses = [update["status"] async for update in queue.subscribe(job["id"], poll_interval=0.01)]
+
+        assert statuses[-1] == "succeeded"
+        stored = await queue.get(job["id"])
+        assert stored["result"] == {"assistant_message": {"content": "echo hi"}}
+        assert queue.stats()["succeeded"] == 1
+    finally:
+        await queue.close()
+
+
+async def test_turns_of_one_chat_run_in_order_one_at_a_time(db):
+    running = set()
+    log = []
+
+    async def run_turn(chat_id, content):
+        assert chat_id not in running
+        running.add(chat_id)
+        await asyncio.sleep(0.01)
+        running.discard(chat_id)
+        log.append((chat_id, content))
+        return {}
+
+    queue = ChatJobQueue(db, run_turn, workers=4)
+    queue.start()
+    try:
+        jobs = [await queue.submit(chat_id, str(i)) for i in range(3) for chat_id in ("a", "b")]
+        for job in jobs:
+            assert (await wait_for_job(queue, job["id"]))["status"] == "succeeded"
+    finally:
+        await queue.close()
+
+    assert [content for chat_id, content in log if chat_id == "a"] == ["0", "1", "2"]
+    assert [content for chat_id, content in log if chat_id == "b"] == ["0", "1", "2"]
+
+
+async def test_failed_turn_marks_job_failed(db):
+    async def run_turn(chat_id, content):
+        raise RuntimeError("Gemini unavailable")
+
+    queue = ChatJobQueue(db, run_turn)
+    queue.start()
+    try:
+        job = await queue.submit("chat-1", "hi")
+        final = await wait_for_job(queue, job["id"])
+        assert final["status"] == "failed"
+        assert final["error"] == "Gemini unavailable"
+    finally:
+        await queue.close()
+
+
+async def test_rejects_submissions_beyond_max_queued(db):
+    async def run_turn(chat_id, content):
+        return {}
+
+    # Not started, so jobs stay queued
+    queue = ChatJobQueue(db, run_turn, max_queued=2)
+    await queue.submit("a", "1")
+    await queue.submit("b", "1")
+    with pytest.raises(QueueFull):
+        await queue.submit("c", "1")
+    assert queue.stats()["rejected"] == 1
+
+    await queue.close()
+    jobs = await db.chat_jobs.find({}, {"_id": 0}).to_list(None)
+    assert {job["status"] for job in jobs} == {"failed"}
+
+
+async def test_worker_survives_a_mongo_error(db, monkeypatch):
+    async def run_turn(chat_id, content):
+        return {"ok": True}
+
+    collection_type = type(db.chat_jobs)
+    original = collection_type.find_one_and_update
+    failures = []
+
+    async def flaky_find_one_and_update(self, *args, **kwargs):
+        if not failures:
+            failures.append(1)
+            raise ConnectionError("MongoDB unreachable")
+        return await original(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "find_one_and_update", flaky_find_one_and_update)
+
+    queue = ChatJobQueue(db, run_turn, workers=1)
+    queue.start()
+    try:
+        first = await queue.submit("chat-1", "one")
+        second = await queue.submit("chat-1", "two")
+
+        assert (await wait_for_job(queue, first["id"]))["status"] == "failed"
+        assert (await wait_for_job(queue, second["id"]))["status"] == "succeeded"
+        assert all(not task.done() for task in queue._tasks)
+        assert queue.stats()["failed"] == 1
+    finally:
+        await queue.close()
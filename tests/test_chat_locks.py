@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from chat_locks import ChatBusy, ChatTurnLocks, TurnSuperseded
+
+pytestmark = pytest.mark.anyio
+
+
+async def run_turn(locks, chat_id, log, name, duration=0.01):
+    async with locks.hold(chat_id):
+        log.append(f"{name} start")
+        await asyncio.sleep(duration)
+        log.append(f"{name} end")
+
+
+async def test_turns_of_one_chat_run_one_at_a_time():
+    locks = ChatTurnLocks()
+    log = []
+    await asyncio.gather(*(run_turn(locks, "chat-1", log, name) for name in "abc"))
+
+    assert log == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert locks.stats() == {"mode": "local", "active_chats": 0, "acquired": 3, "waited": 2, "busy": 0, "superseded": 0}
+
+
+async def test_other_chats_run_in_parallel():
+    locks = ChatTurnLocks()
+    log = []
+    await asyncio.gather(run_turn(locks, "chat-1", log, "a"), run_turn(locks, "chat-2", log, "b"))
+    assert log[:2] == ["a start", "b start"]
+
+
+async def test_supersede_skips_turns_a_newer_one_replaced():
+    locks = ChatTurnLocks(supersede=True)
+    log = []
+    results = await asyncio.gather(
+        *(run_turn(locks, "chat-1", log, name) for name in "abc"),
+        return_exceptions=True,
+    )
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], TurnSuperseded)
+    assert log == ["a start", "a end", "c start", "c end"]
+    assert locks.stats()["superseded"] == 1
+
+
+async def test_waiting_past_the_timeout_raises_chat_busy():
+    locks = ChatTurnLocks(wait_timeout=0.05)
+    log = []
+    results = await asyncio.gather(
+        run_turn(locks, "chat-1", log, "a", duration=0.2),
+        run_turn(locks, "chat-1", log, "b"),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[1], ChatBusy)
+    assert log == ["a start", "a end"]
+    assert locks.stats()["busy"] == 1
+
+
+async def test_mode_off_does_not_serialize():
+    locks = ChatTurnLocks(mode="off")
+    log = []
+    await asyncio.gather(run_turn(locks, "chat-1", log, "a"), run_turn(locks, "chat-1", log, "b"))
+    assert log[:2] == ["a start", "b start"]
+
+
+async def test_mongo_mode_holds_a_lease_while_the_turn_runs():
+    from mongomock_motor import AsyncMongoMockClient
+
+    db = AsyncMongoMockClient()["test"]
+    await db.chat_leases.create_index("chat_id", unique=True)
+    locks = ChatTurnLocks(db, mode="mongo")
+
+    async with locks.hold("chat-1"):
+        lease = await db.chat_leases.find_one({"chat_id": "chat-1"})
+        assert lease is not None
+        # A second process sees the live lease and cannot take it
+        assert not await ChatTurnLocks(db, mode="mongo")._try_lease("chat-1", "other")
+
+    assert await db.chat_leases.count_documents({}) == 0
@@ -0,0 +1,69 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from chat_summaries import ChatSummarizer, get_summary
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test"]
+
+
+async def add_messages(db, chat_id, count, start=0):
+    await db.messages.insert_many([
+        {"chat_id": chat_id, "role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}", "timestamp": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+        for i in range(start, start + count)
+    ])
+
+
+async def test_backlog_is_folded_in_bounded_batches(db):
+    batches = []
+
+    async def summarize(previous, messages):
+        batches.append([msg["content"] for msg in messages])
+        return f"{previous}+{len(messages)}"
+
+    summarizer = ChatSummarizer(db, summarize, trigger_messages=10, keep_recent=5)
+    await add_messages(db, "chat-1", 100)
+
+    assert await summarizer.summarize_chat("chat-1")
+
+    assert [len(batch) for batch in batches] == [10] * 9 + [5]
+    # Batches are consecutive and oldest first
+    assert [content for batch in batches for content in batch] == [f"m{i}" for i in range(95)]
+    summary = await get_summary(db, "chat-1")
+    assert summary["summarized_count"] == 95
+    assert summary["summary"] == "+10" * 9 + "+5"
+    assert summary["summarized_until"] == "2025-01-01T00:01:34"
+
+
+async def test_below_trigger_does_nothing(db):
+    async def summarize(previous, messages):
+        raise AssertionError("not expected")
+
+    summarizer = ChatSummarizer(db, summarize, trigger_messages=10, keep_recent=5)
+    await add_messages(db, "chat-1", 10)
+    assert not await summarizer.summarize_chat("chat-1")
+
+
+async def test_failed_batch_keeps_earlier_progress(db):
+    calls = []
+
+    async def summarize(previous, messages):
+        calls.append(len(messages))
+        if len(calls) == 2:
+            raise RuntimeError("quota exceeded")
+        return "summary"
+
+    summarizer = ChatSummarizer(db, summarize, trigger_messages=10, keep_recent=5)
+    await add_messages(db, "chat-1", 40)
+
+    with pytest.raises(RuntimeError):
+        await summarizer.summarize_chat("chat-1")
+    assert (await get_summary(db, "chat-1"))["summarized_count"] == 10
+
+    # The next run picks up after the first batch
+    assert await summarizer.summarize_chat("chat-1")
+    assert (await get_summary(db, "chat-1"))["summarized_count"] == 35
@@ -0,0 +1,71 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored_messages(server, chat_id):
+    return await server.db.messages.find({"chat_id": chat_id}, {"_id": 0}).sort("timestamp", 1).to_list(None)
+
+
+async def test_start_turn_writes_nothing_and_sends_the_message_once(server):
+    await server.db.messages.insert_one({"id": "m0", "chat_id": "chat-1", "role": "assistant", "content": "Earlier reply", "timestamp": "2025-01-01T00:00:00+00:00"})
+
+    user_msg, conversation = await server.start_turn("chat-1", "What is panel 1?")
+
+    assert user_msg.content == "What is panel 1?"
+    assert conversation == [
+        {"role": "assistant", "content": "Earlier reply"},
+        {"role": "user", "content": "What is panel 1?"},
+    ]
+    assert len(await stored_messages(server, "chat-1")) == 1
+
+
+async def test_finish_turn_saves_both_messages_and_titles_a_new_chat(server):
+    await server.db.chats.insert_one({"id": "chat-1", "title": "New chat", "updated_at": "2025-01-01T00:00:00+00:00"})
+    user_msg, _ = await server.start_turn("chat-1", "Show me every panel in the Summer Sale scenario, please")
+
+    assistant_msg = await server.finish_turn("chat-1", user_msg, "Here they are.")
+
+    stored = await stored_messages(server, "chat-1")
+    assert [(msg["id"], msg["role"], msg["content"]) for msg in stored] == [
+        (user_msg.id, "user", "Show me every panel in the Summer Sale scenario, please"),
+        (assistant_msg.id, "assistant", "Here they are."),
+    ]
+    # Timestamps are stored as ISO strings
+    assert all(isinstance(msg["timestamp"], str) for msg in stored)
+
+    chat = await server.db.chats.find_one({"id": "chat-1"})
+    assert chat["title"] == "Show me every panel in the Summer Sale scenario, p..."
+    assert chat["updated_at"] > "2025-01-01T00:00:00+00:00"
+
+
+async def test_finish_turn_keeps_an_existing_title(server):
+    await server.db.chats.insert_one({"id": "chat-1", "title": "Produce pricing"})
+    user_msg, _ = await server.start_turn("chat-1", "$literal: not an operator")
+
+    await server.finish_turn("chat-1", user_msg, "Reply")
+
+    chat = await server.db.chats.find_one({"id": "chat-1"})
+    assert chat["title"] == "Produce pricing"
+
+
+async def test_first_message_title_is_taken_literally(server):
+    await server.db.chats.insert_one({"id": "chat-1", "title": "New chat"})
+    user_msg, _ = await server.start_turn("chat-1", "$title")
+
+    await server.finish_turn("chat-1", user_msg, "Reply")
+
+    assert (await server.db.chats.find_one({"id": "chat-1"}))["title"] == "$title"
+
+
+async def test_finish_turn_schedules_a_summary(server, monkeypatch):
+    scheduled = []
+
+    class Summarizer:
+        def schedule(self, chat_id):
+            scheduled.append(chat_id)
+
+    monkeypatch.setattr(server, "chat_summarizer", Summarizer())
+    user_msg, _ = await server.start_turn("chat-1", "hi")
+    await server.finish_turn("chat-1", user_msg, "hello")
+    assert scheduled == ["chat-1"]
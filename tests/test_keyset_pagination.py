@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from keyset_pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_page, page_query
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    doc = {"id": "b", "updated_at": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}
+    cursor = encode_cursor(doc, "updated_at")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2025-01-02T03:04:05+00:00", "b")
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "W10", encode_cursor({"id": 1, "n": "x"}, "n")])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_page_query_rejects_both_directions():
+    cursor = encode_cursor({"id": "a", "t": "1"}, "t")
+    with pytest.raises(InvalidCursor):
+        page_query({}, "t", -1, before=cursor, after=cursor)
+
+
+def test_page_query_filters_after_cursor():
+    cursor = encode_cursor({"id": "a", "t": "1"}, "t")
+    query, direction = page_query({"chat_id": "c"}, "t", 1, after=cursor)
+    assert direction == 1
+    assert query == {
+        "chat_id": "c",
+        "$or": [{"t": {"$gt": "1"}}, {"t": "1", "id": {"$gt": "a"}}],
+    }
+
+
+async def test_fetch_page_walks_every_row_once():
+    collection = AsyncMongoMockClient()["test"]["messages"]
+    # Timestamps repeat, so the id breaks ties
+    await collection.insert_many([
+        {"id": f"m{i:02d}", "chat_id": "c", "timestamp": f"2025-01-01T00:00:{i // 3:02d}"}
+        for i in range(10)
+    ])
+
+    seen = []
+    cursor = None
+    while True:
+        docs, cursor = await fetch_page(collection, {"chat_id": "c"}, {"_id": 0}, "timestamp", -1, 4, before=cursor)
+        seen.extend(doc["id"] for doc in docs)
+        if cursor is None:
+            break
+    assert seen == [f"m{i:02d}" for i in reversed(range(10))]
+
+
+async def test_fetch_page_after_returns_rows_in_list_order():
+    collection = AsyncMongoMockClient()["test"]["messages"]
+    await collection.insert_many([{"id": f"m{i}", "timestamp": f"t{i}"} for i in range(5)])
+
+    cursor = encode_cursor({"id": "m1", "timestamp": "t1"}, "timestamp")
+    docs, next_cursor = await fetch_page(collection, {}, {"_id": 0}, "timestamp", -1, 2, after=cursor)
+
+    # Newest first, as the list is ordered, even though the scan went forwards
+    assert [doc["id"] for doc in docs] == ["m3", "m2"]
+    assert decode_cursor(next_cursor) == ("t3", "m3")
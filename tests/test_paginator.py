@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from paginator import fetch_all_pages
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeListTool:
+    """
+    Paged list tool over `total` rows, tracking how many pages are in flight
+    """
+
+    def __init__(self, total, fail_page=None):
+        self.total = total
+        self.fail_page = fail_page
+        self.pages = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __call__(self, tool_name, args):
+        page, size = args["page"], args["size"]
+        self.pages.append(page)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            # Later pages answer sooner, so results arrive out of order
+            await asyncio.sleep(0.001 * (10 - page % 10))
+        finally:
+            self.in_flight -= 1
+        if page == self.fail_page:
+            return {"success": False, "error": "HTTP 502"}
+        start = (page - 1) * size
+        items = [{"id": i} for i in range(start, min(start + size, self.total))]
+        return {"success": True, "data": {"items": items, "page_size": size, "total": self.total}}
+
+
+async def test_fetches_every_page_in_order_within_the_window():
+    tool = FakeListTool(total=95)
+    result = await fetch_all_pages(tool, "list_panels", {"scenario_id": 1, "all_pages": True}, page_size=10, window=3)
+
+    data = result["data"]
+    assert [item["id"] for item in data["items"]] == list(range(95))
+    assert data["pages_fetched"] == 10
+    assert data["truncated"] is False
+    assert "row_cap" not in data
+    assert tool.peak_in_flight == 3
+    assert sorted(tool.pages) == list(range(1, 11))
+
+
+async def test_stops_at_the_row_cap():
+    tool = FakeListTool(total=1000)
+    result = await fetch_all_pages(tool, "list_panels", {"all_pages": True}, page_size=10, window=4, max_rows=25)
+
+    data = result["data"]
+    assert data["returned"] == 25
+    assert data["total"] == 1000
+    assert data["truncated"] is True
+    assert data["row_cap"] == 25
+    # Only the pages needed for 25 rows
+    assert sorted(tool.pages) == [1, 2, 3]
+
+
+async def test_later_page_failure_keeps_earlier_rows():
+    tool = FakeListTool(total=50, fail_page=3)
+    result = await fetch_all_pages(tool, "list_panels", {"all_pages": True}, page_size=10, window=2)
+
+    data = result["data"]
+    assert [item["id"] for item in data["items"]] == list(range(20))
+    assert data["truncated"] is True
+    assert "page 3" in data["error"]
+
+
+async def test_first_page_failure_is_returned_unchanged():
+    tool = FakeListTool(total=50, fail_page=1)
+    result = await fetch_all_pages(tool, "list_panels", {"all_pages": True}, page_size=10)
+    assert result == {"success": False, "error": "HTTP 502"}
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import GeminiRateLimiter, TokenBucket
+from resilience import DeadlineExceeded, turn_deadline
+
+pytestmark = pytest.mark.anyio
+
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(60)  # one unit per second
+    bucket.take(60, now=bucket._updated)
+    start = bucket._updated
+
+    assert bucket.wait_time(1, start) == pytest.approx(1.0)
+    assert bucket.wait_time(1, start + 0.5) == pytest.approx(0.5)
+    assert bucket.available(start + 10) == pytest.approx(10.0)
+    # Never above capacity
+    assert bucket.available(start + 1000) == 60
+
+
+def test_token_bucket_caps_oversized_requests_and_adjusts():
+    bucket = TokenBucket(60)
+    now = bucket._updated
+    # A request larger than the bucket only needs a full bucket
+    assert bucket.wait_time(500, now) == 0
+    bucket.take(500, now)
+    assert bucket.available(now) == 0
+
+    bucket.adjust(30)
+    assert bucket.available(now) == -30
+    bucket.adjust(-1000)
+    assert bucket.available(now) == 60
+
+
+async def test_unlimited_admits_immediately():
+    limiter = GeminiRateLimiter()
+    for _ in range(100):
+        await limiter.acquire(10_000)
+    assert limiter.stats()["waited"] == 0
+
+
+async def test_waits_for_request_quota():
+    limiter = GeminiRateLimiter(requests_per_minute=600)  # refills one request per 0.1s
+    limiter.requests.level = 1
+
+    await limiter.acquire(1)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await limiter.acquire(1)
+
+    assert loop.time() - start >= 0.05
+    assert limiter.waited == 1
+    assert limiter.admitted == 2
+
+
+async def test_interactive_lane_first_then_round_robin_across_chats():
+    limiter = GeminiRateLimiter(requests_per_minute=6000)  # one request per 10ms
+    limiter.requests.level = 0
+    order = []
+
+    async def request(key, lane):
+        await limiter.acquire(1, key=key, lane=lane)
+        order.append(key)
+
+    tasks = [asyncio.create_task(request(key, lane)) for key, lane in [
+        ("summary", "background"),
+        ("busy", "interactive"),
+        ("busy", "interactive"),
+        ("busy", "interactive"),
+        ("quiet", "interactive"),
+    ]]
+    await asyncio.gather(*tasks)
+
+    assert order == ["busy", "quiet", "busy", "busy", "summary"]
+    assert limiter.stats()["peak_queued"] == 5
+
+
+async def test_settle_corrects_token_estimate():
+    limiter = GeminiRateLimiter(tokens_per_minute=1000)
+    reservation = await limiter.acquire(100)
+    limiter.settle(reservation, 400)
+    assert limiter.tokens.level == pytest.approx(600, abs=1)
+
+
+async def test_deadline_withdraws_waiter():
+    limiter = GeminiRateLimiter(requests_per_minute=1)
+    await limiter.acquire(1)
+
+    with turn_deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            await limiter.acquire(1)
+
+    stats = limiter.stats()
+    assert stats["queued"] == 0
+    assert stats["deadline_exceeded"] == 1
+
+
+def test_quota_estimate_tokenizes_only_the_conversation_per_request(server, monkeypatch):
+    import tool_payload
+
+    counted = []
+
+    def count_tokens(text):
+        counted.append(text)
+        return len(text)
+
+    for module in (server, tool_payload):
+        monkeypatch.setattr(module, "count_tokens", count_tokens)
+        monkeypatch.setattr(module, "encoding_loaded", lambda: True)
+
+    tool_set = tool_payload.ToolSet(tool_payload.ALL_TOOLS[:2])
+    prompt = "You are a test prompt for the quota estimate."
+    payload = {"contents": [{"role": "user", "parts": [{"text": "hi"}]}]}
+    contents_json = tool_payload.encode_json(payload).decode("utf-8")
+    expected = len(contents_json) + len(tool_set.json) + len(prompt) + server.GEMINI_OUTPUT_TOKENS_ESTIMATE
+
+    assert server.estimate_gemini_tokens(payload, prompt, tool_set) == expected
+    counted.clear()
+    assert server.estimate_gemini_tokens(payload, prompt, tool_set) == expected
+    assert counted == [contents_json]
+
+    # A context cache holds the prompt and tools, so they are not sent or counted
+    cached = {**payload, "cachedContent": "cachedContents/abc"}
+    assert server.estimate_gemini_tokens(cached, prompt, tool_set) == (
+        len(tool_payload.encode_json(cached)) + server.GEMINI_OUTPUT_TOKENS_ESTIMATE
+    )
@@ -0,0 +1,155 @@
+import asyncio
+
+import httpx
+import pytest
+
+from http_clients import PooledClient
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientClient, retry_after_seconds, turn_deadline
+
+pytestmark = pytest.mark.anyio
+
+
+def make_client(handler, max_retries=2, failure_threshold=5):
+    pooled = PooledClient(
+        "test",
+        httpx.Timeout(5.0),
+        max_connections=10,
+        max_keepalive_connections=10,
+        keepalive_expiry=5,
+        transport=httpx.MockTransport(handler),
+    )
+    breaker = CircuitBreaker("test", failure_threshold=failure_threshold, reset_timeout=60)
+    return ResilientClient(pooled, breaker, max_retries=max_retries, base_delay=0, max_delay=0)
+
+
+def responses(*statuses):
+    """
+    Handler answering each request with the next status, recording the requests
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    return handler, calls
+
+
+async def test_retries_retryable_status_then_succeeds():
+    handler, calls = responses(503, 429, 200)
+    client = make_client(handler)
+
+    response = await client.get("http://api/scenarios")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert client.retries == 2
+
+
+async def test_returns_last_error_when_retries_run_out():
+    handler, calls = responses(503)
+    client = make_client(handler, max_retries=1)
+
+    response = await client.get("http://api/scenarios")
+
+    assert response.status_code == 503
+    assert len(calls) == 2
+
+
+async def test_does_not_retry_non_idempotent_or_client_errors():
+    handler, calls = responses(503)
+    client = make_client(handler)
+    assert (await client.post("http://api/panels")).status_code == 503
+    assert len(calls) == 1
+
+    handler, calls = responses(404)
+    client = make_client(handler)
+    assert (await client.get("http://api/panels/1")).status_code == 404
+    assert len(calls) == 1
+
+
+async def test_retries_transport_errors():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    client = make_client(handler)
+    assert (await client.get("http://api/scenarios")).status_code == 200
+    assert len(attempts) == 2
+
+
+async def test_stream_retries_before_yielding():
+    handler, calls = responses(502, 200)
+    client = make_client(handler)
+
+    async with client.stream("GET", "http://api/stream") as response:
+        assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_circuit_opens_and_fails_fast():
+    handler, calls = responses(500)
+    client = make_client(handler, max_retries=0, failure_threshold=3)
+
+    for _ in range(3):
+        await client.get("http://api/scenarios")
+    assert client.breaker.state == "open"
+
+    with pytest.raises(CircuitOpen):
+        await client.get("http://api/scenarios")
+    assert len(calls) == 3
+    assert client.breaker.stats()["rejected"] == 1
+
+
+def test_circuit_half_open_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # The reset period has passed: one probe goes through
+    breaker.check()
+    assert breaker.state == "half_open"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.opened == 1
+
+
+async def test_deadline_stops_calls():
+    handler, calls = responses(200)
+    client = make_client(handler)
+
+    with turn_deadline(0.01):
+        await asyncio.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            await client.get("http://api/scenarios")
+    assert calls == []
+    assert client.deadline_exceeded == 1
+
+
+async def test_no_retry_past_the_deadline():
+    calls = []
+
+    def retry_in_a_minute(request):
+        calls.append(request)
+        return httpx.Response(503, headers={"Retry-After": "60"})
+
+    client = make_client(retry_in_a_minute)
+    with turn_deadline(5):
+        response = await client.get("http://api/scenarios")
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "3"})) == 3.0
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    assert retry_after_seconds(httpx.Response(429)) is None
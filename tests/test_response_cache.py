@@ -0,0 +1,93 @@
+import pytest
+
+from response_cache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+def text(value):
+    return {"text": value}
+
+
+def call(name, **args):
+    return {"functionCall": {"name": name, "args": args}}
+
+
+@pytest.fixture
+def cache(server, monkeypatch):
+    response_cache = ResponseCache()
+    monkeypatch.setattr(server, "response_cache", response_cache)
+
+    async def execute_tool_calls(function_calls):
+        return [{"success": True, "data": {"id": 1}} for _ in function_calls]
+
+    monkeypatch.setattr(server, "execute_tool_calls", execute_tool_calls)
+    return response_cache
+
+
+def ask(question):
+    return [{"role": "user", "content": question}]
+
+
+async def stream(server, messages, read_response_cache=True):
+    events = [
+        event async for event in server.stream_gemini_api("test-key", messages, "system", "chat-1", read_response_cache)
+    ]
+    return events[-1].content
+
+
+def test_key_ignores_case_and_whitespace_but_not_context():
+    cache = ResponseCache(context_messages=2)
+    key = lambda messages: cache.key("model", "system", "tools", "tenant", messages)
+
+    assert key(ask("What rule types exist?")) == key(ask("  what RULE types\nexist? "))
+    assert key(ask("What rule types exist?")) != key([{"role": "user", "content": "hi"}, *ask("What rule types exist?")])
+    assert key(ask("What rule types exist?")) != cache.key("model", "system", "other tools", "tenant", ask("What rule types exist?"))
+
+
+async def test_replies_without_tool_calls_are_cached(server, gemini, cache):
+    gemini.reply(text("There are five rule types."))
+
+    first = await server.call_gemini_api("test-key", ask("What rule types exist?"), "system", "chat-1")
+    second = await server.call_gemini_api("test-key", ask("what rule types exist?"), "system", "chat-2")
+
+    assert first == second == "There are five rule types."
+    assert len(gemini.requests) == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_replies_after_tool_calls_are_not_cached(server, gemini, cache, streaming):
+    for _ in range(2):
+        gemini.reply(call("get_panel", panel_id=1))
+        gemini.reply(text("Panel 1 is Produce."))
+
+    for _ in range(2):
+        if streaming:
+            reply = await stream(server, ask("What is panel 1?"))
+        else:
+            reply = await server.call_gemini_api("test-key", ask("What is panel 1?"), "system", "chat-1")
+        assert reply == "Panel 1 is Produce."
+
+    assert len(gemini.requests) == 4
+    assert cache.stats()["stores"] == 0
+
+
+async def test_streamed_replies_are_cached_and_served(server, gemini, cache):
+    gemini.reply(text("There are "), text("five rule types."))
+
+    assert await stream(server, ask("What rule types exist?")) == "There are five rule types."
+    assert await stream(server, ask("What rule types exist?")) == "There are five rule types."
+    assert len(gemini.requests) == 1
+
+
+async def test_no_cache_asks_gemini_and_replaces_the_entry(server, gemini, cache):
+    gemini.reply(text("Old answer."))
+    gemini.reply(text("New answer."))
+
+    await server.call_gemini_api("test-key", ask("What rule types exist?"), "system", "chat-1")
+    fresh = await server.call_gemini_api("test-key", ask("What rule types exist?"), "system", "chat-1", read_response_cache=False)
+    cached = await server.call_gemini_api("test-key", ask("What rule types exist?"), "system", "chat-1")
+
+    assert fresh == cached == "New answer."
+    assert len(gemini.requests) == 2
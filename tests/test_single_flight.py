@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from tool_cache import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"success": True}
+
+    results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert results == [{"success": True}] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4, "coalesced_rate": 0.8}
+
+
+async def test_different_keys_and_later_calls_run_again():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    await asyncio.gather(flight.do("a", fetch), flight.do("b", fetch))
+    # Nothing is cached once the call finished
+    await flight.do("a", fetch)
+    assert len(calls) == 3
+
+
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert [str(result) for result in results] == ["upstream down", "upstream down"]
+
+
+async def test_cancelled_caller_does_not_cancel_the_call():
+    flight = SingleFlight()
+    done = asyncio.Event()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        done.set()
+        return "result"
+
+    first = asyncio.create_task(flight.do("key", fetch))
+    second = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "result"
+    assert done.is_set()
+    with pytest.raises(asyncio.CancelledError):
+        await first
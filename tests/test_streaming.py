@@ -0,0 +1,89 @@
+import json
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def text(value):
+    return {"text": value}
+
+
+def call(name, **args):
+    return {"functionCall": {"name": name, "args": args}}
+
+
+@pytest.fixture
+def tools(server, monkeypatch):
+    async def execute_tool_calls(function_calls):
+        return [{"success": True, "data": {"id": 1}} for _ in function_calls]
+
+    monkeypatch.setattr(server, "execute_tool_calls", execute_tool_calls)
+
+
+async def collect(server, messages):
+    return [event async for event in server.stream_gemini_api("test-key", messages, "system", "chat-1")]
+
+
+async def test_streams_deltas_then_done(server, gemini):
+    gemini.reply(text("Hello "), text("there"))
+    events = await collect(server, [{"role": "user", "content": "hi"}])
+
+    assert [(event.event, event.content) for event in events] == [
+        ("delta", "Hello "),
+        ("delta", "there"),
+        ("done", "Hello there"),
+    ]
+
+
+async def test_final_text_excludes_narration_before_tool_calls(server, gemini, tools):
+    gemini.reply(text("Let me look that up."), call("get_panel", panel_id=1))
+    gemini.reply(text("Panel 1 is Produce."))
+    events = await collect(server, [{"role": "user", "content": "What is panel 1?"}])
+
+    assert [event.event for event in events] == ["delta", "tool_call", "delta", "done"]
+    assert events[-1].content == "Panel 1 is Produce."
+    # The second request carries the function call and its result
+    contents = gemini.requests[1]["contents"]
+    assert contents[-2]["parts"] == [call("get_panel", panel_id=1)]
+    assert contents[-1]["parts"][0]["functionResponse"]["name"] == "get_panel"
+
+
+async def test_stream_and_non_stream_store_the_same_reply(server, gemini, tools):
+    for _ in range(2):
+        gemini.reply(text("Checking."), call("get_panel", panel_id=1))
+        gemini.reply(text("Panel 1 is Produce."))
+
+    messages = [{"role": "user", "content": "What is panel 1?"}]
+    events = await collect(server, messages)
+    reply = await server.call_gemini_api("test-key", messages, "system", "chat-1")
+
+    assert events[-1].content == reply == "Panel 1 is Produce."
+
+
+async def test_errors_end_the_stream(server, gemini):
+    events = await collect(server, [{"role": "user", "content": "hi"}])
+    # No scripted reply: the mock transport fails
+    assert events[-1].event == "error"
+    assert events[-1].done
+
+
+async def test_send_message_stream_persists_the_final_reply(server, gemini, tools):
+    await server.db.chats.insert_one({"id": "chat-1", "title": "New chat"})
+    gemini.reply(text("Let me check."), call("get_panel", panel_id=1))
+    gemini.reply(text("Panel 1 is "), text("Produce."))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/chats/chat-1/messages/stream", json={"content": "What is panel 1?"})
+
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [event["event"] for event in events] == ["delta", "tool_call", "delta", "delta", "done"]
+    assert events[-1]["message"]["content"] == "Panel 1 is Produce."
+
+    stored = await server.db.messages.find({"chat_id": "chat-1"}, {"_id": 0}).sort("timestamp", 1).to_list(None)
+    assert [(msg["role"], msg["content"]) for msg in stored] == [
+        ("user", "What is panel 1?"),
+        ("assistant", "Panel 1 is Produce."),
+    ]
@@ -0,0 +1,79 @@
+import pytest
+
+from tool_cache import ToolResultCache, cache_key, cache_tags, invalidation_tags
+
+pytestmark = pytest.mark.anyio
+
+RESULT = {"success": True, "data": {}}
+
+# Every cacheable read and the writes that must invalidate it
+READS = {
+    "scenarios": ("list_scenarios", {}),
+    "scenario": ("get_scenario", {"scenario_id": 1}),
+    "panels": ("list_panels", {"scenario_name": "Summer Sale"}),
+    "panel_12": ("get_panel", {"panel_id": 12}),
+    "panel_13": ("get_panel", {"panel_id": 13}),
+    "rules_12": ("list_panel_rules", {"panel_id": 12}),
+    "rules_13": ("list_panel_rules", {"panel_id": 13}),
+}
+
+
+async def cached_reads(writes):
+    """
+    Fill a cache with READS, run the write, and return which reads are still cached
+    """
+    cache = ToolResultCache()
+    for tool_name, tool_args in READS.values():
+        await cache.set("meijer", tool_name, tool_args, RESULT)
+    for tool_name, tool_args in writes:
+        await cache.invalidate_for_write("meijer", tool_name, tool_args)
+    return {name for name, (tool_name, tool_args) in READS.items() if await cache.get("meijer", tool_name, tool_args)}
+
+
+@pytest.mark.parametrize("write, stale", [
+    (("create_scenario", {"scenario_name": "New"}), {"scenarios"}),
+    (("create_panel", {"scenario_name": "Summer Sale"}), {"panels"}),
+    (("update_panel", {"panel_id": 12, "panel_name": "Produce"}), {"panels", "panel_12"}),
+    (("delete_panel", {"panel_id": 12}), {"panels", "panel_12", "rules_12"}),
+    (("create_cpi_rule", {"panel_id": 12, "rules": []}), {"panels", "panel_12", "rules_12"}),
+    (("create_margin_rule", {"panel_id": 12.0, "rules": []}), {"panels", "panel_12", "rules_12"}),
+    (("delete_rule", {"rule_id": 5, "rule_type": "cpi"}), {"panels", "panel_12", "panel_13", "rules_12", "rules_13"}),
+])
+async def test_writes_invalidate_what_they_affect(write, stale):
+    assert await cached_reads([write]) == set(READS) - stale
+
+
+async def test_ids_sent_as_floats_share_entries_and_tags():
+    cache = ToolResultCache()
+    # Gemini sends integer arguments as floats
+    await cache.set("meijer", "get_panel", {"panel_id": 12.0}, RESULT)
+    assert await cache.get("meijer", "get_panel", {"panel_id": 12}) == RESULT
+
+    await cache.invalidate_for_write("meijer", "update_panel", {"panel_id": 12})
+    assert await cache.get("meijer", "get_panel", {"panel_id": 12.0}) is None
+    assert cache_tags("get_panel", {"panel_id": 12.0}) == cache_tags("get_panel", {"panel_id": 12})
+    assert invalidation_tags("delete_panel", {"panel_id": 12.0}) == invalidation_tags("delete_panel", {"panel_id": 12})
+
+
+async def test_tenants_are_isolated():
+    cache = ToolResultCache()
+    await cache.set("meijer", "list_scenarios", {}, RESULT)
+    await cache.set("other", "list_scenarios", {}, RESULT)
+
+    await cache.invalidate_for_write("other", "create_scenario", {})
+
+    assert await cache.get("meijer", "list_scenarios", {}) == RESULT
+    assert await cache.get("other", "list_scenarios", {}) is None
+
+
+async def test_results_read_before_a_write_are_not_stored():
+    cache = ToolResultCache()
+    generation = cache.generation
+    await cache.invalidate_for_write("meijer", "update_panel", {"panel_id": 12})
+
+    await cache.set("meijer", "get_panel", {"panel_id": 12}, RESULT, generation)
+    assert await cache.get("meijer", "get_panel", {"panel_id": 12}) is None
+
+
+def test_argument_order_does_not_matter():
+    assert cache_key("t", "list_panels", {"a": 1, "b": 2}) == cache_key("t", "list_panels", {"b": 2, "a": 1})
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def function_call(name, **args):
+    return {"functionCall": {"name": name, "args": args}}
+
+
+@pytest.fixture
+def tool_log(server, monkeypatch):
+    """
+    Replace the Scenario API call with one that logs when each call starts and ends
+    """
+    log = []
+
+    async def execute_tool_call(tool_name, tool_args):
+        log.append(("start", tool_args["n"]))
+        await asyncio.sleep(0.01)
+        log.append(("end", tool_args["n"]))
+        return {"success": True, "data": tool_args["n"]}
+
+    monkeypatch.setattr(server, "execute_tool_call", execute_tool_call)
+    return log
+
+
+async def test_reads_run_concurrently(server, tool_log):
+    calls = [function_call("get_panel", n=n) for n in range(3)]
+    results = await server.execute_tool_calls(calls)
+
+    assert [result["data"] for result in results] == [0, 1, 2]
+    assert tool_log[:3] == [("start", 0), ("start", 1), ("start", 2)]
+
+
+async def test_writes_are_barriers(server, tool_log):
+    calls = [
+        function_call("get_panel", n=0),
+        function_call("list_panel_rules", n=1),
+        function_call("create_cpi_rule", n=2),
+        function_call("delete_rule", n=3),
+        function_call("get_panel", n=4),
+    ]
+    results = await server.execute_tool_calls(calls)
+
+    assert [result["data"] for result in results] == [0, 1, 2, 3, 4]
+    # Both reads finish before the first write starts; each write runs alone
+    # and the read after them only starts once they are done
+    assert tool_log.index(("start", 2)) > max(tool_log.index(("end", 0)), tool_log.index(("end", 1)))
+    assert tool_log[tool_log.index(("start", 2)):] == [
+        ("start", 2), ("end", 2), ("start", 3), ("end", 3), ("start", 4), ("end", 4),
+    ]
+
+
+async def test_concurrency_is_bounded(server, tool_log, monkeypatch):
+    monkeypatch.setattr(server, "TOOL_CALL_CONCURRENCY", 2)
+    await server.execute_tool_calls([function_call("get_scenario", n=n) for n in range(4)])
+
+    in_flight = peak = 0
+    for event, _ in tool_log:
+        in_flight += 1 if event == "start" else -1
+        peak = max(peak, in_flight)
+    assert peak == 2
@@ -0,0 +1,105 @@
+import pytest
+
+from api_tools import ALL_TOOLS, TOOL_ROUTES
+from tool_dispatch import TOOL_DISPATCH
+
+BASE = "/api/v1/pricing-rules"
+
+# Query parameters the old if/elif chain forwarded per GET tool, in its order
+LEGACY_QUERY_PARAMS = {
+    "list_scenarios": ["active", "approved", "scenario_type", "page", "size"],
+    "list_panels": [
+        "scenario", "panel_name", "valid", "department", "category", "sub_category", "sub_sub_category",
+        "major_department", "product_group", "product_source", "zone", "zone_group", "location_hierarchy_id",
+        "market_group", "market_source", "price_type", "rule_type", "rule_sub_type", "page", "size", "sort",
+    ],
+    "list_panel_rules": ["page", "size", "order_by", "sort_order"],
+}
+LEGACY_BOOL_PARAMS = {"active", "approved", "valid"}
+
+
+def legacy_request(tool_name, args):
+    """
+    (method, path, params, body) the old if/elif chain in call_scenario_api sent
+    """
+    def query():
+        return {
+            param: str(args[param]).lower() if param in LEGACY_BOOL_PARAMS else args[param]
+            for param in LEGACY_QUERY_PARAMS[tool_name] if param in args
+        }
+
+    rule_paths = {
+        "create_cpi_rule": "cpi", "create_margin_rule": "margin", "create_step_rule": "step",
+        "create_price_rule": "price", "create_cost_change_rule": "cost-change",
+    }
+    if tool_name == "list_scenarios":
+        return "GET", f"{BASE}/scenario", query(), None
+    if tool_name == "get_scenario":
+        return "GET", f"{BASE}/scenario/{args.get('scenario_id')}", None, None
+    if tool_name == "create_scenario":
+        return "POST", f"{BASE}/scenario", None, args
+    if tool_name == "list_panels":
+        return "GET", f"{BASE}/panel", query(), None
+    if tool_name == "get_panel":
+        return "GET", f"{BASE}/panel/{args.get('panel_id')}", None, None
+    if tool_name == "create_panel":
+        return "POST", f"{BASE}/panel", None, args
+    if tool_name == "update_panel":
+        return "PATCH", f"{BASE}/panel/{args.get('panel_id')}", None, {k: v for k, v in args.items() if k != "panel_id"}
+    if tool_name == "delete_panel":
+        return "DELETE", f"{BASE}/panel/{args.get('panel_id')}", None, None
+    if tool_name == "list_panel_rules":
+        return "GET", f"{BASE}/panel/{args.get('panel_id')}/rules", query(), None
+    if tool_name in rule_paths:
+        return "POST", f"{BASE}/rule/{rule_paths[tool_name]}", None, args
+    if tool_name == "delete_rule":
+        return "DELETE", f"{BASE}/rule/{args.get('rule_id')}", {"rule_type": args.get("rule_type")}, None
+    raise AssertionError(f"no legacy branch for {tool_name}")
+
+
+def sample_value(name, schema):
+    if schema.get("type") == "boolean":
+        return True
+    if schema.get("type") in ("integer", "number"):
+        return 3760
+    if schema.get("type") == "array":
+        return [{"rule_desc": "x"}]
+    return f"{name}-value"
+
+
+def full_args(tool):
+    """
+    Arguments setting every declared parameter, except the ones handled in-process
+    """
+    properties = tool["parameters"].get("properties", {})
+    return {name: sample_value(name, schema) for name, schema in properties.items() if name != "all_pages"}
+
+
+ROUTED_TOOLS = [tool for tool in ALL_TOOLS if tool["name"] in TOOL_ROUTES]
+
+
+def test_every_routed_tool_is_compiled():
+    assert set(TOOL_DISPATCH) == set(TOOL_ROUTES)
+
+
+@pytest.mark.parametrize("tool", ROUTED_TOOLS, ids=lambda tool: tool["name"])
+@pytest.mark.parametrize("args_for", [full_args, lambda tool: {
+    name: sample_value(name, tool["parameters"]["properties"][name]) for name in tool["parameters"].get("required", [])
+}], ids=["all_args", "required_args"])
+def test_route_matches_the_legacy_chain(tool, args_for):
+    args = args_for(tool)
+    request = TOOL_DISPATCH[tool["name"]].build(args)
+    method, path, params, body = legacy_request(tool["name"], args)
+
+    assert (request.method, request.path, request.body) == (method, path, body)
+    # Query parameters: same values; an empty dict and none at all send the same URL
+    assert (request.params or {}) == (params or {})
+
+
+def test_integral_float_ids_are_sent_as_integers():
+    assert TOOL_DISPATCH["get_panel"].build({"panel_id": 3760.0}).path == f"{BASE}/panel/3760"
+
+
+def test_all_pages_is_never_sent_upstream():
+    request = TOOL_DISPATCH["list_panels"].build({"scenario": "Summer Sale", "all_pages": True})
+    assert request.params == {"scenario": "Summer Sale"}
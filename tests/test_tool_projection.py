@@ -0,0 +1,60 @@
+from tool_projection import ToolResultProjector, _is_noise_field
+
+
+def ok(data):
+    return {"success": True, "data": data}
+
+
+def test_noise_fields_need_a_suffix():
+    for key in ("created_by", "CreatedAt", "updatedOn", "deleted_at", "lastModified", "last_updated_by", "etag", "_links"):
+        assert _is_noise_field(key), key
+    for key in ("created", "updated", "modified", "deleted", "status", "creator"):
+        assert not _is_noise_field(key), key
+
+
+def test_list_items_lose_bookkeeping_fields_and_empty_values():
+    projector = ToolResultProjector()
+    result = projector.project("list_panels", ok({"items": [
+        {"id": 1, "name": "Produce", "createdBy": "ann", "updated_at": "2024-01-01", "deleted": False, "notes": None},
+    ]}))
+    assert result["data"]["items"] == [{"id": 1, "name": "Produce", "deleted": False}]
+
+
+def test_allowlist_applies_to_item_keys_only():
+    projector = ToolResultProjector(item_fields={"list_panels": ["id", "rules"]})
+    result = projector.project("list_panels", ok({"total": 1, "items": [
+        {"id": 1, "name": "Produce", "rules": [{"rule_desc": "Keep margin", "target_margin": 0.3, "createdAt": "x"}]},
+    ]}))
+    assert result["data"] == {
+        "total": 1,
+        "items": [{"id": 1, "rules": [{"rule_desc": "Keep margin", "target_margin": 0.3}]}],
+    }
+
+
+def test_long_lists_are_truncated_with_a_count():
+    projector = ToolResultProjector(max_list_items=2)
+    result = projector.project("list_scenarios", ok({"items": [{"id": i} for i in range(5)]}))
+    assert result["data"] == {"items": [{"id": 0}, {"id": 1}], "items_omitted": 3}
+
+
+def test_size_budget_shortens_lists_then_strings():
+    projector = ToolResultProjector(max_bytes=400)
+    result = projector.project("list_scenarios", ok({"items": [{"id": i, "description": "x" * 500} for i in range(10)]}))
+    items = result["data"]["items"]
+    assert len(items) == 1 and items[0]["description"].endswith("...")
+    assert result["data"]["items_omitted"] == 9
+    assert "note" not in result
+    assert projector.stats()["over_budget"] == 0
+
+
+def test_columnar_encoding():
+    projector = ToolResultProjector(columnar=True)
+    result = projector.project("list_panels", ok({"items": [{"id": 1, "name": "A"}, {"id": 2, "code": "B"}]}))
+    assert result["data"]["items"] == {"columns": ["id", "name", "code"], "rows": [[1, "A", None], [2, None, "B"]]}
+
+
+def test_failed_results_pass_through():
+    projector = ToolResultProjector()
+    failure = {"success": False, "error": "Not found", "data": {"createdBy": "ann"}}
+    assert projector.project("list_panels", failure) is failure
+    assert projector.stats()["projected"] == 0
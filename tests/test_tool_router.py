@@ -0,0 +1,71 @@
+import pytest
+
+from tool_router import FULL_GROUPS, TOOL_SETS, ToolRouter
+
+
+@pytest.fixture
+def router():
+    return ToolRouter()
+
+
+@pytest.mark.parametrize("message", [
+    "What is the target margin of panel Produce Northeast?",
+    "Why is scenario Summer Sale not approved?",
+    "Explain the rules of panel Produce",
+    "What is the margin rule set for Dairy?",
+    "Explain CPI rules",
+])
+def test_concept_questions_naming_data_get_tools(router, message):
+    groups = router.classify(message)
+    assert groups is None or groups
+
+
+@pytest.mark.parametrize("message, groups", [
+    ("List active scenarios", {"scenario"}),
+    ("Tell me about panel 3760", {"panel", "scenario"}),
+    ("Create a CPI rule for panel 3760 against Walmart", {"rule", "panel", "scenario"}),
+    ("Delete rule 991", {"rule", "panel"}),
+])
+def test_routes_to_matched_groups_and_their_dependencies(router, message, groups):
+    assert router.classify(message) == groups
+
+
+def test_only_concept_questions_without_data_nouns_get_no_tools(router):
+    assert router.classify("What is price elasticity?") == frozenset()
+    # Unsure: everything
+    assert router.classify("Hello!") is None
+    assert router.classify("Can you help me with pricing?") is None
+
+
+def test_follow_up_keeps_the_previous_turns_tools(router):
+    router.route("Create a CPI rule for panel 3760 against Walmart", "chat-1")
+    assert router.classify("yes", "chat-1") == {"rule", "panel", "scenario"}
+    # Without history, a follow-up gets every tool
+    assert router.classify("yes", "chat-2") is None
+
+
+def test_used_groups_carry_over_to_the_next_turn(router):
+    router.route("Tell me about scenario 12", "chat-1")
+    router.record_tool_use("chat-1", ["get_scenario"])
+    router.record_tool_use("chat-1", ["list_panels"])
+
+    assert router.classify("Add a margin rule", "chat-1") == {"rule", "panel", "scenario"}
+    # A follow-up keeps the groups used during the turn as well
+    assert router.classify("ok", "chat-1") == {"scenario", "panel"}
+
+
+def test_route_records_decisions(router):
+    assert router.route("Hello!") is TOOL_SETS[FULL_GROUPS]
+    assert not router.route("What is price elasticity?").names
+    router.route("List active scenarios")
+
+    stats = router.stats()
+    assert stats["decisions"] == {"subset": 1, "no_tools": 1, "follow_up": 0, "fallback": 1}
+    assert stats["routed_rate"] == pytest.approx(2 / 3)
+
+
+def test_tracked_chats_are_bounded():
+    router = ToolRouter(max_tracked_chats=2)
+    for chat_id in ("a", "b", "c"):
+        router.route("List active scenarios", chat_id)
+    assert list(router._chats) == ["b", "c"]
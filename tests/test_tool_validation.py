@@ -0,0 +1,65 @@
+import pytest
+
+from api_tools import ALL_TOOLS, BULK_RULE_LIMIT
+from tool_validation import ToolArgumentValidator
+
+
+@pytest.fixture
+def validator():
+    return ToolArgumentValidator(ALL_TOOLS)
+
+
+def fields(errors):
+    return [error["field"] for error in errors]
+
+
+def test_valid_arguments(validator):
+    args = {"panel_id": 12, "rules": [{"rule_desc": "Margin", "min_margin": 0.2, "target_margin": 0.3, "max_margin": 0.4}]}
+    assert validator.validate("create_margin_rule", args) == []
+
+
+def test_required_and_type(validator):
+    assert fields(validator.validate("create_margin_rule", {"rules": [{"rule_desc": "x"}]})) == ["panel_id"]
+    errors = validator.validate("get_scenario", {"scenario_id": "abc"})
+    assert errors == [{"field": "scenario_id", "error": "must be an integer (got str)"}]
+
+
+def test_range_and_order(validator):
+    args = {"panel_id": 1, "rules": [{"rule_desc": "x", "min_margin": 0.5, "target_margin": 1.5, "max_margin": 0.2}]}
+    errors = validator.validate("create_margin_rule", args)
+    assert {"field": "rules[0].target_margin", "error": "must be <= 1 (got 1.5)"} in errors
+    assert "rules[0].min_margin" in fields(errors)
+
+
+def test_max_length_and_enum(validator):
+    args = {"panel_id": 1, "rules": [{"rule_desc": "x" * 151, "snap_price_point": "sideways"}]}
+    assert fields(validator.validate("create_margin_rule", args)) == ["rules[0].rule_desc", "rules[0].snap_price_point"]
+    assert fields(validator.validate("delete_rule", {"rule_id": 3, "rule_type": "bogus"})) == ["rule_type"]
+
+
+def test_item_counts(validator):
+    rule = {"rule_desc": "x"}
+    assert fields(validator.validate("create_margin_rule", {"panel_id": 1, "rules": []})) == ["rules"]
+    assert fields(validator.validate("create_margin_rule", {"panel_id": 1, "rules": [rule, rule]})) == ["rules"]
+    errors = validator.validate("create_rules_bulk", {"panel_id": 1, "rules": [rule] * (BULK_RULE_LIMIT + 1)})
+    assert "rules" in fields(errors)
+
+
+def test_unknown_tool_and_stats(validator):
+    assert validator.validate("no_such_tool", {"anything": 1}) == []
+    validator.validate("get_scenario", {"scenario_id": 1})
+    validator.validate("get_scenario", {"scenario_id": "x"})
+    stats = validator.stats()
+    assert stats["checked"] == 2
+    assert stats["rejected_by_tool"] == {"get_scenario": 1}
+
+
+def test_bulk_limit_asks_to_split_not_to_send_single_rules(validator):
+    errors = validator.validate("create_rules_bulk", {"rules": [{"rule_type": "cpi"}] * (BULK_RULE_LIMIT + 1)})
+    assert errors == [{
+        "field": "rules",
+        "error": f"must contain at most {BULK_RULE_LIMIT} item(s) (got {BULK_RULE_LIMIT + 1}); split into calls of at most {BULK_RULE_LIMIT} rules",
+    }]
+
+    errors = validator.validate("create_margin_rule", {"panel_id": 1, "rules": [{"rule_desc": "x"}] * 2})
+    assert errors[0]["error"].endswith("; send one request per rule")
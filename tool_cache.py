@@ -0,0 +1,239 @@
+"""
+Read-Through Cache and Request Coalescing for Scenario API Tool Calls
+
+The model often repeats the same lookups a few turns later (the scenario list,
+a panel's details, a panel's rules). This module caches the read-only tools'
+results with per-tool TTLs, keyed by tenant, tool name and normalized
+arguments. Entries live in a cache_backends backend: per-process memory by
+default, or Redis to share them across workers.
+
+Every entry carries invalidation tags, and write tools drop the tags they
+affect:
+
+- scenario-level:    "scenarios" (scenario lists), "scenario:<id>"
+- panel-level:       "panels" (panel lists), "panel" (all panel details), "panel:<id>"
+- panel-rules-level: "rules" (all rule lists), "rules:<panel_id>"
+
+SingleFlight coalesces concurrent identical reads (e.g. many analysts opening
+the same scenario at once): the first caller performs the upstream request and
+concurrent callers with the same key share its result.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from cache_backends import CacheBackend, MemoryCacheBackend
+
+# Default TTL in seconds per cacheable (read-only) tool
+DEFAULT_TOOL_TTLS = {
+    "list_scenarios": 60,
+    "get_scenario": 120,
+    "list_panels": 60,
+    "get_panel": 120,
+    "list_panel_rules": 60,
+}
+
+RULE_CREATE_TOOLS = {
+    "create_cpi_rule",
+    "create_margin_rule",
+    "create_step_rule",
+    "create_price_rule",
+    "create_cost_change_rule",
+}
+
+
+def _tag_id(value) -> str:
+    # Gemini sends integers as floats (12.0); tags must match however the id was sent
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def cache_tags(tool_name: str, tool_args: dict) -> List[str]:
+    """
+    Invalidation tags of a cached read
+    """
+    if tool_name == "list_scenarios":
+        return ["scenarios"]
+    if tool_name == "get_scenario":
+        return [f"scenario:{_tag_id(tool_args.get('scenario_id'))}"]
+    if tool_name == "list_panels":
+        return ["panels"]
+    if tool_name == "get_panel":
+        return ["panel", f"panel:{_tag_id(tool_args.get('panel_id'))}"]
+    if tool_name == "list_panel_rules":
+        return ["rules", f"rules:{_tag_id(tool_args.get('panel_id'))}"]
+    return []
+
+
+def invalidation_tags(tool_name: str, tool_args: dict) -> List[str]:
+    """
+    Tags a write tool makes stale
+    """
+    panel_id = _tag_id(tool_args.get("panel_id"))
+    if tool_name == "create_scenario":
+        return ["scenarios"]
+    if tool_name == "create_panel":
+        # Panel lists are filtered by scenario name, which the write doesn't carry
+        return ["panels"]
+    if tool_name == "update_panel":
+        return ["panels", f"panel:{panel_id}"]
+    if tool_name == "delete_panel":
+        return ["panels", f"panel:{panel_id}", f"rules:{panel_id}"]
+    if tool_name in RULE_CREATE_TOOLS:
+        # Panel lists can be filtered by rule type and panel details may summarize rules
+        return ["panels", f"panel:{panel_id}", f"rules:{panel_id}"]
+    if tool_name == "delete_rule":
+        # The owning panel is unknown, so every rule list and panel is stale
+        return ["panels", "panel", "rules"]
+    return []
+
+
+def normalize_args(tool_args: dict) -> str:
+    """
+    Canonical form of tool arguments, so {"a": 1, "b": 2} and {"b": 2, "a": 1}
+    share an entry. Gemini sends integers as floats (e.g. 12.0), so integral
+    floats are folded to ints.
+    """
+    def normalize(value):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        return value
+
+    return json.dumps(normalize(tool_args), sort_keys=True, separators=(",", ":"))
+
+
+def tool_call_key(tenant: str, tool_name: str, tool_args: dict) -> tuple:
+    return (tenant, tool_name, normalize_args(tool_args))
+
+
+def cache_key(tenant: str, tool_name: str, tool_args: dict) -> str:
+    """
+    Backend key of a tool result; arguments are hashed to keep keys short
+    """
+    digest = hashlib.sha256(normalize_args(tool_args).encode("utf-8")).hexdigest()[:32]
+    return f"tool:{tenant}:{tool_name}:{digest}"
+
+
+class ToolResultCache:
+    """
+    TTL cache of successful read-only tool results with tag invalidation
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttls: Optional[Dict[str, float]] = None,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.ttls = dict(DEFAULT_TOOL_TTLS if ttls is None else ttls)
+        self.backend = backend or MemoryCacheBackend(max_entries=max_entries)
+
+        # Bumped by every invalidation, so reads that started before a write don't store stale results.
+        # Per process: with a shared backend, a write on another worker can still race a read here.
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return self.ttls.get(tool_name, 0) > 0
+
+    async def get(self, tenant: str, tool_name: str, tool_args: dict) -> Optional[dict]:
+        result = await self.backend.get(cache_key(tenant, tool_name, tool_args))
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    async def set(self, tenant: str, tool_name: str, tool_args: dict, result: dict, generation: Optional[int] = None):
+        """
+        Store a result. When generation is given (read from self.generation before
+        the upstream request started) and an invalidation happened since, the
+        result may predate a write and is not stored.
+        """
+        if not self.is_cacheable(tool_name):
+            return
+        if generation is not None and generation != self.generation:
+            return
+
+        tags = [f"{tenant}|{tag}" for tag in cache_tags(tool_name, tool_args)]
+        await self.backend.set(cache_key(tenant, tool_name, tool_args), result, self.ttls[tool_name], tags)
+
+    async def invalidate_for_write(self, tenant: str, tool_name: str, tool_args: dict) -> int:
+        """
+        Drop every entry made stale by a write tool call. Returns the number removed.
+        """
+        self.generation += 1
+        tags = [f"{tenant}|{tag}" for tag in invalidation_tags(tool_name, tool_args)]
+        removed = await self.backend.invalidate_tags(tags) if tags else 0
+        self.invalidations += removed
+        return removed
+
+    async def clear(self):
+        await self.backend.clear()
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.backend.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one in-flight call.
+
+    The call runs in its own task, so a caller being cancelled (e.g. a client
+    disconnect) doesn't cancel it for the other waiters. Results and errors are
+    delivered to every waiter and forgotten as soon as the call finishes;
+    nothing is cached.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,141 @@
+"""
+Table-Driven Scenario API Dispatch
+
+Each tool maps to one Scenario API endpoint (TOOL_ROUTES in api_tools.py).
+At import, every route is compiled from its path template and the tool's
+parameter schema:
+
+- path params:  the {fields} of the path template
+- query params: for GET and DELETE, the remaining declared parameters
+                (booleans are sent lowercase, e.g. active=true)
+- JSON body:    for POST, all arguments; for PATCH, all but the path params
+
+so dispatching a tool call is a dict lookup plus building one request, with
+no per-tool branching.
+
+Run it directly to benchmark request building for every tool:
+
+    python tool_dispatch.py
+"""
+
+import re
+from typing import Dict, NamedTuple, Optional
+
+from api_tools import ALL_TOOLS, TOOL_ROUTES
+
+PATH_PARAM_PATTERN = re.compile(r"{(\w+)}")
+BODY_METHODS = {"POST", "PATCH"}
+
+# Tools executed in-process on top of other tools, without a route of their own
+LOCAL_TOOLS = {"create_rules_bulk"}
+
+# Tool arguments handled in-process and never sent upstream
+LOCAL_PARAMS = {"all_pages"}
+
+
+class ToolRequest(NamedTuple):
+    method: str
+    path: str
+    params: Optional[dict]
+    body: Optional[dict]
+
+
+def _path_value(value) -> str:
+    # Gemini may send integer ids as floats (e.g. 3760.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class ToolRoute:
+    """
+    A compiled route: turns tool arguments into a ToolRequest
+    """
+
+    __slots__ = ("name", "method", "path", "path_params", "query_params", "bool_params", "sends_body")
+
+    def __init__(self, name: str, method: str, path: str, parameters: dict):
+        properties = parameters.get("properties", {})
+
+        self.name = name
+        self.method = method
+        self.path = path
+        self.path_params = tuple(PATH_PARAM_PATTERN.findall(path))
+        missing = set(self.path_params) - set(properties)
+        if missing:
+            raise ValueError(f"{name}: path params not in tool parameters {sorted(missing)}")
+
+        self.sends_body = method in BODY_METHODS
+        self.query_params = () if self.sends_body else tuple(
+            param for param in properties if param not in self.path_params and param not in LOCAL_PARAMS
+        )
+        self.bool_params = frozenset(
+            param for param in self.query_params if properties[param].get("type") == "boolean"
+        )
+
+    def build(self, tool_args: dict) -> ToolRequest:
+        path = self.path
+        if self.path_params:
+            path = path.format(**{param: _path_value(tool_args.get(param)) for param in self.path_params})
+
+        params = None
+        if self.query_params:
+            params = {}
+            for param in self.query_params:
+                if param in tool_args:
+                    value = tool_args[param]
+                    params[param] = str(value).lower() if param in self.bool_params else value
+
+        body = None
+        if self.sends_body:
+            if self.method == "PATCH" and self.path_params:
+                body = {k: v for k, v in tool_args.items() if k not in self.path_params}
+            else:
+                body = tool_args
+
+        return ToolRequest(self.method, path, params, body)
+
+
+def _compile_routes() -> Dict[str, ToolRoute]:
+    schemas = {tool["name"]: tool["parameters"] for tool in ALL_TOOLS}
+    missing = set(schemas) - set(TOOL_ROUTES) - LOCAL_TOOLS
+    if missing:
+        raise ValueError(f"Tools without a route: {sorted(missing)}")
+    return {
+        name: ToolRoute(name, method, path, schemas[name])
+        for name, (method, path) in TOOL_ROUTES.items()
+    }
+
+
+# Compiled routes by tool name, built once at import
+TOOL_DISPATCH = _compile_routes()
+
+
+def _benchmark(iterations: int = 20000):
+    import timeit
+
+    sample_args = {
+        "list_scenarios": {"active": True, "scenario_type": "Baseline", "page": 0, "size": 20},
+        "get_scenario": {"scenario_id": 123},
+        "create_scenario": {"scenario_name": "Summer Sale 2025", "scenario_type": "Promotional"},
+        "list_panels": {"scenario": "Summer Sale", "department": "GROCERY", "zone_group": "Standard", "valid": True, "page": 0, "size": 20},
+        "get_panel": {"panel_id": 3760.0},
+        "create_panel": {"scenario_id": 123, "product_node": "GROCERY", "location_node": "Standard"},
+        "update_panel": {"panel_id": 3760, "panel_name": "Produce Northeast"},
+        "delete_panel": {"panel_id": 3760},
+        "list_panel_rules": {"panel_id": 3760, "page": 0, "size": 20},
+        "create_cpi_rule": {"panel_id": 3760, "rules": [{"rule_desc": "CPI vs Walmart"}]},
+        "delete_rule": {"rule_id": 991, "rule_type": "cpi"},
+    }
+
+    total = 0.0
+    for name, tool_args in sample_args.items():
+        route = TOOL_DISPATCH[name]
+        seconds = timeit.timeit(lambda: TOOL_DISPATCH[name].build(tool_args), number=iterations)
+        total += seconds
+        print(f"{name:24s} {route.build(tool_args).method:6s} {seconds / iterations * 1e6:6.2f} us/call")
+    print(f"{'average':31s} {total / len(sample_args) / iterations * 1e6:6.2f} us/call")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,181 @@
+"""
+Precompiled Gemini Tool Payload
+
+The function declarations in api_tools.py never change at runtime, yet they
+make up most of every Gemini request body. This module builds the
+declaration block once at import:
+
+- validates it against the schema subset Gemini accepts,
+- fingerprints it with a stable hash,
+- keeps it as pre-encoded JSON bytes,
+
+so each request only serializes its dynamic part (the conversation contents)
+and splices in the cached bytes.
+
+Run it directly for a serialization micro-benchmark:
+
+    python tool_payload.py
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+from api_tools import ALL_TOOLS
+from chat_history import count_tokens, encoding_loaded
+
+# OpenAPI schema subset accepted in Gemini function declarations
+ALLOWED_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+ALLOWED_SCHEMA_TYPES = {"string", "integer", "number", "boolean", "array", "object"}
+FUNCTION_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_.-]{0,63}$")
+
+
+def _validate_schema(schema: dict, path: str):
+    unknown = set(schema) - ALLOWED_SCHEMA_KEYS
+    if unknown:
+        raise ValueError(f"{path}: unsupported schema keys {sorted(unknown)}")
+
+    schema_type = schema.get("type")
+    if schema_type not in ALLOWED_SCHEMA_TYPES:
+        raise ValueError(f"{path}: unsupported type {schema_type!r}")
+
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        for name, prop in properties.items():
+            _validate_schema(prop, f"{path}.{name}")
+        missing = set(schema.get("required", [])) - set(properties)
+        if missing:
+            raise ValueError(f"{path}: required fields not in properties {sorted(missing)}")
+    elif schema_type == "array":
+        if "items" not in schema:
+            raise ValueError(f"{path}: array schema without items")
+        _validate_schema(schema["items"], f"{path}[]")
+
+
+def validate_function_declaration(declaration: dict):
+    """
+    Raise ValueError if a function declaration uses anything Gemini would reject
+    """
+    name = declaration.get("name", "")
+    if not FUNCTION_NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid function name {name!r}")
+    if not declaration.get("description"):
+        raise ValueError(f"{name}: missing description")
+    if "parameters" in declaration:
+        if declaration["parameters"].get("type") != "object":
+            raise ValueError(f"{name}: parameters must be an object schema")
+        _validate_schema(declaration["parameters"], name)
+
+
+def encode_json(value) -> bytes:
+    """
+    Compact UTF-8 JSON, matching how httpx encodes json= request bodies
+    """
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+class ToolSet:
+    """
+    A validated, fingerprinted and pre-encoded Gemini "tools" block
+    """
+
+    def __init__(self, tools: List[dict]):
+        declarations = [
+            {
+                "name": tool["name"],
+                "description": tool["description"],
+                "parameters": tool["parameters"]
+            }
+            for tool in tools
+        ]
+        for declaration in declarations:
+            validate_function_declaration(declaration)
+
+        self.names = frozenset(declaration["name"] for declaration in declarations)
+        self.config = [{"function_declarations": declarations}]
+        self.json = encode_json(self.config)
+        self.fingerprint = hashlib.sha256(self.json).hexdigest()
+        self._tokens = None
+
+    @property
+    def tokens(self) -> int:
+        """
+        Approximate token count of the declarations, counted once the
+        tokenizer is loaded (until then, the cheap length estimate)
+        """
+        if self._tokens is None:
+            tokens = count_tokens(self.json.decode("utf-8"))
+            if not encoding_loaded():
+                return tokens
+            self._tokens = tokens
+        return self._tokens
+
+
+@lru_cache(maxsize=8)
+def encode_system_instruction(system_prompt: str) -> bytes:
+    """
+    Pre-encoded system_instruction block; prompts are module constants, so this
+    is computed once per prompt
+    """
+    return encode_json({"parts": [{"text": system_prompt}]})
+
+
+def encode_request(payload: dict, static_fields: Dict[str, bytes]) -> bytes:
+    """
+    Serialize the dynamic payload and splice in already-encoded static fields
+    """
+    dynamic = encode_json(payload)
+    if not static_fields:
+        return dynamic
+
+    static = b",".join(encode_json(key) + b":" + value for key, value in static_fields.items())
+    if dynamic == b"{}":
+        return b"{" + static + b"}"
+    return b"{" + static + b"," + dynamic[1:]
+
+
+# All tools, built once at import
+ALL_TOOL_SET = ToolSet(ALL_TOOLS)
+
+
+def _benchmark(iterations: int = 2000):
+    import timeit
+    from system_prompts import PRICING_ANALYST_PROMPT
+
+    contents = [
+        {"role": "user" if i % 2 == 0 else "model", "parts": [{"text": f"Message {i} about panel rules " * 20}]}
+        for i in range(10)
+    ]
+
+    def before():
+        tools_config = [{
+            "function_declarations": [
+                {"name": tool["name"], "description": tool["description"], "parameters": tool["parameters"]}
+                for tool in ALL_TOOLS
+            ]
+        }]
+        return encode_json({
+            "contents": contents,
+            "tools": tools_config,
+            "system_instruction": {"parts": [{"text": PRICING_ANALYST_PROMPT}]},
+        })
+
+    def after():
+        return encode_request({"contents": contents}, {
+            "tools": ALL_TOOL_SET.json,
+            "system_instruction": encode_system_instruction(PRICING_ANALYST_PROMPT),
+        })
+
+    assert json.loads(before()) == json.loads(after())
+
+    print(f"Tool declarations: {len(ALL_TOOL_SET.names)} tools, {len(ALL_TOOL_SET.json)} bytes, fingerprint {ALL_TOOL_SET.fingerprint[:16]}")
+    print(f"Request body: {len(after())} bytes")
+    for label, fn in (("before (rebuild + full dumps)", before), ("after (pre-encoded splice)", after)):
+        seconds = timeit.timeit(fn, number=iterations)
+        print(f"{label:32s} {seconds / iterations * 1e6:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,174 @@
+"""
+Compact Tool Result Projection
+
+Scenario API responses are fed back to Gemini as functionResponse parts, and
+every later iteration of the function-calling loop re-sends them as input
+tokens. Panel and rule payloads carry many fields the model never uses, so
+results are projected before they go back:
+
+- per-tool field allowlists for list items (configurable),
+- bookkeeping fields (created/updated/modified by/at) dropped from list items,
+- nulls and empty values dropped,
+- long lists truncated, with a count of what was left out (all_pages results
+  are only shortened to fit the size budget, and their truncated/row_cap
+  fields then report it),
+- optionally, lists of objects encoded as {"columns": [...], "rows": [[...]]},
+- a size budget per function response: lists are shortened, then long
+  strings cut, until the encoded result fits.
+
+Failed tool results are passed through unchanged.
+"""
+
+import re
+from typing import Dict, Iterable, Optional
+
+from tool_payload import encode_json
+
+# Tools returning {"items": [...]} pages; their items get the bookkeeping-field filter
+LIST_TOOLS = {"list_scenarios", "list_panels", "list_panel_rules"}
+
+# Bookkeeping fields, matched case-insensitively with underscores removed
+# (so created_by, CreatedBy and createdBy all match). Bare created, updated,
+# modified and deleted are kept: they may be flags the model needs.
+NOISE_FIELD_PATTERN = re.compile(
+    r"^(created|updated|modified|deleted)(by|at|on|date|datetime|user|time)$"
+    r"|^last(modified|updated)(by|at|on|date|datetime|user|time)?$"
+    r"|^(etag|links)$"
+)
+
+# Long strings are cut to this many characters when the size budget requires it
+MAX_STRING_CHARS = 200
+
+
+def _is_noise_field(key: str) -> bool:
+    return bool(NOISE_FIELD_PATTERN.match(key.replace("_", "").lower()))
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+class ToolResultProjector:
+    """
+    Shrinks successful tool results before they are sent back to Gemini
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 16000,
+        max_list_items: int = 50,
+        columnar: bool = False,
+        item_fields: Optional[Dict[str, Iterable[str]]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_list_items = max_list_items
+        self.columnar = columnar
+        # tool name -> fields kept on list items (all fields when absent)
+        self.item_fields = {tool: frozenset(fields) for tool, fields in (item_fields or {}).items()}
+
+        self.projected = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.over_budget = 0
+
+    def project(self, tool_name: str, result: dict) -> dict:
+        if not isinstance(result, dict) or not result.get("success") or "data" not in result:
+            return result
+
+        raw_size = len(encode_json(result))
+        data = self._compact(result["data"], self.item_fields.get(tool_name), tool_name in LIST_TOOLS)
+
+        # all_pages already capped its rows at ALL_PAGES_MAX_ROWS; only the size budget applies
+        items = data.get("items") if isinstance(data, dict) and "pages_fetched" in data else None
+        list_limit = max(self.max_list_items, len(items)) if isinstance(items, list) else self.max_list_items
+        string_limit = None
+        projected = self._shape(data, list_limit, string_limit)
+        size = len(encode_json(projected))
+
+        # Over budget: halve list lengths, then cut long strings as a last resort
+        while size > self.max_bytes and (list_limit > 1 or string_limit is None):
+            if list_limit > 1:
+                list_limit //= 2
+            else:
+                string_limit = MAX_STRING_CHARS
+            projected = self._shape(data, list_limit, string_limit)
+            size = len(encode_json(projected))
+
+        if isinstance(items, list) and "items_omitted" in projected:
+            shown = len(items) - projected["items_omitted"]
+            projected["returned"] = shown
+            projected["truncated"] = True
+            projected["row_cap"] = shown
+
+        output = {**{k: v for k, v in result.items() if k != "data"}, "data": projected}
+        if size > self.max_bytes:
+            self.over_budget += 1
+            output["note"] = f"Result exceeds the {self.max_bytes} byte budget even when shortened; ask for a narrower query"
+
+        self.projected += 1
+        self.bytes_in += raw_size
+        self.bytes_out += size
+        return output
+
+    def _compact(self, value, fields: Optional[frozenset], drop_noise: bool, in_list: bool = False):
+        """
+        Drop empty values everywhere; filter the fields of list items (their
+        own keys only, not those of objects nested inside them)
+        """
+        if isinstance(value, dict):
+            compact = {}
+            for key, item in value.items():
+                if _is_empty(item):
+                    continue
+                if in_list and ((fields is not None and key not in fields) or (drop_noise and _is_noise_field(key))):
+                    continue
+                item = self._compact(item, None if in_list else fields, drop_noise)
+                if not _is_empty(item):
+                    compact[key] = item
+            return compact
+        if isinstance(value, list):
+            return [self._compact(item, fields, drop_noise, in_list=True) for item in value]
+        return value
+
+    def _shape(self, value, list_limit: int, string_limit: Optional[int]):
+        """
+        Truncate lists (recording how many items were left out), encode lists
+        of objects as columns, and cut long strings
+        """
+        if isinstance(value, dict):
+            shaped = {}
+            for key, item in value.items():
+                if isinstance(item, list) and len(item) > list_limit:
+                    shaped[key] = self._shape(item[:list_limit], list_limit, string_limit)
+                    shaped[f"{key}_omitted"] = len(item) - list_limit
+                else:
+                    shaped[key] = self._shape(item, list_limit, string_limit)
+            return shaped
+        if isinstance(value, list):
+            items = [self._shape(item, list_limit, string_limit) for item in value[:list_limit]]
+            if self.columnar and len(items) > 1 and all(isinstance(item, dict) for item in items):
+                return self._columns(items)
+            return items
+        if string_limit is not None and isinstance(value, str) and len(value) > string_limit:
+            return value[:string_limit] + "..."
+        return value
+
+    @staticmethod
+    def _columns(items: list) -> dict:
+        columns = []
+        seen = set()
+        for item in items:
+            for key in item:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+        return {"columns": columns, "rows": [[item.get(column) for column in columns] for item in items]}
+
+    def stats(self) -> dict:
+        return {
+            "projected": self.projected,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "reduction": 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+            "over_budget": self.over_budget,
+        }
@@ -0,0 +1,283 @@
+"""
+Intent-Based Tool Subsetting
+
+Sending all tool declarations on every Gemini call costs input tokens and
+model decision time, even for questions that need one tool group or none.
+This module is a lightweight, local keyword router: it picks the tool groups
+(scenario, panel, rule) relevant to a user message and the chat's recent tool
+usage, and falls back to the full tool set whenever it is unsure.
+
+Run it directly to replay a set of prompts and compare declared tool sizes:
+
+    python tool_router.py [messages.jsonl]
+
+The optional file has one JSON object per line with a "content" field
+(e.g. an export of user messages from the messages collection).
+"""
+
+import json
+import re
+import sys
+from collections import OrderedDict
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from api_tools import SCENARIO_TOOLS, PANEL_TOOLS, RULE_TOOLS
+from tool_payload import ToolSet
+
+TOOL_GROUPS = {
+    "scenario": SCENARIO_TOOLS,
+    "panel": PANEL_TOOLS,
+    "rule": RULE_TOOLS,
+}
+
+TOOL_GROUP_BY_NAME = {
+    tool["name"]: group
+    for group, tools in TOOL_GROUPS.items()
+    for tool in tools
+}
+
+# Groups whose tools the model needs to validate prerequisites (not transitive):
+# panel creation checks the scenario exists, rule creation checks the panel
+GROUP_DEPENDENCIES = {
+    "scenario": set(),
+    "panel": {"scenario"},
+    "rule": {"panel"},
+}
+
+GROUP_KEYWORDS = {
+    "scenario": re.compile(r"\bscenarios?\b|\bbaseline\b|\bpromotional\b"),
+    "panel": re.compile(
+        r"\bpanels?\b|\bdepartments?\b|\bzones?\b|\bzone groups?\b|\bcategor(?:y|ies)\b"
+        r"|\bhierarch(?:y|ies)\b|\bproduct groups?\b|\bmarket groups?\b|\bhard rule panel\b"
+    ),
+    "rule": re.compile(
+        r"\brules?\b|\bcpi\b|\bmargins?\b|\bstep\b|\bcost[- ]change\b|\bcompetitors?\b|\bprice rules?\b"
+    ),
+}
+
+ACTION_PATTERN = re.compile(
+    r"\b(list|show|get|fetch|find|look ?up|search|display|create|add|make|set ?up|new|update|rename|"
+    r"change|edit|modify|delete|remove|deactivate|what are the|how many)\b"
+)
+EDUCATIONAL_PATTERN = re.compile(
+    r"\b(explain|what is|what's|what are|how does|how do|why|difference|meaning|define|definition|"
+    r"when should|which rule type|example|formula|calculate)\b"
+)
+# References to the user's own data ("my scenarios", "the rules on the Produce
+# panel"): a question phrased conceptually still needs the tools to answer these
+DATA_REFERENCE_PATTERN = re.compile(
+    r"\b(my|our|mine|this|that|these|those|current|existing|active|on the|in the|for the|of the)\b"
+)
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(yes|yeah|yep|sure|ok|okay|proceed|confirm(ed)?|go ahead|do it|please do|correct|"
+    r"that's right|no|nope|cancel|next( page)?|more|continue)\b[\s.!]*$"
+)
+
+
+def _with_dependencies(groups: Iterable[str]) -> FrozenSet[str]:
+    expanded = set(groups)
+    for group in groups:
+        expanded |= GROUP_DEPENDENCIES[group]
+    return frozenset(expanded)
+
+
+def _build_tool_sets() -> Dict[FrozenSet[str], ToolSet]:
+    """
+    Pre-build a ToolSet for every combination of groups, so routing never
+    serializes declarations at request time
+    """
+    names = list(TOOL_GROUPS)
+    tool_sets = {}
+    for size in range(len(names) + 1):
+        for groups in combinations(names, size):
+            tool_sets[frozenset(groups)] = ToolSet([tool for group in groups for tool in TOOL_GROUPS[group]])
+    return tool_sets
+
+
+TOOL_SETS = _build_tool_sets()
+FULL_GROUPS = frozenset(TOOL_GROUPS)
+
+
+class _ChatRouting:
+    __slots__ = ("declared", "used", "new_turn")
+
+    def __init__(self):
+        # Groups declared for the chat's latest turn, plus any used in it (with dependencies)
+        self.declared: FrozenSet[str] = frozenset()
+        # Groups used across every iteration of the chat's most recent tool-calling turn
+        self.used: FrozenSet[str] = frozenset()
+        self.new_turn = True
+
+
+class ToolRouter:
+    """
+    Chooses the tool groups to declare for a chat turn and counts its decisions
+    """
+
+    def __init__(self, max_tracked_chats: int = 10000):
+        self._chats: "OrderedDict[str, _ChatRouting]" = OrderedDict()
+        self.max_tracked_chats = max_tracked_chats
+
+        self.decisions = {"subset": 0, "no_tools": 0, "follow_up": 0, "fallback": 0}
+        self.declared_tools_total = 0
+
+    def classify(self, message: str, chat_id: Optional[str] = None) -> Optional[FrozenSet[str]]:
+        """
+        Return the tool groups for a user message, or None when unsure
+        """
+        text = message.lower()
+        routing = self._chats.get(chat_id) if chat_id else None
+
+        # Confirmations and short follow-ups ("yes" to a proposed write) keep
+        # every tool the previous turn had; without one, be safe and declare all
+        if FOLLOW_UP_PATTERN.match(text):
+            return routing.declared if routing and routing.declared else None
+
+        matched = {group for group, pattern in GROUP_KEYWORDS.items() if pattern.search(text)}
+        if not matched:
+            has_action = (
+                bool(ACTION_PATTERN.search(text))
+                or bool(DATA_REFERENCE_PATTERN.search(text))
+                or bool(re.search(r"\d", text))
+            )
+            # Only a conceptual question naming no scenario, panel or rule
+            # ("What is price elasticity?") goes without tools; otherwise be safe
+            if EDUCATIONAL_PATTERN.search(text) and not has_action:
+                return frozenset()
+            return None
+
+        # Anything naming scenarios, panels or rules may need a lookup, even when
+        # phrased as a concept question ("What is the target margin of panel Produce?")
+        groups = _with_dependencies(matched)
+        if routing:
+            groups |= _with_dependencies(routing.used)
+        return frozenset(groups)
+
+    def route(self, message: str, chat_id: Optional[str] = None) -> ToolSet:
+        """
+        Pick the ToolSet to declare for this turn and record the decision
+        """
+        text = message.lower()
+        groups = self.classify(message, chat_id)
+
+        if groups is None or groups == FULL_GROUPS:
+            self.decisions["fallback"] += 1
+            groups = FULL_GROUPS
+        elif FOLLOW_UP_PATTERN.match(text):
+            self.decisions["follow_up"] += 1
+        elif not groups:
+            self.decisions["no_tools"] += 1
+        else:
+            self.decisions["subset"] += 1
+
+        if chat_id:
+            routing = self._track(chat_id)
+            routing.declared = groups
+            routing.new_turn = True
+
+        tool_set = TOOL_SETS[groups]
+        self.declared_tools_total += len(tool_set.names)
+        return tool_set
+
+    def _track(self, chat_id: str) -> _ChatRouting:
+        routing = self._chats.get(chat_id)
+        if routing is None:
+            routing = self._chats[chat_id] = _ChatRouting()
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_tracked_chats:
+            self._chats.popitem(last=False)
+        return routing
+
+    def record_tool_use(self, chat_id: Optional[str], tool_names: Iterable[str]):
+        """
+        Remember which groups a chat just used, for routing its follow-up turns
+        """
+        if not chat_id:
+            return
+        groups = frozenset(TOOL_GROUP_BY_NAME[name] for name in tool_names if name in TOOL_GROUP_BY_NAME)
+        if not groups:
+            return
+        routing = self._track(chat_id)
+        # Accumulate over the iterations of one turn; a new turn starts afresh
+        routing.used = groups if routing.new_turn else routing.used | groups
+        routing.new_turn = False
+        routing.declared |= _with_dependencies(groups)
+
+    def stats(self) -> dict:
+        total = sum(self.decisions.values())
+        routed = total - self.decisions["fallback"]
+        return {
+            "decisions": dict(self.decisions),
+            "total": total,
+            # Share of turns declared a subset (or no tools) instead of the full set
+            "routed_rate": routed / total if total else 0.0,
+            "avg_declared_tools": self.declared_tools_total / total if total else 0.0,
+        }
+
+
+# Built-in replay set covering the prompt styles seen in pricing sessions
+SAMPLE_PROMPTS = [
+    "What scenarios exist?",
+    "List active scenarios",
+    "Tell me about scenario 123",
+    "Create a new scenario called Summer Sale 2025",
+    "Show me panels for Summer Sale in GROCERY and Standard zone group",
+    "Tell me about panel 3760",
+    "Rename panel 3760 to Produce Northeast",
+    "Show rules for panel 3760",
+    "Create a CPI rule for panel 3760 against Walmart",
+    "Add a margin rule with 30% target to panel 12",
+    "Delete rule 991",
+    "What rule types are available?",
+    "Explain CPI rules",
+    "What's the difference between hard and soft rules?",
+    "How do I calculate margin?",
+    "What is price elasticity?",
+    "yes, proceed",
+    "next page",
+    "Hello!",
+    "Can you help me with pricing?",
+    "Which rule type should I use for price stability?",
+]
+
+
+def replay(prompts: Iterable[str]) -> dict:
+    """
+    Route every prompt as its own chat and compare declared tool sizes with
+    always sending the full tool set
+    """
+    from chat_history import count_tokens, load_encoding
+
+    load_encoding()
+
+    router = ToolRouter()
+    full = TOOL_SETS[FULL_GROUPS]
+    full_tokens = count_tokens(full.json.decode("utf-8"))
+
+    declared_bytes = 0
+    declared_tokens = 0
+    count = 0
+    for prompt in prompts:
+        tool_set = router.route(prompt)
+        declared_bytes += len(tool_set.json) if tool_set.names else 0
+        declared_tokens += count_tokens(tool_set.json.decode("utf-8")) if tool_set.names else 0
+        count += 1
+
+    return {
+        **router.stats(),
+        "prompts": count,
+        "avg_tool_bytes": declared_bytes / count if count else 0,
+        "full_tool_bytes": len(full.json),
+        "avg_tool_tokens": declared_tokens / count if count else 0,
+        "full_tool_tokens": full_tokens,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            prompts = [json.loads(line)["content"] for line in f if line.strip()]
+    else:
+        prompts = SAMPLE_PROMPTS
+    print(json.dumps(replay(prompts), indent=2))
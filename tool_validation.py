@@ -0,0 +1,318 @@
+"""
+Local Tool Argument Validation
+
+Bad arguments from the model (a missing required field, a 200 character
+rule_desc, min_cpi above target_cpi) otherwise cost a Scenario API round trip
+and another Gemini iteration just to learn the request was invalid. This
+module checks tool arguments before they are sent:
+
+- the tool's JSON schema from api_tools.py (types, required fields, nested
+  objects and arrays), and
+- the constraints that tool descriptions only state in prose: lengths,
+  numeric ranges, enum values, min <= target <= max orderings and
+  conditionally required fields.
+
+Both are compiled into plain Python checks once at import. Problems are
+returned as a list of {"field", "error"} dicts the model can act on.
+"""
+
+from typing import Callable, Dict, List, Optional
+
+from api_tools import BULK_RULE_TYPES, BULK_RULE_LIMIT
+
+# Constraints on the fields of a rule object (the items of "rules" in the rule tools)
+RULE_FIELD_CONSTRAINTS = {
+    "rule_desc": {"max_length": 150},
+    "days_until_alert": {"minimum": 0},
+    "half_life_period": {"minimum": 0},
+    "price_type": {"enum": {"regular", "promotional", "blended"}},
+    "snap_price_point": {"enum": {"up", "down"}},
+    "half_life_unit": {"enum": {"day", "days", "week", "weeks"}},
+    "target_margin": {"minimum": 0, "maximum": 1},
+    "min_margin": {"minimum": 0, "maximum": 1},
+    "max_margin": {"minimum": 0, "maximum": 1},
+    "max_factor": {"minimum": 0, "maximum": 999999.999999},
+    "min_factor": {"minimum": 0, "maximum": 999999.999999},
+    "add_min": {"minimum": 0, "maximum": 999999.999999},
+    "add_max": {"minimum": 0, "maximum": 999999.999999},
+    "future_window_days": {"minimum": 0, "maximum": 10000},
+    "cost_change_up": {"minimum": 0, "maximum": 100},
+    "cost_change_down": {"minimum": 0, "maximum": 100},
+    "margin_change_up": {"minimum": 0, "maximum": 10000},
+    "margin_change_down": {"minimum": 0, "maximum": 10000},
+}
+
+# (lower, upper) field pairs of a rule object; checked when both are present and numeric
+RULE_FIELD_ORDER = [
+    ("min_cpi", "target_cpi"),
+    ("target_cpi", "max_cpi"),
+    ("min_cpi", "max_cpi"),
+    ("min_add", "max_add"),
+    ("min_margin", "target_margin"),
+    ("target_margin", "max_margin"),
+    ("min_margin", "max_margin"),
+    ("min_factor", "max_factor"),
+    ("add_min", "add_max"),
+    # Price rule bounds are strings that may be variables like [EDLP]
+    ("min_amount", "target"),
+    ("target", "max_amount"),
+    ("min_amount", "max_amount"),
+]
+
+# (trigger field, trigger value, fields then required) for a rule object
+RULE_CONDITIONAL_REQUIRED = [
+    ("intel_rule", True, ["half_life_period", "half_life_unit"]),
+]
+
+# Top-level constraints per tool
+TOOL_FIELD_CONSTRAINTS = {
+    "delete_rule": {"rule_type": {"enum": {"cpi", "margin", "step", "price", "cost-change"}}},
+    "create_cpi_rule": {"rules": {"min_items": 1}},
+    # These tools accept exactly ONE rule per request
+    "create_margin_rule": {"rules": {"min_items": 1, "max_items": 1, "max_items_hint": "send one request per rule"}},
+    "create_step_rule": {"rules": {"min_items": 1, "max_items": 1, "max_items_hint": "send one request per rule"}},
+    "create_price_rule": {"rules": {"min_items": 1, "max_items": 1, "max_items_hint": "send one request per rule"}},
+    "create_cost_change_rule": {"rules": {"min_items": 1, "max_items": 1, "max_items_hint": "send one request per rule"}},
+    "create_rules_bulk": {"rules": {
+        "min_items": 1,
+        "max_items": BULK_RULE_LIMIT,
+        "max_items_hint": f"split into calls of at most {BULK_RULE_LIMIT} rules",
+    }},
+}
+
+RULE_TOOL_NAMES = set(BULK_RULE_TYPES.values())
+
+Check = Callable[[object, str, List[dict]], None]
+
+
+def _is_integer(value) -> bool:
+    # Gemini may send integers as floats (e.g. 12.0)
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, float) and value.is_integer())
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "integer": _is_integer,
+    "number": _is_number,
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+}
+
+
+def _as_number(value) -> Optional[float]:
+    if _is_number(value):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _compile_constraints(constraints: dict) -> List[Check]:
+    checks: List[Check] = []
+
+    if "max_length" in constraints:
+        max_length = constraints["max_length"]
+
+        def check_max_length(value, path, errors):
+            if isinstance(value, str) and len(value) > max_length:
+                errors.append({"field": path, "error": f"must be at most {max_length} characters (got {len(value)})"})
+        checks.append(check_max_length)
+
+    if "minimum" in constraints or "maximum" in constraints:
+        minimum = constraints.get("minimum")
+        maximum = constraints.get("maximum")
+
+        def check_range(value, path, errors):
+            if not _is_number(value):
+                return
+            if minimum is not None and value < minimum:
+                errors.append({"field": path, "error": f"must be >= {minimum} (got {value})"})
+            elif maximum is not None and value > maximum:
+                errors.append({"field": path, "error": f"must be <= {maximum} (got {value})"})
+        checks.append(check_range)
+
+    if "enum" in constraints:
+        allowed = constraints["enum"]
+        allowed_text = ", ".join(repr(option) for option in sorted(allowed))
+
+        def check_enum(value, path, errors):
+            if isinstance(value, str) and value.lower() not in allowed:
+                errors.append({"field": path, "error": f"must be one of {allowed_text} (got {value!r})"})
+        checks.append(check_enum)
+
+    if "min_items" in constraints or "max_items" in constraints:
+        min_items = constraints.get("min_items")
+        max_items = constraints.get("max_items")
+        # What the model should do instead, appended to the max_items error
+        hint = f"; {constraints['max_items_hint']}" if "max_items_hint" in constraints else ""
+
+        def check_items(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append({"field": path, "error": f"must contain at least {min_items} item(s)"})
+            elif max_items is not None and len(value) > max_items:
+                errors.append({"field": path, "error": f"must contain at most {max_items} item(s) (got {len(value)}){hint}"})
+        checks.append(check_items)
+
+    return checks
+
+
+def _check_rule_fields(rule, path, errors):
+    """
+    Cross-field checks on one rule object
+    """
+    if not isinstance(rule, dict):
+        return
+
+    for trigger, trigger_value, fields in RULE_CONDITIONAL_REQUIRED:
+        if rule.get(trigger) == trigger_value:
+            for field in fields:
+                if field not in rule:
+                    errors.append({"field": f"{path}.{field}", "error": f"is required when {trigger} is {str(trigger_value).lower()}"})
+
+    for lower, upper in RULE_FIELD_ORDER:
+        if lower in rule and upper in rule:
+            low = _as_number(rule[lower])
+            high = _as_number(rule[upper])
+            if low is not None and high is not None and low > high:
+                errors.append({"field": f"{path}.{lower}", "error": f"must be <= {upper} ({rule[upper]}), got {rule[lower]}"})
+
+
+def _compile_schema(schema: dict, constraints: Optional[Dict[str, dict]] = None, extra: Optional[Check] = None) -> Check:
+    """
+    Compile a schema (and constraints on its properties) into a single check
+    """
+    schema_type = schema.get("type")
+    is_type = TYPE_CHECKS.get(schema_type, lambda value: True)
+
+    if schema_type == "object":
+        constraints = constraints or {}
+        required = tuple(schema.get("required", ()))
+        properties = {}
+        for name, prop in schema.get("properties", {}).items():
+            prop_checks = _compile_constraints(constraints.get(name, {}))
+            properties[name] = (_compile_schema(prop), prop_checks)
+
+        def check_object(value, path, errors):
+            if not is_type(value):
+                errors.append({"field": path or "arguments", "error": "must be an object"})
+                return
+            for name in required:
+                if value.get(name) is None:
+                    errors.append({"field": f"{path}.{name}" if path else name, "error": "is required"})
+            for name, item in value.items():
+                compiled = properties.get(name)
+                if compiled is None or item is None:
+                    continue
+                field = f"{path}.{name}" if path else name
+                check, prop_checks = compiled
+                before = len(errors)
+                check(item, field, errors)
+                if len(errors) == before:
+                    for prop_check in prop_checks:
+                        prop_check(item, field, errors)
+            if extra is not None:
+                extra(value, path, errors)
+        return check_object
+
+    if schema_type == "array":
+        check_item = _compile_schema(schema.get("items", {}))
+
+        def check_array(value, path, errors):
+            if not is_type(value):
+                errors.append({"field": path, "error": "must be an array"})
+                return
+            for index, item in enumerate(value):
+                check_item(item, f"{path}[{index}]", errors)
+        return check_array
+
+    def check_scalar(value, path, errors):
+        if not is_type(value):
+            errors.append({"field": path, "error": f"must be {'an' if schema_type == 'integer' else 'a'} {schema_type} (got {type(value).__name__})"})
+    return check_scalar
+
+
+def _compile_rule_tool(parameters: dict, constraints: Dict[str, dict]) -> Check:
+    """
+    Rule tools: the "rules" items get the rule field constraints and cross-field checks
+    """
+    rules_schema = parameters["properties"]["rules"]
+    check_rules = _compile_schema(rules_schema["items"], RULE_FIELD_CONSTRAINTS, _check_rule_fields)
+    check_top = _compile_schema(
+        {**parameters, "properties": {k: v for k, v in parameters["properties"].items() if k != "rules"}},
+        constraints,
+    )
+    rules_checks = _compile_constraints(constraints.get("rules", {}))
+
+    def check_rule_tool(value, path, errors):
+        check_top(value, path, errors)
+        rules = value.get("rules") if isinstance(value, dict) else None
+        if rules is None:
+            return
+        if not isinstance(rules, list):
+            errors.append({"field": "rules", "error": "must be an array"})
+            return
+        for rules_check in rules_checks:
+            rules_check(rules, "rules", errors)
+        for index, rule in enumerate(rules):
+            check_rules(rule, f"rules[{index}]", errors)
+    return check_rule_tool
+
+
+def _compile_tool(tool: dict) -> Check:
+    constraints = TOOL_FIELD_CONSTRAINTS.get(tool["name"], {})
+    if tool["name"] in RULE_TOOL_NAMES:
+        return _compile_rule_tool(tool["parameters"], constraints)
+    if tool["name"] == "create_rules_bulk":
+        # Each bulk rule is validated on its own (see bulk_rules.py), so one bad rule doesn't reject the call
+        parameters = tool["parameters"]
+        rules_schema = {**parameters["properties"]["rules"], "items": {"type": "object"}}
+        return _compile_schema({**parameters, "properties": {"rules": rules_schema}}, constraints)
+    return _compile_schema(tool["parameters"], constraints)
+
+
+class ToolArgumentValidator:
+    """
+    Precompiled argument checks for every tool, with rejection counters
+    """
+
+    def __init__(self, tools: List[dict]):
+        self._checks: Dict[str, Check] = {tool["name"]: _compile_tool(tool) for tool in tools}
+
+        self.checked = 0
+        self.rejected: Dict[str, int] = {}
+
+    def validate(self, tool_name: str, tool_args: dict) -> List[dict]:
+        """
+        Return the problems with tool_args (empty if valid or the tool is unknown)
+        """
+        check = self._checks.get(tool_name)
+        if check is None:
+            return []
+
+        self.checked += 1
+        errors: List[dict] = []
+        check(tool_args, "", errors)
+        if errors:
+            self.rejected[tool_name] = self.rejected.get(tool_name, 0) + 1
+        return errors
+
+    def stats(self) -> dict:
+        rejected = sum(self.rejected.values())
+        return {
+            "checked": self.checked,
+            "rejected": rejected,
+            "rejected_by_tool": dict(self.rejected),
+            "rejection_rate": rejected / self.checked if self.checked else 0.0,
+        }